@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 """
-Wrapper script to run generate_labeled_tiles_csv.py from the pml-ds directory.
-This script simply executes the main script located in the scripts/ subdirectory.
+Wrapper script to run generate_per_frame_labels_csv.py from the pml-ds directory.
+Runs the main script located in the scripts/ subdirectory in this process
+(same as ``python -m src labels``).
 """
 
 import os
 import sys
-import subprocess
 
 # Get the directory where this script is located (pml-ds)
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -18,6 +18,10 @@ if not os.path.exists(main_script):
     print(f"Error: Could not find {main_script}")
     sys.exit(1)
 
-# Execute the main script with all arguments passed through
-sys.exit(subprocess.run([sys.executable, main_script] + sys.argv[1:]).returncode)
+if script_dir not in sys.path:
+    sys.path.insert(0, script_dir)
 
+from src.cli import run
+
+# Run the main script with all arguments passed through, without a second interpreter
+sys.exit(run("labels", sys.argv[1:]))
@@ -3,9 +3,23 @@
 # ===========================================================
 # This script executes the complete pipeline in sequence:
 # 1. youtube_video_to_frames.ps1 - Extract frames from YouTube video
-# 2. generate_dataset_info_csv.py - Generate dataset metadata CSV
-# 3. split_8x8_grid_numbered.py - Split images into 8x8 grid tiles
-# 4. generate_per_frame_labels_csv.py - Generate per-frame labels CSV
+#    (numbered and split by scripts\register_frames.py, which also keeps
+#    dataset_info.csv up to date from the frame registry)
+# 2. generate_dataset_info_csv.py - Full rescan of the frame folders
+#    (only with PML_RESCAN set, see below)
+# 3. split_8x8_grid_numbered.py - Split images into 8x8 grid tiles and
+#    build the per-split label CSVs in the same pass
+#    (steps 2-3 run in one process: python -m src [dataset-info +] tiles)
+#    (scripts\generate_per_frame_labels_csv.py only refreshes the label
+#    CSVs after labeling and is not part of the pipeline)
+# Set $env:PML_PROFILE = "path\to\profile.jsonl" to record per-step timings
+# of every script (JSON lines) and print a whole-run summary at the end.
+# Set $env:PML_DEDUP = "1" to move near-duplicate frames out of the
+# dataset (scripts\dedup_frames.py) after step 1 (in the same process as
+# steps 2-3).
+# Set $env:PML_RESCAN = "1" to also rebuild dataset_info.csv with a full
+# rescan of the frame folders (generate_dataset_info_csv.py), e.g. after
+# frames were added or deleted by hand.
 # ===========================================================
 
 $ErrorActionPreference = "Stop"
@@ -27,14 +41,20 @@ if (Test-Path $activateScript) {
     exit 1
 }
 
+# --- Optional profiling: one run id shared by all steps ---
+if ($env:PML_PROFILE) {
+    $env:PML_PROFILE_RUN = "pipeline-" + (Get-Date -Format "yyyyMMddTHHmmss")
+    Write-Host "Profiling enabled: $env:PML_PROFILE (run $env:PML_PROFILE_RUN)"
+}
+
 # --- Verify required scripts exist ---
 Write-Host "Verifying required scripts..."
 
 $requiredScripts = @(
     "scripts\youtube_video_to_frames.ps1",
+    "scripts\register_frames.py",
     "scripts\generate_dataset_info_csv.py",
-    "scripts\split_8x8_grid_numbered.py",
-    "scripts\generate_per_frame_labels_csv.py"
+    "scripts\split_8x8_grid_numbered.py"
 )
 
 foreach ($script in $requiredScripts) {
@@ -56,40 +76,30 @@ if ($LASTEXITCODE -ne 0) {
     exit 1
 }
 
-# --- Step 2: Generate dataset info CSV ---
-Write-Host ""
-Write-Host "==========================================================="
-Write-Host "Step 2: Generating dataset info CSV"
-Write-Host "==========================================================="
-python scripts\generate_dataset_info_csv.py
-
-if ($LASTEXITCODE -ne 0) {
-    Write-Host "Error: Dataset info CSV generation failed."
-    exit 1
+# --- Steps 2-3 (and the optional near-duplicate filter) in one Python process ---
+# python -m src chains the stages ("+") so the interpreter and OpenCV/pandas
+# start once instead of once per step
+$stages = @()
+if ($env:PML_DEDUP) {
+    $stages += @("dedup", "+")
+}
+if ($env:PML_RESCAN) {
+    $stages += @("dataset-info", "+")
 }
-
-# --- Step 3: Split images into 8x8 grid tiles ---
 Write-Host ""
 Write-Host "==========================================================="
-Write-Host "Step 3: Splitting images into 8x8 grid tiles"
+Write-Host "Step 3: Splitting images into 8x8 grid tiles + label CSVs"
 Write-Host "==========================================================="
-python scripts\split_8x8_grid_numbered.py
+python -m src @stages tiles
 
 if ($LASTEXITCODE -ne 0) {
     Write-Host "Error: Grid tile generation failed."
     exit 1
 }
 
-# --- Step 4: Generate per-frame labels CSV ---
-Write-Host ""
-Write-Host "==========================================================="
-Write-Host "Step 4: Generating per-frame labels CSV"
-Write-Host "==========================================================="
-python scripts\generate_per_frame_labels_csv.py
-
-if ($LASTEXITCODE -ne 0) {
-    Write-Host "Error: Per-frame labels CSV generation failed."
-    exit 1
+# --- Whole-run profile summary ---
+if ($env:PML_PROFILE) {
+    python -m src.instrument $env:PML_PROFILE --run $env:PML_PROFILE_RUN
 }
 
 # --- Completion summary ---
@@ -102,7 +112,7 @@ Write-Host " - frames_dataset\train → Training frames (800×600)"
 Write-Host " - frames_dataset\test  → Test frames (800×600)"
 Write-Host " - frames_dataset_tiles\ → 8x8 grid tiles + overlays"
 Write-Host " - dataset_info.csv → Dataset metadata"
-Write-Host " - per_frame_labels.csv → Per-frame labels"
+Write-Host " - objects_{train,test}_dataset.csv → Per-tile labels"
 Write-Host "==========================================================="
 Write-Host "Next steps:"
 Write-Host "1. Label your images/tiles as needed"
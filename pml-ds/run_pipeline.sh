@@ -4,9 +4,22 @@
 # ===========================================================
 # This script executes the complete pipeline in sequence:
 # 1. youtube_video_to_frames.sh - Extract frames from YouTube video
-# 2. generate_dataset_info_csv.py - Generate dataset metadata CSV
-# 3. split_8x8_grid_numbered.py - Split images into 8x8 grid tiles
-# 4. generate_per_frame_labels_csv.py - Generate per-frame labels CSV
+#    (numbered and split by scripts/register_frames.py, which also keeps
+#    dataset_info.csv up to date from the frame registry)
+# 2. generate_dataset_info_csv.py - Full rescan of the frame folders
+#    (only with PML_RESCAN set, see below)
+# 3. split_8x8_grid_numbered.py - Split images into 8x8 grid tiles and
+#    build the per-split label CSVs in the same pass
+#    (steps 2-3 run in one process: python -m src [dataset-info +] tiles)
+#    (scripts/generate_per_frame_labels_csv.py only refreshes the label
+#    CSVs after labeling and is not part of the pipeline)
+# Set PML_PROFILE=/path/to/profile.jsonl to record per-step timings of
+# every script (JSON lines) and print a whole-run summary at the end.
+# Set PML_DEDUP=1 to move near-duplicate frames out of the dataset
+# (scripts/dedup_frames.py) after step 1 (in the same process as steps 2-3).
+# Set PML_RESCAN=1 to also rebuild dataset_info.csv with a full rescan of
+# the frame folders (generate_dataset_info_csv.py), e.g. after frames were
+# added or deleted by hand.
 # ===========================================================
 
 set -e  # Exit immediately on error
@@ -22,6 +35,12 @@ fi
 echo "Activating Python environment..."
 source venv/bin/activate
 
+# --- Optional profiling: one run id shared by all steps ---
+if [ -n "$PML_PROFILE" ]; then
+  export PML_PROFILE_RUN="pipeline-$(date +%Y%m%dT%H%M%S)"
+  echo "Profiling enabled: $PML_PROFILE (run $PML_PROFILE_RUN)"
+fi
+
 # --- Verify required scripts exist ---
 echo "Verifying required scripts..."
 
@@ -30,6 +49,11 @@ if [ ! -f "scripts/youtube_video_to_frames.sh" ]; then
   exit 1
 fi
 
+if [ ! -f "scripts/register_frames.py" ]; then
+  echo "Error: Missing scripts/register_frames.py!"
+  exit 1
+fi
+
 if [ ! -f "scripts/generate_dataset_info_csv.py" ]; then
   echo "Error: Missing scripts/generate_dataset_info_csv.py!"
   exit 1
@@ -40,11 +64,6 @@ if [ ! -f "scripts/split_8x8_grid_numbered.py" ]; then
   exit 1
 fi
 
-if [ ! -f "scripts/generate_per_frame_labels_csv.py" ]; then
-  echo "Error: Missing scripts/generate_per_frame_labels_csv.py!"
-  exit 1
-fi
-
 # --- Make shell script executable ---
 chmod +x scripts/youtube_video_to_frames.sh
 
@@ -55,26 +74,26 @@ echo "Step 1: Extracting frames from YouTube video"
 echo "==========================================================="
 ./scripts/youtube_video_to_frames.sh
 
-# --- Step 2: Generate dataset info CSV ---
-echo ""
-echo "==========================================================="
-echo "Step 2: Generating dataset info CSV"
-echo "==========================================================="
-python scripts/generate_dataset_info_csv.py
-
-# --- Step 3: Split images into 8x8 grid tiles ---
+# --- Steps 2-3 (and the optional near-duplicate filter) in one Python process ---
+# python -m src chains the stages ("+") so the interpreter and OpenCV/pandas
+# start once instead of once per step
+STAGES=()
+if [ -n "$PML_DEDUP" ]; then
+  STAGES+=(dedup +)
+fi
+if [ -n "$PML_RESCAN" ]; then
+  STAGES+=(dataset-info +)
+fi
 echo ""
 echo "==========================================================="
-echo "Step 3: Splitting images into 8x8 grid tiles"
+echo "Step 3: Splitting images into 8x8 grid tiles + label CSVs"
 echo "==========================================================="
-python scripts/split_8x8_grid_numbered.py
+python -m src "${STAGES[@]}" tiles
 
-# --- Step 4: Generate per-frame labels CSV ---
-echo ""
-echo "==========================================================="
-echo "Step 4: Generating per-frame labels CSV"
-echo "==========================================================="
-python scripts/generate_per_frame_labels_csv.py
+# --- Whole-run profile summary ---
+if [ -n "$PML_PROFILE" ]; then
+  python -m src.instrument "$PML_PROFILE" --run "$PML_PROFILE_RUN"
+fi
 
 # --- Deactivate environment ---
 deactivate
@@ -89,7 +108,7 @@ echo " - frames_dataset/train → Training frames (800×600)"
 echo " - frames_dataset/test  → Test frames (800×600)"
 echo " - frames_dataset_tiles/ → 8x8 grid tiles + overlays"
 echo " - dataset_info.csv → Dataset metadata"
-echo " - per_frame_labels.csv → Per-frame labels"
+echo " - objects_{train,test}_dataset.csv → Per-tile labels"
 echo "==========================================================="
 echo "Next steps:"
 echo "1. Label your images/tiles as needed"
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+benchmark_pipeline.py
+----------------------------------------------------
+Offline benchmark of each pipeline stage on synthetic data.
+
+For every dataset size, synthetic 800x600 frames (smooth gradients, noise
+and a few solid shapes, so PNG encode/decode costs are realistic) and a
+matching 1 fps video are generated in a temporary folder laid out like
+pml-ds/. Each stage then runs on its own, in a fresh process:
+
+    read_image                 src.utils.read_image on every frame
+    read_images                src.utils.read_images (thread pool, BGR: no conversion)
+    split_image_into_grid      src.grid_split on already decoded frames
+    split_image                split_8x8_grid_numbered.split_image (overlay + tile PNGs)
+    process_split              generate_per_frame_labels_csv.process_split (--full)
+    generate_dataset_info      generate_dataset_info_csv.generate_dataset_info
+    analyze_split              check_label_distribution.analyze_split (cold cache)
+    iter_video_frames          src.video_ingest.iter_video_frames (decode + resize)
+
+Each stage reports frames/s, tiles/s, MB/s (of its input) and the peak RSS
+of its process; the best of --repeat runs is kept. Results are written as
+JSON. With --baseline, any stage/size whose frames/s dropped by more than
+--threshold compared to the baseline JSON is reported and the script exits
+with status 1, so a nightly job can fail on a regression.
+
+Usage (from pml-ds/):
+    python scripts/benchmark_pipeline.py --sizes 8 32 128
+    python scripts/benchmark_pipeline.py --baseline benchmark_results.json --threshold 0.2
+
+Author: Cordial Dude
+----------------------------------------------------
+"""
+
+import os
+import io
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# Add parent directory to path to find src module (and the stage scripts)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+for path in (parent_dir, script_dir):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# --- Configuration ---
+IMG_W, IMG_H = 800, 600
+NUM_TILES = 64
+VIDEO_FPS = 1.0
+DEFAULT_SIZES = [8, 32, 128]               # Frames per synthetic dataset
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.15                   # Allowed frames/s drop vs baseline
+DEFAULT_OUTPUT = os.path.join(parent_dir, "benchmark_results.json")
+STAGES = ["read_image", "read_images", "split_image_into_grid", "split_image", "process_split",
+          "generate_dataset_info", "analyze_split", "iter_video_frames"]
+
+
+def synthetic_frame(rng):
+    """One 800x600 RGB frame: gradient background, sensor noise, a few solid shapes."""
+    y, x = np.mgrid[0:IMG_H, 0:IMG_W].astype(np.float32)
+    phase = rng.uniform(0, 2 * np.pi, size=3)
+    frame = np.stack([127 + 100 * np.sin(x / 97 + y / 131 + p) for p in phase], axis=-1)
+    frame += rng.normal(0, 6, size=frame.shape)
+    for _ in range(6):
+        x0, y0 = rng.integers(0, IMG_W - 60), rng.integers(0, IMG_H - 60)
+        w, h = rng.integers(10, 60, size=2)
+        frame[y0:y0 + h, x0:x0 + w] = rng.integers(0, 256, size=3)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def make_dataset(root, num_frames, seed=0):
+    """Write a synthetic frames_dataset/{train,test} (every 5th frame in test) and video.mp4."""
+    rng = np.random.default_rng(seed)
+    for set_type in ["train", "test"]:
+        os.makedirs(os.path.join(root, "frames_dataset", set_type), exist_ok=True)
+        os.makedirs(os.path.join(root, "frames_dataset_tiles", set_type), exist_ok=True)
+
+    video_path = os.path.join(root, "video.mp4")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), VIDEO_FPS, (IMG_W, IMG_H))
+    for i in range(1, num_frames + 1):
+        frame = synthetic_frame(rng)
+        set_type = "test" if i % 5 == 0 else "train"
+        Image.fromarray(frame).save(os.path.join(root, "frames_dataset", set_type, f"frame_{i:04d}.png"))
+        if writer.isOpened():
+            writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+    writer.release()
+    if not os.path.exists(video_path) or os.path.getsize(video_path) == 0:
+        video_path = None  # No mp4 encoder in this OpenCV build
+    return video_path
+
+
+def frame_paths(root, split="train"):
+    return sorted(glob.glob(os.path.join(root, "frames_dataset", split, "*.png")))
+
+
+def _reset(*paths):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def _setup_stage(stage, root):
+    """
+    Prepare a stage and return (run, reset, frames, tiles, input_bytes).
+
+    ``run`` is the timed call; ``reset`` (untimed) puts the folder back in
+    the state before the call, so every repetition does the same work.
+    """
+    frames_dir = os.path.join(root, "frames_dataset")
+    tiles_dir = os.path.join(root, "frames_dataset_tiles")
+    paths = frame_paths(root)
+    file_bytes = sum(os.path.getsize(p) for p in paths)
+    no_reset = lambda: None
+
+    if stage == "read_image":
+        from src.utils import read_image
+        return (lambda: [read_image(p) for p in paths], no_reset,
+                len(paths), 0, file_bytes)
+
+    if stage == "read_images":
+        from src.utils import read_images
+        return (lambda: read_images(paths, channel_order="bgr"), no_reset,
+                len(paths), 0, file_bytes)
+
+    if stage == "split_image_into_grid":
+        from src.utils import read_image
+        from src.grid_split import split_image_into_grid
+        decoded = [read_image(p) for p in paths]
+        return (lambda: [split_image_into_grid(img) for img in decoded], no_reset,
+                len(paths), len(paths) * NUM_TILES, sum(img.nbytes for img in decoded))
+
+    if stage == "split_image":
+        import split_8x8_grid_numbered as tiling
+        out_dir = os.path.join(tiles_dir, "train")
+
+        def run():
+            for p in paths:
+                frame_id = os.path.splitext(os.path.basename(p))[0]
+                tiling.split_image(p, os.path.join(out_dir, f"{frame_id}_tiles"), "train", force=True)
+        return run, no_reset, len(paths), len(paths) * NUM_TILES, file_bytes
+
+    if stage in ("process_split", "analyze_split"):
+        import generate_per_frame_labels_csv as labels_stage
+        labels_stage.BASE_DATA_DIR = frames_dir
+        labels_stage.TILES_BASE_DIR = tiles_dir  # Manifest, label store and feature cache follow
+        csv_path = os.path.join(tiles_dir, "train", "objects_train_dataset.csv")
+        if stage == "process_split":
+            # Every repetition starts cold: no manifest records, no cached tile descriptors
+            state_files = [labels_stage.tiles_file(name) for name in (
+                labels_stage.MANIFEST_NAME, labels_stage.LABEL_STORE_NAME, labels_stage.FEATURE_CACHE_NAME)]
+            return (lambda: labels_stage.process_split("train", full=True),
+                    lambda: _reset(*state_files, csv_path),
+                    len(paths), len(paths) * NUM_TILES, file_bytes)
+
+        import check_label_distribution as check
+        check.BASE_DIR = tiles_dir
+        if not os.path.exists(csv_path):
+            labels_stage.process_split("train", full=True)
+        cache = os.path.join(tiles_dir, "train", ".label_stats_train.npz")
+        return (lambda: check.analyze_split("train"), lambda: _reset(cache),
+                len(paths), len(paths) * NUM_TILES, os.path.getsize(csv_path))
+
+    if stage == "generate_dataset_info":
+        import generate_dataset_info_csv as info
+        info.parent_dir = root
+        info.BASE_DATA_DIR = frames_dir
+        info.CSV_FILE = os.path.join(frames_dir, "dataset_info.csv")
+        num_frames = len(paths) + len(frame_paths(root, "test"))
+        # Measure a full scan: without the previous CSV every frame's header is probed
+        return info.generate_dataset_info, lambda: _reset(info.CSV_FILE), num_frames, 0, 0
+
+    if stage == "iter_video_frames":
+        from src.video_ingest import iter_video_frames
+        video_path = os.path.join(root, "video.mp4")
+        num_frames = len(paths) + len(frame_paths(root, "test"))
+        return (lambda: sum(1 for _ in iter_video_frames(video_path, 1.0 / VIDEO_FPS)), no_reset,
+                num_frames, 0, os.path.getsize(video_path))
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS counter (Linux); elsewhere the process-lifetime peak is reported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS (and survives fork/exec)
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def run_stage(stage, root, repeat):
+    """Run one stage ``repeat`` times (inside a fresh process) and return its metrics."""
+    _reset_peak_rss()
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+        run, reset, frames, tiles, input_bytes = _setup_stage(stage, root)
+        times = []
+        for _ in range(repeat):
+            reset()
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+    best = min(times)
+    peak_rss_mb = _peak_rss_mb()
+    return {
+        "seconds": best,
+        "seconds_all": times,
+        "frames": frames,
+        "tiles": tiles,
+        "input_mb": input_bytes / 2**20,
+        "frames_per_s": frames / best if best > 0 else None,
+        "tiles_per_s": tiles / best if best > 0 and tiles else None,
+        "mb_per_s": input_bytes / 2**20 / best if best > 0 and input_bytes else None,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """(stage, size, baseline frames/s, current frames/s) for every drop larger than ``threshold``."""
+    regressions = []
+    for stage, sizes in results["results"].items():
+        for size, metrics in sizes.items():
+            old = baseline.get("results", {}).get(stage, {}).get(size)
+            if not old or not old.get("frames_per_s") or not metrics.get("frames_per_s"):
+                continue
+            if metrics["frames_per_s"] < old["frames_per_s"] * (1 - threshold):
+                regressions.append((stage, size, old["frames_per_s"], metrics["frames_per_s"]))
+    return regressions
+
+
+def main(sizes, stages, repeat=DEFAULT_REPEAT, output=DEFAULT_OUTPUT,
+         baseline=None, threshold=DEFAULT_THRESHOLD, keep=False):
+    results = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "repeat": repeat,
+        },
+        "results": {stage: {} for stage in stages},
+    }
+    # Spawned single-worker pools: each measurement starts from a clean
+    # process, so peak RSS belongs to that stage alone
+    mp_context = multiprocessing.get_context("spawn")
+
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix=f"pml_bench_{size}_")
+        try:
+            print(f"\nGenerating {size} synthetic frames in {root} ...")
+            video_path = make_dataset(root, size)
+            for stage in stages:
+                if stage == "iter_video_frames" and video_path is None:
+                    print(f"  {stage:<24} skipped (no mp4 encoder available)")
+                    continue
+                with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as pool:
+                    metrics = pool.submit(run_stage, stage, root, repeat).result()
+                results["results"][stage][str(size)] = metrics
+                rate = lambda v, unit: f"{v:11.1f} {unit}" if v else f"{'-':>11} {unit}"
+                print(f"  {stage:<24}{rate(metrics['frames_per_s'], 'frames/s')}"
+                      f"{rate(metrics['tiles_per_s'], 'tiles/s')}{rate(metrics['mb_per_s'], 'MB/s')}"
+                      f"  peak RSS {metrics['peak_rss_mb'] or 0:7.1f} MB")
+        finally:
+            if keep:
+                print(f"Kept {root}")
+            else:
+                shutil.rmtree(root, ignore_errors=True)
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"\nResults written to {output}")
+
+    if baseline is not None:
+        with open(baseline) as f:
+            regressions = find_regressions(results, json.load(f), threshold)
+        if regressions:
+            print(f"\nREGRESSIONS (frames/s dropped by more than {threshold:.0%}):")
+            for stage, size, old, new in regressions:
+                print(f"  {stage} @ {size} frames: {old:.1f} -> {new:.1f} frames/s")
+            return 1
+        print(f"\nNo regressions against {baseline} (threshold {threshold:.0%})")
+    return 0
+
+
+def cli(argv=None):
+    """Benchmark the selected stages and compare against --baseline; returns the exit status."""
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage on synthetic frames.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Dataset sizes (number of frames) to benchmark")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES,
+                        help="Stages to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="Runs per stage and size; the fastest is reported")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=None,
+                        help="Earlier results JSON to compare against (exit 1 on regression)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative frames/s drop before a stage counts as regressed")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic datasets")
+    args = parser.parse_args(argv)
+    return main(args.sizes, args.stages, args.repeat, args.output,
+                args.baseline, args.threshold, args.keep)
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -1,10 +1,20 @@
 """
 check_label_distribution.py
 ----------------------------------------------------
-Reads all per-frame labeling CSVs under:
-    data/frames_dataset_tiles/{train,test}/
+Reads the consolidated per-split label tables:
+    frames_dataset_tiles/{train,test}/objects_{split}_dataset.csv
+    (or the .npz copy next to it, when it is up to date)
 
-Summarizes label frequencies per split and per class.
+Summarizes label frequencies per split and per class, and writes the full
+breakdown (per class, per frame, per cell position) as JSON to
+    frames_dataset_tiles/{split}/label_stats_{split}.json
+
+The label matrix behind the report is cached in
+frames_dataset_tiles/{split}/.label_stats_{split}.npz. The tiling and labels
+stages update it with the frames they rewrote; it is only rebuilt from the
+table when the table changed some other way. The tables reflect the last run of
+split_8x8_grid_numbered.py / generate_per_frame_labels_csv.py; frames without
+a labels CSV count as "no object".
 
 Author: Cordial Dude
 ----------------------------------------------------
@@ -12,74 +22,99 @@ Author: Cordial Dude
 
 import os
 import sys
-import pandas as pd
+import json
+import argparse
 from collections import Counter
 
 # Determine base directory (pml-ds) regardless of where script is run from
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
 BASE_DIR = os.path.join(parent_dir, "frames_dataset_tiles")
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from src.label_stats import LabelStatsCache, stats_cache_path, write_stats_json
+from src import instrument
+
 
-# Label code mapping
-LABEL_CODE_MAP = {
-    0: "no object",
-    1: "ball",
-    2: "bat",
-    3: "stump"
-}
+def label_table_paths(split_dir, split_name):
+    """
+    (table, file to read it from) of a split.
 
-def analyze_split(split_name):
+    The table is the CSV (the stats cache is keyed on it, as the stages that
+    update the cache only know the CSV); the .npz copy is only a faster way
+    to read it, used when it is at least as new as the CSV.
+    """
+    csv_path = os.path.join(split_dir, f"objects_{split_name}_dataset.csv")
+    npz_path = os.path.splitext(csv_path)[0] + ".npz"
+    if not os.path.exists(csv_path):
+        return npz_path, npz_path
+    if os.path.exists(npz_path) and os.path.getmtime(npz_path) >= os.path.getmtime(csv_path):
+        return csv_path, npz_path
+    return csv_path, csv_path
+
+
+def analyze_split(split_name, quiet=False):
     split_dir = os.path.join(BASE_DIR, split_name)
-    frame_dirs = [os.path.join(split_dir, d) for d in os.listdir(split_dir)
-                  if os.path.isdir(os.path.join(split_dir, d))]
-
-    label_counts = Counter()
-    frame_stats = []
-
-    for frame_dir in frame_dirs:
-        csvs = [f for f in os.listdir(frame_dir) if f.endswith("_labels.csv")]
-        if not csvs:
-            print(f"DEBUG: No labels CSV found in {frame_dir}")
-            continue
-        csv_path = os.path.join(frame_dir, csvs[0])
-        print(f"DEBUG: Processing labels CSV: {csv_path}")
-        df = pd.read_csv(csv_path)
-        print(f"DEBUG:   - CSV contains {len(df)} rows")
-        counts = df['LabelCode'].value_counts().to_dict()
-        # Convert code keys to strings for display
-        counts_str = {str(k): v for k, v in counts.items()}
-        print(f"DEBUG:   - Label code distribution: {counts_str}")
-        # Update label_counts with LabelCode values
-        label_counts.update(counts)
-
-        # store per-frame info
-        total = len(df)
-        none = counts.get(0, 0)  # Code 0 = no object
-        non_none = total - none
-        frame_stats.append({
-            'Frame': os.path.basename(frame_dir),
-            'TotalTiles': total,
-            'NoneTiles': none,
-            'NonNoneTiles': non_none
-        })
+    table_path, read_path = label_table_paths(split_dir, split_name)
+    if not os.path.exists(table_path):
+        print(f"No label table found for {split_name}: {table_path}")
+        return Counter(), []
+
+    with instrument.span("read_table", bytes=os.path.getsize(read_path)):
+        cache = LabelStatsCache(stats_cache_path(split_dir, split_name))
+        cache.refresh(table_path, read_path)
+    with instrument.span("stats", frames=len(cache.frame_ids)):
+        stats = cache.stats()
+    with instrument.span("json_write"):
+        write_stats_json(stats, os.path.join(split_dir, f"label_stats_{split_name}.json"))
+
+    codes = stats["codes"]
+    label_counts = Counter({int(code): info["count"]
+                            for code, info in stats["per_class"].items() if info["count"]})
+    none_idx = codes.index(0) if 0 in codes else None
+    frame_stats = [{
+        'Frame': frame_id,
+        'TotalTiles': info["total_tiles"],
+        'NoneTiles': info["counts"][none_idx] if none_idx is not None else 0,
+        'NonNoneTiles': info["non_none_tiles"],
+    } for frame_id, info in stats["per_frame"].items()]
+
+    if quiet:
+        return label_counts, frame_stats
 
     # Summary
-    total_labels = sum(label_counts.values())
     print(f"\n{split_name.upper()} SPLIT SUMMARY")
     # Sort by label code for consistent output
     for code in sorted(label_counts.keys()):
-        cnt = label_counts[code]
-        pct = (cnt / total_labels) * 100
-        label_name = LABEL_CODE_MAP.get(code, f"unknown({code})")
-        print(f"Code {code} ({label_name:<12}): {cnt:6d} ({pct:5.2f}%)")
+        info = stats["per_class"][str(code)]
+        print(f"Code {code} ({info['name']:<12}): {info['count']:6d} ({info['pct']:5.2f}%)")
 
-    # Find frames with no objects
-    no_obj_frames = [f for f in frame_stats if f['NonNoneTiles'] == 0]
-    print(f"\nFrames with NO objects: {len(no_obj_frames)} out of {len(frame_stats)}")
+    # Frames with no objects
+    print(f"\nFrames with NO objects: {stats['totals']['frames_without_objects']} "
+          f"out of {stats['totals']['frames']}")
 
     return label_counts, frame_stats
 
 
+def cli(argv=None):
+    """Report the label distribution of both splits (or print their JSON stats)."""
+    parser = argparse.ArgumentParser(description="Summarize tile label distribution per split.")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the per-split JSON stats to stdout instead of the summary")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+
+    def run(args):
+        for split in ["train", "test"]:
+            analyze_split(split, quiet=args.json)
+            stats_path = os.path.join(BASE_DIR, split, f"label_stats_{split}.json")
+            if args.json and os.path.exists(stats_path):
+                with open(stats_path) as f:
+                    print(json.dumps({split: json.load(f)}))
+
+    instrument.run_cli("label_stats", run, args)
+
+
 if __name__ == "__main__":
-    for split in ["train", "test"]:
-        analyze_split(split)
+    cli()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+dedup_frames.py
+----------------------------------------------------
+Finds near-duplicate frames in frames_dataset/{train,test} and moves them
+out of the dataset before generate_dataset_info_csv.py and tiling run.
+
+Frames captured a few seconds apart are often almost identical (static
+camera shots, replays). Each frame gets a 64-bit perceptual hash (dHash);
+a frame within --threshold differing bits of an earlier kept frame (in
+frame name order, across both splits) is a near duplicate.
+
+Duplicates are moved to frames_dataset/duplicates/{train,test}/, so later
+steps never see them (move them back to restore them), dropped from the
+frame registry and dataset_info.csv, and listed in
+frames_dataset/duplicates.csv.
+
+Hashes are kept in frames_dataset/.frame_hashes.sqlite; frames whose size and
+mtime did not change are not decoded again, so reruns after adding frames
+only hash the new ones.
+
+Output CSV:
+    image_path,set_type,duplicate_of,distance
+
+Author: Cordial Dude
+----------------------------------------------------
+"""
+
+import os
+import sys
+import csv
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Determine base directory (pml-ds) regardless of where script is run from
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+BASE_DATA_DIR = os.path.join(parent_dir, "frames_dataset")
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from src.frame_hash import HashIndex, hash_thumbnail, dhash_batch, DEFAULT_THRESHOLD
+from src.manifest import IMAGE_EXTS
+from src.frame_registry import FrameRegistry, REGISTRY_FILE
+from src import instrument
+
+# ================= CONFIGURATION =================
+INDEX_FILE = os.path.join(BASE_DATA_DIR, ".frame_hashes.sqlite")
+DATASET_INFO_FILE = os.path.join(BASE_DATA_DIR, "dataset_info.csv")
+REPORT_FILE = os.path.join(BASE_DATA_DIR, "duplicates.csv")
+DUPLICATES_DIR = os.path.join(BASE_DATA_DIR, "duplicates")
+BATCH_SIZE = 256        # Frames hashed and looked up per step
+DECODE_THREADS = 4      # cv2 decodes release the GIL
+# =================================================
+
+
+def list_frames():
+    """(rel_path, set_type, stat) of every frame, in frame name order across both splits."""
+    frames = []
+    with instrument.span("scan"):
+        for set_type in ["train", "test"]:
+            split_dir = os.path.join(BASE_DATA_DIR, set_type)
+            if not os.path.isdir(split_dir):
+                continue
+            with os.scandir(split_dir) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(IMAGE_EXTS) and entry.is_file():
+                        frames.append((os.path.relpath(entry.path, parent_dir), set_type, entry.stat()))
+    frames.sort(key=lambda frame: (os.path.basename(frame[0]), frame[1]))
+    return frames
+
+
+def dedup_frames(threshold=DEFAULT_THRESHOLD, batch_size=BATCH_SIZE, threads=DECODE_THREADS):
+    """
+    Hash new/changed frames, decide which are near duplicates and move them out of the dataset.
+
+    Returns:
+        List of (rel_path, set_type, duplicate_of, distance) of the duplicates found
+    """
+    frames = list_frames()
+    duplicates = []
+    with HashIndex(INDEX_FILE) as index:
+        records = index.records()
+        present = {path for path, _, _ in frames}
+        index.remove([path for path in records if path not in present])
+
+        # Reuse earlier decisions while the frame and the frame it duplicates are unchanged;
+        # everything from the first frame needing a decision onwards is decided again, in order
+        kept = {path for path, rec in records.items() if rec[3] is None and path in present}
+        pending = []
+        for path, set_type, st in frames:
+            rec = records.get(path)
+            fresh = rec is not None and (rec[0], rec[1]) == (st.st_size, st.st_mtime_ns)
+            if fresh and not pending and (rec[3] is None or rec[3] in kept):
+                if rec[3] is not None:
+                    duplicates.append((path, set_type, rec[3], rec[4]))
+                continue
+            pending.append((path, set_type, st, rec[2] if fresh else None))
+        index.remove([path for path, _, _, _ in pending if path in records])
+
+        print(f"Frames: {len(frames)} ({len(frames) - len(pending)} already decided, {len(pending)} to check)")
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                to_hash = [path for path, _, _, h in batch if h is None]
+                with instrument.span("decode", frames=len(to_hash)):
+                    thumbnails = list(pool.map(lambda p: hash_thumbnail(os.path.join(parent_dir, p)), to_hash))
+                with instrument.span("hash", frames=len(batch)):
+                    new_hashes = iter(dhash_batch(np.stack(thumbnails)) if thumbnails else [])
+                    hashes = np.array([h if h is not None else next(new_hashes) for _, _, _, h in batch],
+                                      dtype=np.uint64)
+                    decisions = index.add([b[0] for b in batch], [b[2] for b in batch], hashes, threshold)
+                for (path, set_type, _, _), (duplicate_of, distance) in zip(batch, decisions):
+                    if duplicate_of is not None:
+                        duplicates.append((path, set_type, duplicate_of, distance))
+
+        if duplicates:
+            with instrument.span("file_write", files=len(duplicates)):
+                for path, set_type, _, _ in duplicates:
+                    dst_dir = os.path.join(DUPLICATES_DIR, set_type)
+                    os.makedirs(dst_dir, exist_ok=True)
+                    shutil.move(os.path.join(parent_dir, path), os.path.join(dst_dir, os.path.basename(path)))
+            index.remove([path for path, _, _, _ in duplicates])
+            with FrameRegistry(os.path.join(BASE_DATA_DIR, REGISTRY_FILE)) as registry:
+                registry.remove([path for path, _, _, _ in duplicates])
+                if registry.bootstrapped():
+                    registry.export(DATASET_INFO_FILE)  # No full rescan needed afterwards
+
+    with instrument.span("csv_write", rows=len(duplicates)), open(REPORT_FILE, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["image_path", "set_type", "duplicate_of", "distance"])
+        writer.writerows(duplicates)
+
+    print(f"Near duplicates (<= {threshold} of 64 bits): {len(duplicates)} of {len(frames)} frames")
+    if duplicates:
+        print(f"Moved to: {DUPLICATES_DIR}/{{train,test}}/")
+    print(f"Report: {REPORT_FILE}")
+    return duplicates
+
+
+def cli(argv=None):
+    """Move the near duplicates among the frames out of the dataset."""
+    parser = argparse.ArgumentParser(description="Move near-duplicate frames out of the dataset before tiling.")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help="Max differing hash bits (of 64) for a near duplicate (0 = identical hashes)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Frames hashed per step")
+    parser.add_argument("--threads", type=int, default=DECODE_THREADS, help="Decoder threads")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    instrument.run_cli("dedup", lambda args: dedup_frames(threshold=args.threshold, batch_size=args.batch_size,
+                                                         threads=args.threads), args)
+
+
+if __name__ == "__main__":
+    cli()
@@ -5,12 +5,19 @@ generate_dataset_info_csv.py
 Generates dataset_info.csv by scanning frames_dataset/train and frames_dataset/test
 directories for PNG images.
 
-Output CSV contains only:
-- image_path: Full path to the image file
+Output CSV columns:
+- image_path: Path of the image file (relative to pml-ds/)
 - set_type: Either "train" or "test"
+- size, mtime_ns: File size and modification time
+- width, height, format: Read from the image header (no pixel decode)
 
-The script can be run multiple times and will regenerate the CSV with current
-state of the frames_dataset directory.
+The script can be run multiple times. Frames whose size and mtime did not
+change keep their row without being opened; only new or changed frames are
+probed (on a thread pool), and the CSV is only rewritten when something
+changed. Ingestion (register_frames.py) keeps dataset_info.csv up to date
+from the frame registry without listing the folders; this full scan also
+brings the registry in line with the folders (e.g. after frames were added
+or deleted by hand).
 
 Author: Cordial Dude
 ----------------------------------------------------
@@ -19,16 +26,23 @@ Author: Cordial Dude
 import os
 import sys
 import csv
+import argparse
 
 # Determine base directory (pml-ds) regardless of where script is run from
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
 BASE_DATA_DIR = os.path.join(parent_dir, "frames_dataset")
 CSV_FILE = os.path.join(BASE_DATA_DIR, "dataset_info.csv")
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
 
+from src.frame_scan import DATASET_INFO_FIELDS, PROBE_THREADS, read_dataset_info, scan_frames
+from src.frame_registry import FrameRegistry, REGISTRY_FILE
+from src import instrument
 
-def generate_dataset_info():
-    """Generate dataset_info.csv by scanning train and test directories."""
+
+def generate_dataset_info(threads=PROBE_THREADS):
+    """Update dataset_info.csv from the train and test directories."""
     
     train_dir = os.path.join(BASE_DATA_DIR, "train")
     test_dir = os.path.join(BASE_DATA_DIR, "test")
@@ -42,51 +56,52 @@ def generate_dataset_info():
         print(f"Error: Test directory not found: {test_dir}")
         sys.exit(1)
     
-    records = []
-    
-    # Process train directory
+    known = read_dataset_info(CSV_FILE)
     print(f"Scanning train directory: {train_dir}")
-    train_count = 0
-    for img_file in sorted(os.listdir(train_dir)):
-        if img_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-            img_path = os.path.join(train_dir, img_file)
-            # Use relative path from BASE_DATA_DIR parent for cleaner paths
-            rel_path = os.path.relpath(img_path, parent_dir)
-            records.append({
-                "image_path": rel_path,
-                "set_type": "train"
-            })
-            train_count += 1
-    
-    # Process test directory
     print(f"Scanning test directory: {test_dir}")
-    test_count = 0
-    for img_file in sorted(os.listdir(test_dir)):
-        if img_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-            img_path = os.path.join(test_dir, img_file)
-            # Use relative path from BASE_DATA_DIR parent for cleaner paths
-            rel_path = os.path.relpath(img_path, parent_dir)
-            records.append({
-                "image_path": rel_path,
-                "set_type": "test"
-            })
-            test_count += 1
-    
-    # Write CSV file
-    print(f"\nWriting dataset_info.csv: {CSV_FILE}")
-    with open(CSV_FILE, mode="w", newline="") as csvfile:
-        fieldnames = ["image_path", "set_type"]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(records)
-    
+    # Paths relative to BASE_DATA_DIR's parent for cleaner paths
+    records, probed = scan_frames({"train": train_dir, "test": test_dir}, parent_dir, known, threads)
+    removed = set(known) - {row["image_path"] for row in records}
+    train_count = sum(1 for row in records if row["set_type"] == "train")
+    test_count = len(records) - train_count
+
+    # Write CSV file (only when a row was added, changed or removed)
+    if probed or removed or list(known) != [row["image_path"] for row in records]:
+        print(f"\nWriting dataset_info.csv: {CSV_FILE}")
+        tmp_path = CSV_FILE + ".tmp"
+        with instrument.span("csv_write", rows=len(records)), open(tmp_path, mode="w", newline="") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=DATASET_INFO_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+        os.replace(tmp_path, CSV_FILE)
+    else:
+        print(f"\ndataset_info.csv is up to date: {CSV_FILE}")
+
+    # The frame registry (used by ingestion) follows this full scan, e.g. after frames were added by hand
+    with FrameRegistry(os.path.join(BASE_DATA_DIR, REGISTRY_FILE)) as registry:
+        registry.sync(records)
+        registry.mark_exported(CSV_FILE)
+
+    resize = sum(1 for row in records if (row["width"], row["height"]) != ("800", "600"))
     print(f"\nDataset info generated successfully!")
     print(f"Total train images: {train_count}")
     print(f"Total test images: {test_count}")
     print(f"Total images: {train_count + test_count}")
+    print(f"New/changed frames probed: {len(probed)}, removed: {len(removed)}")
+    if resize:
+        print(f"Frames not at 800x600 (resized when tiled): {resize}")
     print(f"CSV file: {CSV_FILE}")
 
 
-if __name__ == "__main__":
-    generate_dataset_info()
+def cli(argv=None):
+    """Rescan the frame folders into dataset_info.csv."""
+    parser = argparse.ArgumentParser(description="Generate dataset_info.csv from frames_dataset.")
+    parser.add_argument("--threads", type=int, default=PROBE_THREADS,
+                        help="Threads reading image headers of new/changed frames")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    instrument.run_cli("dataset_info", lambda args: generate_dataset_info(threads=args.threads), args)
 
+
+if __name__ == "__main__":
+    cli()
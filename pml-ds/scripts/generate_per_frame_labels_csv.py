@@ -19,14 +19,14 @@ Each row represents ONE TILE (64 rows per image).
 - cell_row: 1-8 (row in 8x8 grid)
 - cell_col: 1-8 (column in 8x8 grid)
 - label: 0 (none), 1 (ball), 2 (bat), 3 (stump)
-- c1 to c64: default 0.0 (float values)
+- c1 to c64: per-tile descriptors (float values, see below)
 
 Example:
 --------
-frame_0084_grid_overlay.png,1,1,1,0,0.0,0.0,...,0.0
-frame_0084_grid_overlay.png,2,1,2,0,0.0,0.0,...,0.0
+frame_0084_grid_overlay.png,1,1,1,0,0.4216,0.4471,...,0.3725
+frame_0084_grid_overlay.png,2,1,2,0,0.4102,0.4398,...,0.3961
 ...
-frame_0084_grid_overlay.png,64,8,8,0,0.0,0.0,...,0.0
+frame_0084_grid_overlay.png,64,8,8,0,0.2871,0.5533,...,0.2118
 
 Label Mapping:
 --------------
@@ -40,8 +40,30 @@ Features:
 - Generates one consolidated CSV file per split
 - Each row = one tile (64 rows per image)
 - Default label is 0 (none) for all tiles
-- Default c1-c64 values are 0.0 (float)
-- Preserves existing tiles if they exist
+- c1-c64 hold 64 descriptors of the tile, all in [0, 1] (src/tile_features.py):
+  mean/std R,G,B, 8-bin R/G/B and hue histograms, edge density, mean
+  gradient, 8-bin gradient orientation histogram and a 4x4 luminance
+  thumbnail. They are computed for the whole 8x8 grid of a frame at once,
+  in parallel worker processes (--workers), and cached by frame content
+  hash in frames_dataset_tiles/.tile_features.sqlite: frames tiled by
+  split_8x8_grid_numbered.py, or relabeled only, are not decoded again.
+  --no-features writes 0.0 instead; extra grid levels always have 0.0.
+- Picks up hand-made labels from {frame}_tiles/{frame}_labels.csv, via the
+  indexed label store frames_dataset_tiles/labels.sqlite (only files that
+  changed since the last run are read; tools may also write the store directly)
+- Does not write tiles (and only decodes frames whose descriptors are not
+  cached): split_8x8_grid_numbered.py writes the canonical
+  {frame}_tile_NN.png set and these CSVs in one pass. Run this
+  script on its own to refresh the CSVs after labeling.
+- Incremental: a manifest (frame content hash + label store write time)
+  limits the work to frames that are new, changed or relabeled; their rows
+  replace the old ones in place. Use --full to rebuild from scratch (rows of
+  frames that only exist as tiles, e.g. streamed by video_to_tiles.py
+  without --save-frames, are kept: there is nothing to rebuild them from).
+- Extra grid levels (--levels 4x4,16x16): also refreshes the tables under
+  frames_dataset_tiles/grid_CxR/{split}/, with labels derived from the 8x8
+  labels (a coarse cell takes the most frequent non-zero label of its fine
+  cells, a fine cell the label of the coarse cell containing it)
 
 Author: Cordial Dude
 ----------------------------------------------------
@@ -49,9 +71,10 @@ Author: Cordial Dude
 
 import os
 import sys
-import cv2
+import csv
+import argparse
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
 # Add parent directory to path to find src module
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -60,8 +83,15 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 # Import utilities from your shared modules
-from src.utils import read_image, ensure_dir
-from src.grid_split import split_image_into_grid
+from src.utils import ensure_dir, rewrite_csv
+from src.manifest import Manifest, diff
+from src.labels import label_columns, labels_csv_path, build_label_table, write_label_table, \
+    write_binary_table
+from src.label_store import LabelStore
+from src.label_stats import LabelStatsCache, stats_cache_path, update_stats_cache
+from src.pyramid import parse_levels, level_name, level_dir, nests, derive_labels
+from src.tile_features import FeatureCache, compute_features, FEATURE_VERSION
+from src import instrument
 
 
 # ================= CONFIGURATION =================
@@ -71,127 +101,203 @@ BASE_DATA_DIR = os.path.join(BASE_DIR, "frames_dataset")
 TILES_BASE_DIR = os.path.join(BASE_DIR, "frames_dataset_tiles")
 GRID_COLS, GRID_ROWS = 8, 8
 NUM_TILES = GRID_COLS * GRID_ROWS  # 64 tiles
-
-# Label map (as per modeling task)
-LABEL_MAP = {
-    "none": 0,
-    "ball": 1,
-    "bat": 2,
-    "stump": 3  # Note: requirement says "stump" not "stumps"
-}
+# State files in TILES_BASE_DIR (joined at call time: see tiles_file())
+MANIFEST_NAME = ".manifest.sqlite"
+LABEL_STORE_NAME = "labels.sqlite"
+FEATURE_CACHE_NAME = ".tile_features.sqlite"
+STAGE = "labels"
+LEVEL_LABEL_REDUCE = "any"  # Coarse cell label: most frequent non-zero fine label
+IMG_W, IMG_H = 800, 600  # Frames are tiled (and described) at this size
 # =================================================
 
 
-def process_split(split_name: str):
-    """Process 'train' or 'test' split to generate consolidated labels CSV."""
+def tiles_file(name: str) -> str:
+    """Path of a state file (manifest, label store, feature cache) in the current TILES_BASE_DIR."""
+    return os.path.join(TILES_BASE_DIR, name)
+
+
+def tiled_only_frames(split_name: str, frame_ids) -> set:
+    """
+    Frames of a split that only exist as tiles (in tiles_info.csv, but with no source frame).
+
+    video_to_tiles.py ingests frames without --save-frames this way; a full
+    rebuild cannot recompute their rows, so it keeps them.
+    """
+    tiles_info = os.path.join(TILES_BASE_DIR, "tiles_info.csv")
+    if not os.path.exists(tiles_info):
+        return set()
+    with open(tiles_info, newline="") as f:
+        tiled = {row["parent_image"] for row in csv.DictReader(f) if row["set_type"] == split_name}
+    return tiled - set(frame_ids)
+
+
+def labels_signature(frame_hash: str, label_version, features: bool = False) -> str:
+    """Manifest signature of a frame's labels: frame content + label store write time (+ feature layout)."""
+    signature = f"{frame_hash}:{label_version if label_version is not None else '-'}"
+    return signature + f":f{FEATURE_VERSION}" if features else signature
+
+
+def process_split(split_name: str, binary: str = None, full: bool = False, level: tuple = None,
+                  features: bool = True, workers: int = 1):
+    """
+    Process 'train' or 'test' split to generate consolidated labels CSV.
+
+    The table is built column-wise from arrays (frame ids, a 64-cell template,
+    a frames x 64 label matrix, a float32 c1-c64 matrix); ``binary`` ("npz" or
+    "parquet") also writes a binary columnar copy next to the CSV. Unless
+    ``full``, only new/changed/relabeled frames are rebuilt. With ``level``
+    ((cols, rows) other than 8x8) the table of that grid level is built
+    instead, from labels derived from the 8x8 ones. With ``features`` the
+    c-columns of the 8x8 table get the tile descriptors of each rebuilt
+    frame (cached ones reused, the rest computed on ``workers`` processes).
+    """
+    grid_cols, grid_rows = level or (GRID_COLS, GRID_ROWS)
+    num_tiles = grid_cols * grid_rows
+    features = features and level is None
+    stage = STAGE if level is None else f"{STAGE}:{level_name(level)}"
     frames_dir = os.path.join(BASE_DATA_DIR, split_name)
     tiles_split_dir = os.path.join(TILES_BASE_DIR, split_name)
+    output_split_dir = tiles_split_dir if level is None else os.path.join(level_dir(TILES_BASE_DIR, level),
+                                                                        split_name)
     ensure_dir(tiles_split_dir)
-    
+    ensure_dir(output_split_dir)
+
     # Output CSV path: frames_dataset_tiles/{train|test}/objects_{split}_dataset.csv
-    if split_name == "train":
-        output_csv_path = os.path.join(tiles_split_dir, "objects_train_dataset.csv")
+    output_csv_path = labels_csv_path(output_split_dir, split_name)
+
+    with Manifest(tiles_file(MANIFEST_NAME)) as manifest, LabelStore(tiles_file(LABEL_STORE_NAME)) as store:
+        with instrument.span("scan"):
+            frame_hashes = manifest.scan(frames_dir)
+        path_ids = {path: os.path.splitext(os.path.basename(path))[0] for path in frame_hashes}
+        # Pull edited per-frame labels CSVs into the store (unchanged files are only stat'ed)
+        with instrument.span("label_sync", frames=len(path_ids)):
+            store.sync_frame_csvs(tiles_split_dir, path_ids.values())
+        versions = store.versions()
+        signatures = {path: labels_signature(frame_hash, versions.get(path_ids[path]), features)
+                      for path, frame_hash in frame_hashes.items()}
+
+        full = full or not os.path.exists(output_csv_path)
+        recorded = {} if full else manifest.recorded(stage, frames_dir)
+        pending, removed = diff(signatures, recorded)
+        # A full rebuild keeps the rows of frames it has no source for
+        kept = tiled_only_frames(split_name, path_ids.values()) \
+            if full and os.path.exists(output_csv_path) else set()
+
+        print(f"\nProcessing {split_name.upper()} split - {len(signatures)} frames found, "
+              f"{len(pending)} new/changed, {len(removed)} removed")
+        if kept:
+            print(f"Keeping the rows of {len(kept)} frames that only exist as tiles (no source frame)")
+
+        # Prepare column names: image_filename,cell_number,cell_row,cell_col,label,c1,c2,...,c64
+        column_names = label_columns(num_tiles)
+
+        # One label vector (64 tiles) per new/changed image, in a single store query
+        frame_ids = [path_ids[path] for path in pending]
+        with instrument.span("label_query", frames=len(frame_ids)):
+            labels = store.label_matrix(frame_ids, NUM_TILES)
+            labels = derive_labels(labels, (GRID_COLS, GRID_ROWS), (grid_cols, grid_rows), LEVEL_LABEL_REDUCE)
+
+        # c1-c64: tile descriptors of the rebuilt frames (from the cache when the frame is unchanged)
+        tile_features = None
+        if features and pending:
+            with FeatureCache(tiles_file(FEATURE_CACHE_NAME)) as cache:
+                by_path = compute_features({path: frame_hashes[path] for path in pending}, cache,
+                                           (IMG_W, IMG_H), grid_cols, grid_rows, workers=workers)
+            tile_features = np.concatenate([by_path[path] for path in pending])
+
+        # Build the table column-wise and save to CSV (+ optional binary copy)
+        with instrument.span("build_table", rows=len(frame_ids) * num_tiles):
+            df = build_label_table(frame_ids, labels, tile_features, cols=grid_cols, rows=grid_rows)
+        with instrument.span("csv_write", rows=len(df)):
+            if full and not kept:
+                written = write_label_table(df, output_csv_path, binary=binary)
+            elif pending or removed or kept:
+                if full:
+                    # Rebuild everything but the rows of tile-only frames
+                    kept_rows = {f"{frame_id}_grid_overlay.png" for frame_id in kept}
+                    drop = lambda row: row[0] not in kept_rows
+                else:
+                    # Replace the rows of changed/removed frames, keep everything else as is
+                    replaced = {f"{frame_id}_grid_overlay.png" for frame_id in frame_ids}
+                    replaced |= {f"{os.path.splitext(os.path.basename(path))[0]}_grid_overlay.png"
+                                 for path in removed}
+                    drop = lambda row: row[0] in replaced
+                delta_csv = output_csv_path + ".delta"
+                df.to_csv(delta_csv, index=False, header=False)
+                previous = LabelStatsCache.signature(output_csv_path)
+                rewrite_csv(output_csv_path, column_names, drop=drop,
+                            appended=[delta_csv], lineterminator="\n")
+                os.remove(delta_csv)
+                if level is None and not full:
+                    # Same rows dropped/appended in the label stats cache (check_label_distribution.py)
+                    update_stats_cache(stats_cache_path(output_split_dir, split_name), output_csv_path, previous,
+                                       frame_ids, labels, [os.path.splitext(os.path.basename(path))[0]
+                                                           for path in removed])
+                written = [output_csv_path]
+            else:
+                written = []
+            if binary is not None and (kept or not full) and (written or not os.path.exists(
+                    os.path.splitext(output_csv_path)[0] + "." + binary)):
+                # The binary copy always mirrors the whole table
+                written = [output_csv_path, write_binary_table(pd.read_csv(output_csv_path),
+                                                               output_csv_path, binary)]
+
+        manifest.forget(stage, removed)
+        for path in pending:
+            manifest.record(stage, path, signatures[path], [output_csv_path])
+
+    if written:
+        print(f"\nGenerated labels CSV: {output_csv_path}")
     else:
-        output_csv_path = os.path.join(tiles_split_dir, "objects_test_dataset.csv")
-
-    frame_files = sorted([
-        f for f in os.listdir(frames_dir)
-        if f.lower().endswith((".png", ".jpg", ".jpeg"))
-    ])
-
-    print(f"\nProcessing {split_name.upper()} split - {len(frame_files)} frames found")
-
-    # Prepare column names: image_filename,cell_number,cell_row,cell_col,label,c1,c2,...,c64
-    column_names = ["image_filename", "cell_number", "cell_row", "cell_col", "label"] + [f"c{i}" for i in range(1, NUM_TILES + 1)]
-    
-    # List to store all tile records (64 rows per image)
-    all_records = []
-
-    for fname in tqdm(frame_files, desc=f"Processing {split_name}"):
-        frame_id = os.path.splitext(fname)[0]
-        img_path = os.path.join(frames_dir, fname)
-        
-        # Create output folder for tiles
-        frame_tile_dir = os.path.join(tiles_split_dir, f"{frame_id}_tiles")
-        ensure_dir(frame_tile_dir)
-        
-        # Check if tiles already exist
-        first_tile_path = os.path.join(frame_tile_dir, "tile_01.png")
-        tiles_exist = os.path.exists(first_tile_path)
-        
-        if not tiles_exist:
-            # Generate tiles if they don't exist
-            img = read_image(img_path)
-            
-            # Split into 8×8 grid tiles
-            tiles = split_image_into_grid(img, cols=GRID_COLS, rows=GRID_ROWS)
-            if len(tiles) != NUM_TILES:
-                print(f"WARNING: {fname}: Expected {NUM_TILES} tiles, got {len(tiles)} — skipping")
-                continue
-
-            # Save tiles
-            for i, tile in enumerate(tiles):
-                tile_filename = f"tile_{i+1:02d}.png"
-                tile_path = os.path.join(frame_tile_dir, tile_filename)
-                cv2.imwrite(tile_path, cv2.cvtColor(tile, cv2.COLOR_RGB2BGR))
-        
-        # Image filename: use grid overlay name format (e.g., "frame_0084_grid_overlay.png")
-        image_filename = f"{frame_id}_grid_overlay.png"
-        
-        # Check if there's an existing per-frame CSV with labels
-        per_frame_csv = os.path.join(frame_tile_dir, f"{frame_id}_labels.csv")
-        existing_labels = {}
-        
-        if os.path.exists(per_frame_csv):
-            # Load existing labels if per-frame CSV exists
-            try:
-                existing_df = pd.read_csv(per_frame_csv)
-                # Map existing labels by TileIndex
-                for _, row in existing_df.iterrows():
-                    tile_idx = int(row['TileIndex'])
-                    label_code = int(row['LabelCode'])
-                    existing_labels[tile_idx] = label_code
-            except Exception as e:
-                print(f"Warning: Could not read existing labels for {frame_id}: {e}")
-        
-        # Generate 64 rows (one per tile) for this image
-        tile_index = 1
-        for row_idx in range(1, GRID_ROWS + 1):  # 1 to 8
-            for col_idx in range(1, GRID_COLS + 1):  # 1 to 8
-                # Get label from existing labels or default to 0
-                label = existing_labels.get(tile_index, LABEL_MAP["none"])
-                
-                # Create record for this tile
-                record = {
-                    "image_filename": image_filename,
-                    "cell_number": tile_index,
-                    "cell_row": row_idx,
-                    "cell_col": col_idx,
-                    "label": label
-                }
-                
-                # Add c1 to c64 columns, all default to 0.0 (float)
-                for c in range(1, NUM_TILES + 1):
-                    record[f"c{c}"] = 0.0
-                
-                all_records.append(record)
-                tile_index += 1
-    
-    # Create DataFrame and save to CSV
-    df = pd.DataFrame(all_records, columns=column_names)
-    df.to_csv(output_csv_path, index=False)
-    
-    print(f"\nGenerated labels CSV: {output_csv_path}")
-    print(f"Total images: {len(frame_files)}")
-    print(f"Total tile rows: {len(all_records)} (64 rows per image)")
-    print(f"CSV columns: {len(column_names)} (image_filename, cell_number, cell_row, cell_col, label, c1-c64)")
+        print(f"\nLabels CSV up to date: {output_csv_path}")
+    for path in written[1:]:
+        print(f"Generated binary labels table: {path}")
+    print(f"Total images: {len(signatures)}")
+    print(f"Rebuilt tile rows: {len(df)} ({num_tiles} rows per image)")
+    print(f"CSV columns: {len(column_names)} (image_filename, cell_number, cell_row, cell_col, label, "
+          f"c1-c{num_tiles})")
 
 
-if __name__ == "__main__":
-    for split in ["train", "test"]:
-        process_split(split)
+def cli(argv=None):
+    """Rebuild or refresh the consolidated label CSVs of both splits."""
+    parser = argparse.ArgumentParser(description="Generate consolidated per-tile label CSVs.")
+    parser.add_argument("--binary", choices=["npz", "parquet"], default=None,
+                        help="Also write a binary columnar copy of each table")
+    parser.add_argument("--full", action="store_true",
+                        help="Rebuild every frame's rows instead of only new/changed ones "
+                             "(rows of frames without a source frame are kept)")
+    parser.add_argument("--levels", type=parse_levels, default=[], metavar="CxR[,CxR...]",
+                        help="Also build the tables of these extra grid levels (e.g. 4x4,16x16), "
+                             "as tiled by split_8x8_grid_numbered.py --levels")
+    parser.add_argument("--no-features", action="store_true",
+                        help="Write 0.0 to c1-c64 instead of per-tile descriptors")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes computing tile descriptors (0 = all CPUs)")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    for level in args.levels:
+        if not nests(level, (GRID_COLS, GRID_ROWS)):
+            parser.error(f"grid level {level_name(level)} does not nest with {GRID_COLS}x{GRID_ROWS}")
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+
+    def run(args):
+        for split in ["train", "test"]:
+            process_split(split, binary=args.binary, full=args.full, features=not args.no_features,
+                          workers=workers)
+            for level in args.levels:
+                if level != (GRID_COLS, GRID_ROWS):
+                    process_split(split, binary=args.binary, full=args.full, level=level)
+
+    instrument.run_cli("labels", run, args)
     print("\nAll label CSVs generated successfully!")
     print("Note: One CSV file per split (train/test) with all tiles")
     print("Each image generates 64 rows (one per tile)")
     print("Default label is 0 (none) for all tiles")
-    print("Default c1-c64 values are 0.0 (float)")
+    if args.no_features:
+        print("c1-c64 values are 0.0 (float)")
+    else:
+        print("c1-c64 hold per-tile descriptors (see src/tile_features.py)")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+pack_shards.py
+----------------------------------------------------
+Packages the tiled dataset into append-only tar shards for shipping to
+training nodes (replaces re-zipping all of frames_dataset_tiles/).
+
+Frames listed in tiles_info.csv are packed --shard-frames at a time
+(grid overlay + tiles) into frames_dataset_tiles_shards/shard-NNNNNN.tar.gz,
+each with an index of member offsets (src/dataset_shards.py). Only frames
+that are new or were re-tiled since the last run are packed; existing
+shards are never rewritten, so shipping a dataset update means copying
+the new shard files and catalog.sqlite. Shards are compressed in parallel
+worker processes.
+
+By default only full shards are written and the remaining frames wait
+for the next run; --flush also writes them as a smaller last shard.
+Frames tiled with --output packed are skipped (their split store is
+already a single file).
+
+Usage (from pml-ds/):
+    python scripts/pack_shards.py
+    python scripts/pack_shards.py --flush --workers 4
+
+Reading shards:
+    from src.dataset_shards import ShardReader
+    reader = ShardReader("frames_dataset_tiles_shards")
+    tile = reader.tile("train", "frame_0084", 12)        # one seek + read
+    for set_type, frame_id, tile_index, name, data in reader: ...   # sequential
+
+Author: Cordial Dude
+----------------------------------------------------
+"""
+
+import os
+import sys
+import csv
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Determine base directory (pml-ds) regardless of where script is run from
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from src.dataset_shards import ShardCatalog, write_shard, shard_name, SHARD_DIR, SHARD_FRAMES, COMPRESSIONS
+from src.tile_store import STORE_DATA
+from src import instrument
+
+# ================= CONFIGURATION =================
+TILES_BASE_DIR = os.path.join(parent_dir, "frames_dataset_tiles")
+TILES_CSV = os.path.join(TILES_BASE_DIR, "tiles_info.csv")
+OUTPUT_DIR = os.path.join(parent_dir, SHARD_DIR)
+COMPRESS_LEVEL = 6
+# =================================================
+
+
+def dataset_frames():
+    """(set_type, parent_image) -> [(tile_index, tile_path)] from tiles_info.csv, in file order."""
+    frames = {}
+    skipped = set()
+    with instrument.span("csv_read"), open(TILES_CSV, newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if not row:
+                continue
+            tile_path, set_type, parent_image, tile_index = row[0], row[1], row[2], int(row[5])
+            key = (set_type, parent_image)
+            if tile_path.endswith(STORE_DATA):
+                skipped.add(key)
+                continue
+            frames.setdefault(key, {})[tile_index] = tile_path  # Last row wins
+    return {key: sorted(tiles.items()) for key, tiles in frames.items()}, skipped
+
+
+def frame_members(set_type, parent_image, tiles):
+    """Members of one frame (overlay first, then tiles) and its signature."""
+    folder = f"{set_type}/{parent_image}_tiles"
+    members = []
+    overlay = os.path.join(TILES_BASE_DIR, set_type, f"{parent_image}_tiles", f"{parent_image}_grid_overlay.png")
+    h = hashlib.blake2b(repr(tiles).encode(), digest_size=16)
+    if os.path.exists(overlay):
+        st = os.stat(overlay)
+        h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())  # Re-tiling rewrites the overlay
+        members.append((f"{folder}/{parent_image}_grid_overlay.png", overlay, set_type, parent_image, ""))
+    for tile_index, tile_path in tiles:
+        ext = os.path.splitext(tile_path)[1]
+        members.append((f"{folder}/{parent_image}_tile_{tile_index:02d}{ext}", os.path.join(parent_dir, tile_path),
+                        set_type, parent_image, tile_index))
+    return members, h.hexdigest()
+
+
+def pack_shards(shard_frames=SHARD_FRAMES, workers=0, compress="gzip", level=COMPRESS_LEVEL, flush=False):
+    """Pack new/re-tiled frames into new shards; returns the number of shards written."""
+    if not os.path.exists(TILES_CSV):
+        print(f"Error: {TILES_CSV} not found. Run split_8x8_grid_numbered.py first.")
+        sys.exit(1)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    frames, skipped = dataset_frames()
+    with ShardCatalog(OUTPUT_DIR) as catalog:
+        packed = catalog.signatures()
+        catalog.remove_frames([key for key in packed if key not in frames])
+
+        pending = []
+        with instrument.span("scan", frames=len(frames)):
+            for (set_type, parent_image), tiles in frames.items():
+                members, signature = frame_members(set_type, parent_image, tiles)
+                if packed.get((set_type, parent_image)) != signature:
+                    pending.append(((set_type, parent_image, signature), members))
+
+        full = len(pending) - len(pending) % shard_frames
+        batches = [pending[i:i + shard_frames] for i in range(0, len(pending) if flush else full, shard_frames)]
+        waiting = len(pending) - sum(len(batch) for batch in batches)
+        print(f"Frames: {len(frames)} ({len(frames) - len(pending)} already packed, {len(pending)} new/changed)")
+        if skipped:
+            print(f"  Skipped {len(skipped)} frames stored in packed tile stores")
+
+        first = catalog.next_number()
+        jobs = {}
+        with instrument.span("pack", frames=len(pending) - waiting), \
+                ProcessPoolExecutor(max_workers=min(workers, max(1, len(batches)))) as pool:
+            for number, batch in enumerate(batches, start=first):
+                members = [m for _, frame_files in batch for m in frame_files]
+                file = shard_name(number, compress)
+                future = pool.submit(write_shard, os.path.join(OUTPUT_DIR, file), members, compress, level)
+                jobs[future] = (number, file, [frame for frame, _ in batch])
+            # A shard counts once it is complete and in the catalog; an interrupted run redoes the rest
+            for future in as_completed(jobs):
+                number, file, batch_frames = jobs[future]
+                rows = future.result()
+                catalog.add_shard(number, file, batch_frames, len(rows))
+                print(f"  {file}: {len(batch_frames)} frames, {len(rows)} members")
+
+    print(f"\nShards written: {len(batches)} in {OUTPUT_DIR}")
+    if waiting:
+        print(f"Frames waiting for a full shard: {waiting} (use --flush to pack them now)")
+    return len(batches)
+
+
+def cli(argv=None):
+    """Pack the frames tiled since the last run into tar shards."""
+    parser = argparse.ArgumentParser(description="Pack new/re-tiled frames into append-only tar shards.")
+    parser.add_argument("--shard-frames", type=int, default=SHARD_FRAMES, help="Frames per shard")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes compressing shards (0 = all CPUs)")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default="gzip",
+                        help="gzip: .tar.gz with one gzip member per file (still seekable); none: plain .tar")
+    parser.add_argument("--level", type=int, default=COMPRESS_LEVEL, help="gzip compression level (1-9)")
+    parser.add_argument("--flush", action="store_true",
+                        help="Also pack the frames left over after the last full shard")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    instrument.run_cli("pack_shards", lambda args: pack_shards(
+        shard_frames=args.shard_frames, workers=args.workers, compress=args.compress,
+        level=args.level, flush=args.flush), args)
+
+
+if __name__ == "__main__":
+    cli()
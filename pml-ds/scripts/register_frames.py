@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+register_frames.py
+----------------------------------------------------
+Numbers freshly extracted frames, assigns them to train or test and
+updates dataset_info.csv, using the frame registry
+(frames_dataset/.frame_registry.sqlite) instead of listing the dataset.
+
+youtube_video_to_frames.sh/.ps1 let ffmpeg write frame_0001.png,
+frame_0002.png, ... straight into frames_dataset/ and then call this
+script, which:
+- reserves one block of frame numbers from the registry counter (one
+  SQLite update, however many frames the dataset already has)
+- assigns each new frame to test or train from a hash of its new name
+  (about 20% test; adding frames never moves existing ones)
+- renames the frames into frames_dataset/{train,test}/ in-process
+- appends their rows (size, mtime, width, height, format from the image
+  header) to dataset_info.csv
+
+The first run on an existing dataset fills the registry from the frame
+folders once; existing frames keep their split.
+
+Usage (from pml-ds/):
+    python scripts/register_frames.py                      # frames_dataset/frame_*.png
+    python scripts/register_frames.py --incoming some/dir
+
+Author: Cordial Dude
+----------------------------------------------------
+"""
+
+import os
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Determine base directory (pml-ds) regardless of where script is run from
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+BASE_DATA_DIR = os.path.join(parent_dir, "frames_dataset")
+CSV_FILE = os.path.join(BASE_DATA_DIR, "dataset_info.csv")
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from src.frame_registry import dataset_registry, registry_path, assign_split, FRAME_RE
+from src.frame_scan import PROBE_THREADS, probe_image
+from src.manifest import IMAGE_EXTS
+from src import instrument
+
+
+def register_frames(incoming_dir=BASE_DATA_DIR, threads=PROBE_THREADS):
+    """Move the frames in ``incoming_dir`` into the dataset under new numbers; returns how many."""
+    with instrument.span("scan"), os.scandir(incoming_dir) as entries:
+        incoming = sorted(entry.name for entry in entries
+                          if FRAME_RE.match(entry.name) and entry.name.lower().endswith(IMAGE_EXTS)
+                          and entry.is_file())
+
+    with dataset_registry(threads) as registry:
+        if registry.last_frame:
+            print(f"Found existing frames. Continuing from frame_{registry.last_frame + 1:04d}")
+        if not incoming:
+            print(f"No new frames in {incoming_dir}")
+            return 0
+
+        first = registry.allocate(len(incoming))
+        moves = []
+        for num, name in enumerate(incoming, start=first):
+            frame_id = f"frame_{num:04d}"
+            set_type = assign_split(frame_id)
+            dst = os.path.join(BASE_DATA_DIR, set_type, frame_id + os.path.splitext(name)[1].lower())
+            moves.append((os.path.join(incoming_dir, name), dst, set_type))
+
+        for set_type in ["train", "test"]:
+            os.makedirs(os.path.join(BASE_DATA_DIR, set_type), exist_ok=True)
+        with instrument.span("file_write", files=len(moves)):
+            for src, dst, _ in moves:
+                os.replace(src, dst)
+
+        rows = []
+        with instrument.span("probe", files=len(moves)), ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+            for (_, dst, set_type), (width, height, fmt) in zip(moves, pool.map(probe_image, [m[1] for m in moves])):
+                st = os.stat(dst)
+                rows.append({"image_path": registry_path(dst), "set_type": set_type,
+                             "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                             "width": width, "height": height, "format": fmt})
+        registry.add(rows)
+        with instrument.span("csv_write", rows=len(rows)):
+            registry.export(CSV_FILE)
+        counts = registry.counts()
+
+    new_test = sum(1 for _, _, set_type in moves if set_type == "test")
+    print(f"\nNew frames added: {len(moves)} ({len(moves) - new_test} train, {new_test} test)")
+    print(f"Total train images: {counts.get('train', 0)}")
+    print(f"Total test images:  {counts.get('test', 0)}")
+    print(f"Dataset info updated: {CSV_FILE}")
+    return len(moves)
+
+
+def cli(argv=None):
+    """Number, split and register the frames dropped into --incoming."""
+    parser = argparse.ArgumentParser(description="Number new frames, split them and update dataset_info.csv.")
+    parser.add_argument("--incoming", default=BASE_DATA_DIR,
+                        help="Folder with the extracted frame_NNNN images (default: frames_dataset/)")
+    parser.add_argument("--threads", type=int, default=PROBE_THREADS,
+                        help="Threads reading image headers")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    instrument.run_cli("register_frames", lambda args: register_frames(args.incoming, threads=args.threads), args)
+
+
+if __name__ == "__main__":
+    cli()
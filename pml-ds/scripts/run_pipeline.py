@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+run_pipeline.py
+----------------------------------------------------
+Runs the whole video -> dataset pipeline in one process, with the stages
+overlapping instead of running one after another (run_pipeline.sh):
+
+    decode ──> frame     800x600 frame PNG + its dataset_info row
+           └─> tiles     grid overlay + 64 tiles, tiles_info rows, tile descriptors
+                 └─> labels     label rows of the frame (c1-c64 = descriptors)
+                       └─> merge      tiles_info.csv, objects_{split}_dataset.csv,
+                                      dataset_info.csv (every --merge-every frames)
+
+Every stage runs in its own thread(s), connected by bounded queues
+(src/pipeline.py): frame N is tiled while ffmpeg decodes frame N+1, and
+label rows are produced as soon as a frame's tiles are written. Nothing
+re-scans the folders another stage just wrote.
+
+Progress is checkpointed per frame in
+frames_dataset_tiles/.pipeline_checkpoint.sqlite. Running the same command
+again after a crash (or Ctrl+C) resumes: frames that went through every
+stage are skipped, finished stages of the others are not run again, and
+frame numbers stay the same. A frame's rows are dropped from the
+checkpoint once they are merged. Merged frames are also recorded in the tiling
+manifest, so a later split_8x8_grid_numbered.py run does not tile them again.
+
+Frame numbers come from the frame registry (src/frame_registry.py), and
+each new frame goes to test or train by a hash of its name (about 20%
+test, as with youtube_video_to_frames.sh). A URL is downloaded with yt-dlp
+first.
+
+Usage (from pml-ds/):
+    python scripts/run_pipeline.py video.mp4 --gap 2 --frames 300
+    python scripts/run_pipeline.py "https://www.youtube.com/watch?v=..." --gap 2 --frames 300
+
+Author: Cordial Dude
+----------------------------------------------------
+"""
+
+import os
+import sys
+import csv
+import time
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+# Add parent directory to path to find src module (and the tiling script)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+for path in (parent_dir, script_dir):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from src.video_ingest import iter_video_frames
+from src.labels import frame_label_rows
+from src.tile_writer import write_tile
+from src.frame_registry import FRAMES_DIR, dataset_registry, registry_path, frame_path, assign_split
+from src.manifest import Manifest
+from src.pipeline import Pipeline, Checkpoint, QUEUE_SIZE
+import split_8x8_grid_numbered as tiling
+from src import instrument
+
+# ================= CONFIGURATION =================
+CHECKPOINT_FILE = os.path.join(tiling.DST_BASE, ".pipeline_checkpoint.sqlite")
+DOWNLOAD_DIR = os.path.join(tiling.SRC_BASE, ".downloads")
+DATASET_INFO_FILE = os.path.join(FRAMES_DIR, "dataset_info.csv")
+TILE_WORKERS = 2        # Threads tiling frames (PNG encodes release the GIL)
+MERGE_EVERY = 50        # Frames between merges into the dataset CSVs
+# =================================================
+
+
+def is_url(video):
+    return video.startswith(("http://", "https://"))
+
+
+def download(url):
+    """Download a video with yt-dlp (kept until the run completes, so a resumed run reuses it)."""
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    path = os.path.join(DOWNLOAD_DIR, hashlib.blake2b(url.encode(), digest_size=8).hexdigest() + ".mp4")
+    if not os.path.exists(path):
+        print("Downloading video locally for stable processing...")
+        with instrument.span("download"):
+            subprocess.run(["yt-dlp", "-f", "best[ext=mp4]", "-o", path + ".part.mp4", "--no-playlist", url],
+                           check=True)
+        os.replace(path + ".part.mp4", path)
+    return path
+
+
+def run_id(video, gap, total_frames):
+    """Identity of a run: the video (URL, or file + size + mtime) and how it is sampled."""
+    if is_url(video):
+        source = video
+    else:
+        st = os.stat(video)
+        source = f"{os.path.abspath(video)}:{st.st_size}:{st.st_mtime_ns}"
+    return f"{source}|gap={gap}|frames={total_frames}"
+
+
+def frame_name(checkpoint, registry, key):
+    """(set_type, frame_id) of a frame; its number is allocated the first time the frame is seen."""
+    name = checkpoint.get(key, "name")
+    if name is None:
+        frame_id = f"frame_{registry.allocate(1):04d}"
+        name = [assign_split(frame_id), frame_id]
+        checkpoint.done(key, "name", name)
+    return tuple(name)
+
+
+def save_frame(key, item):
+    """Write the full frame (atomically) and return its dataset_info row."""
+    set_type, frame_id, frame = item
+    path = os.path.join(tiling.SRC_BASE, set_type, f"{frame_id}.png")
+    with instrument.span("file_write", files=1):
+        write_tile(frame, path, atomic=True)
+    st = os.stat(path)
+    return {"image_path": registry_path(path), "set_type": set_type, "size": str(st.st_size),
+            "mtime_ns": str(st.st_mtime_ns), "width": str(frame.shape[1]), "height": str(frame.shape[0]),
+            "format": "PNG"}
+
+
+def tile(key, item):
+    set_type, frame_id, frame = item
+    dst_folder = os.path.join(tiling.DST_BASE, set_type, f"{frame_id}_tiles")
+    features = {}
+    rows = tiling.tile_frame(frame, frame_id, dst_folder, set_type, features=features)
+    return {"set_type": set_type, "frame_id": frame_id, "rows": rows, "features": features[frame_id].tolist()}
+
+
+def label(key, item):
+    dst_folder = os.path.join(tiling.DST_BASE, item["set_type"], f"{item['frame_id']}_tiles")
+    return frame_label_rows(item["frame_id"], dst_folder, tiling.TILE_COLS, tiling.TILE_ROWS,
+                            features=item["features"])
+
+
+def merge_pending(checkpoint, keys):
+    """
+    Add the frames of ``keys`` that finished all stages to the dataset CSVs.
+
+    Only those frames' rows are read from the checkpoint, so a merge costs
+    the same however far into the video it happens; once merged, their rows
+    are dropped from the checkpoint. A merge interrupted half way is simply
+    done again (the CSV merges replace a frame's old rows).
+
+    Returns:
+        The keys merged
+    """
+    keys = sorted(key for key in keys if not checkpoint.has(key, "merged")
+                  and all(checkpoint.has(key, stage) for stage in ("frame", "tiles", "labels")))
+    if not keys:
+        return []
+    frames, tiles, labels = (checkpoint.results(stage, keys) for stage in ("frame", "tiles", "labels"))
+
+    # A directory of its own: never mixed up with the shards of another tool or run
+    os.makedirs(tiling.SHARD_DIR, exist_ok=True)
+    shard_dir = tempfile.mkdtemp(prefix="run_pipeline_", dir=tiling.SHARD_DIR)
+    tasks, results = [], []
+    for set_type in ["train", "test"]:
+        set_keys = [key for key in keys if tiles[key]["set_type"] == set_type]
+        if not set_keys:
+            continue
+        tiles_shard = os.path.join(shard_dir, f"{set_type}.csv")
+        labels_shard = os.path.join(shard_dir, f"{set_type}_labels.csv")
+        with instrument.span("csv_write", frames=len(set_keys)), \
+                open(tiles_shard, mode="w", newline="") as tiles_file, \
+                open(labels_shard, mode="w", newline="") as labels_file:
+            tiles_writer = csv.writer(tiles_file)
+            labels_writer = csv.writer(labels_file, lineterminator="\n")  # Match pandas output
+            for key in set_keys:
+                tiles_writer.writerows(tiles[key]["rows"])
+                labels_writer.writerows(labels[key])
+        frame_ids = [tiles[key]["frame_id"] for key in set_keys]
+        tasks.append((set_type, 0, [(f"{frame_id}.png", False) for frame_id in frame_ids], "png"))
+        results.append((tiles_shard, labels_shard, frame_ids, []))
+    tiling.merge_shards(tasks, results, removed={})
+    os.rmdir(shard_dir)
+    with instrument.span("csv_write", rows=len(keys)), dataset_registry() as registry:
+        registry.add([frames[key] for key in keys])
+        registry.export(DATASET_INFO_FILE)
+
+    # The tiling stage would otherwise see these frames as new on its next run
+    with instrument.span("manifest"), Manifest(tiling.MANIFEST_FILE) as manifest:
+        for set_type in ["train", "test"]:
+            signatures = manifest.scan(os.path.join(tiling.SRC_BASE, set_type))
+            for key in keys:
+                path = frame_path(frames[key]["image_path"])
+                if frames[key]["set_type"] == set_type and path in signatures:
+                    manifest.record(tiling.tiles_stage(), path, signatures[path],
+                                    tiling.frame_outputs(set_type, tiles[key]["frame_id"]))
+    checkpoint.complete(keys, "merged", drop=("frame", "tiles", "labels"))
+    return keys
+
+
+def run_pipeline(video, gap, total_frames, tile_workers=TILE_WORKERS, queue_size=QUEUE_SIZE,
+                 merge_every=MERGE_EVERY, backend=None, restart=False):
+    """Ingest up to ``total_frames`` frames of a video (path or URL) into the dataset, resumably."""
+    for base in (tiling.SRC_BASE, tiling.DST_BASE):
+        for set_type in ["train", "test"]:
+            os.makedirs(os.path.join(base, set_type), exist_ok=True)
+
+    with Checkpoint(CHECKPOINT_FILE, run_id(video, gap, total_frames)) as checkpoint:
+        if restart:
+            checkpoint.clear()
+        if checkpoint.has("", "complete"):
+            print("This video was already ingested with these settings (use --restart to run it again)")
+            return {}
+        # Frames a crashed run finished but did not merge
+        merge_pending(checkpoint, checkpoint.keys("labels") - checkpoint.keys("merged"))
+        resumed = len(checkpoint.keys("merged"))
+        if resumed:
+            print(f"Resuming: {resumed} frames already done")
+
+        video_path = download(video) if is_url(video) else video
+
+        def source():
+            frames = iter_video_frames(video_path, gap, total_frames,
+                                       size=(tiling.IMG_W, tiling.IMG_H), backend=backend)
+            with dataset_registry() as registry:
+                for i, frame in enumerate(instrument.timed_iter("decode", frames)):
+                    key = f"{i:06d}"
+                    set_type, frame_id = frame_name(checkpoint, registry, key)
+                    yield key, (set_type, frame_id, frame)
+
+        ready = set()  # Labelled frames not merged yet (some may still wait for their frame PNG)
+        since_merge = [0]
+
+        def merge(key, item):
+            ready.add(key)
+            since_merge[0] += 1
+            if merge_every and since_merge[0] >= merge_every:
+                since_merge[0] = 0
+                ready.difference_update(merge_pending(checkpoint, ready))
+
+        pipeline = Pipeline(checkpoint, queue_size=queue_size)
+        pipeline.add("frame", save_frame)
+        pipeline.add("tiles", tile, workers=tile_workers)
+        pipeline.add("labels", label, after="tiles")
+        pipeline.add("merge", merge, after="labels", checkpoint=False)
+
+        start = time.perf_counter()
+        stats = pipeline.run(source())
+        merge_pending(checkpoint, checkpoint.keys("labels") - checkpoint.keys("merged"))
+        stats["wall"] = (len(checkpoint.keys("merged")) - resumed, time.perf_counter() - start)
+
+        checkpoint.done("", "complete")
+        if is_url(video):
+            os.remove(video_path)
+    return stats
+
+
+def cli(argv=None):
+    """Ingest a video resumably and report the busy time of each stage."""
+    parser = argparse.ArgumentParser(description="Ingest a video into the tiled dataset with overlapping, "
+                                                 "checkpointed stages.")
+    parser.add_argument("video", help="Path to a local video file, or a video URL (downloaded with yt-dlp)")
+    parser.add_argument("--gap", type=float, default=2.0,
+                        help="Time gap between frames, in seconds")
+    parser.add_argument("--frames", type=int, default=300,
+                        help="Total number of frames to capture")
+    parser.add_argument("--tile-workers", type=int, default=TILE_WORKERS,
+                        help="Threads tiling frames")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="Frames that may wait in front of each stage")
+    parser.add_argument("--merge-every", type=int, default=MERGE_EVERY,
+                        help="Merge finished frames into the dataset CSVs every N frames (0 = only at the end)")
+    parser.add_argument("--backend", choices=["ffmpeg", "opencv"], default=None,
+                        help="Frame decoder (default: ffmpeg if on PATH, else OpenCV)")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore the checkpoint of an earlier run of this video and start over")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    stats = instrument.run_cli("pipeline", lambda args: run_pipeline(
+        args.video, args.gap, args.frames, tile_workers=args.tile_workers, queue_size=args.queue_size,
+        merge_every=args.merge_every, backend=args.backend, restart=args.restart), args)
+
+    if stats:
+        merged, wall = stats.pop("wall")
+        print("\nDone!")
+        print(f"New frames merged: {merged}")
+        print(f"{'stage':<10} {'frames':>7} {'busy s':>8}")
+        for name, (items, busy) in stats.items():
+            print(f"{name:<10} {items:>7} {busy:>8.2f}")
+        print(f"Wall time: {wall:.2f} s (slowest stage: {max(stats, key=lambda n: stats[n][1])})")
+        print(f"Metadata updated: {tiling.CSV_FILE}, {DATASET_INFO_FILE}")
+
+
+if __name__ == "__main__":
+    cli()
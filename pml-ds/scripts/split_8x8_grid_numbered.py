@@ -1,164 +1,670 @@
 import os
+import sys
 import csv
-import shutil
-from PIL import Image, ImageDraw, ImageFont
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Add parent directory to path to find src module
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from src.labels import label_columns, labels_csv_path, frame_label_rows
+from src.label_stats import LabelStatsCache, read_label_matrix, stats_cache_path, update_stats_cache
+from src.grid_split import split_images_into_grid
+from src.overlay import grid_overlay
+from src.tile_blobs import BlobIndex, BLOB_DIR
+from src.tile_store import TileStoreWriter, STORE_DATA, append_store, stored_frames
+from src.manifest import Manifest, diff
+from src.label_store import LabelStore
+from src.tile_writer import TileWriter, write_tile, DEFAULT_PNG_COMPRESSION, \
+    FAST_PNG_COMPRESSION, WRITER_THREADS, MAX_PENDING
+from src.utils import rewrite_csv, decode_image, resize_image
+from src.frame_scan import frame_sizes
+from src.pyramid import parse_levels, level_name, level_dir, tile_number_width, nests, derive_labels
+from src.tile_features import FeatureCache, grid_features, frame_features, FEATURE_VERSION
+from src import instrument
 
 # ===========================================================
 # Split 800x600 images into 8x8 (64 tiles)
-# + Semi-transparent yellow grid with black numbers
-# + Auto-generate/update metadata CSV (appends, doesn't overwrite)
-# + Safe reruns - skips existing tiles, preserves labeled data
+# + Semi-transparent yellow grid with black numbers (rendered once,
+#   blended onto each frame in one vectorized step)
+# + Auto-generate/update metadata CSV (rows of re-tiled frames are
+#   replaced, never duplicated)
+# + Rebuild objects_{split}_dataset.csv label tables in the same pass
+#   (each frame is decoded once; no second tiling step needed)
+# + Incremental reruns - a content-hash manifest picks out new or
+#   changed frames; everything else is left untouched
+# + Optional process-pool mode (--workers N) with per-chunk
+#   tiles_info shards merged in a deterministic order
+# + Optional packed output (--output packed): tiles go to one
+#   memory-mappable file per split instead of 64 PNGs per frame
+# + Tiles are encoded/written on a bounded thread pool (--writer-threads),
+#   overlapping with the decode of the next frame; PNG compression level
+#   (--png-compression, --fast) or raw .npy tiles (--output npy)
+# + Optional extra grid levels (--levels 4x4,16x16) cut from the same
+#   decoded frame, each with its own tiles_info.csv and label tables
+#   (labels derived from the 8x8 labels) under frames_dataset_tiles/grid_CxR/
+# + Optional content-addressed tiles (--dedup-tiles): each distinct tile is
+#   encoded and stored once under frames_dataset_tiles/tile_blobs/, and
+#   tiles_info rows of repeated tiles point at the shared file
+# + c1-c64 of the 8x8 label tables hold per-tile descriptors (color
+#   stats/histograms, edges, gradients, luminance; src/tile_features.py)
+#   computed from the decoded frame, cached by frame content hash
+#   (--no-features keeps them 0.0)
 # ===========================================================
 
 # --- Configuration ---
 SRC_BASE = "frames_dataset"              # Input dataset
 DST_BASE = "frames_dataset_tiles"        # Output tiles dataset
-ZIP_FILE = "frames_dataset_tiles.zip"    # Final compressed dataset
 TILE_COLS = 8
 TILE_ROWS = 8
 IMG_W, IMG_H = 800, 600
 TILE_W, TILE_H = IMG_W // TILE_COLS, IMG_H // TILE_ROWS
 DRAW_GRID = True
 CSV_FILE = os.path.join(DST_BASE, "tiles_info.csv")
+CSV_HEADER = ["tile_path", "set_type", "parent_image", "row", "col", "tile_index"]
+SHARD_DIR = os.path.join(DST_BASE, ".tiles_info_shards")
+CHUNK_SIZE = 16                          # Frames per worker task / shard
+PACKED_DIR = "packed_tiles"              # Per-split packed tile store (--output packed)
+MANIFEST_FILE = os.path.join(DST_BASE, ".manifest.sqlite")
+LABEL_STORE_FILE = os.path.join(DST_BASE, "labels.sqlite")  # Indexed hand-made labels
+LEVEL_LABEL_REDUCE = "any"               # Coarse cell label: most frequent non-zero fine label
+FEATURE_CACHE_FILE = os.path.join(DST_BASE, ".tile_features.sqlite")  # Tile descriptors by frame hash
 
-# --- Create output structure ---
-os.makedirs(os.path.join(DST_BASE, "train"), exist_ok=True)
-os.makedirs(os.path.join(DST_BASE, "test"), exist_ok=True)
-
-# --- Load font for numbering (cross-platform) ---
-FONT = None
-# Try common font paths for different operating systems
-font_paths = [
-    "Arial.ttf",  # Current directory
-    "/System/Library/Fonts/Helvetica.ttc",  # macOS
-    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",  # Linux
-    "C:/Windows/Fonts/arial.ttf",  # Windows
-    "C:/Windows/Fonts/Arial.ttf",  # Windows (alternative)
-]
-
-for font_path in font_paths:
-    try:
-        if os.path.exists(font_path):
-            FONT = ImageFont.truetype(font_path, 16)
-            break
-    except:
-        continue
-
-# Fallback to default font if no font found
-if FONT is None:
-    try:
-        FONT = ImageFont.truetype("arial.ttf", 16)  # Try lowercase
-    except:
-        FONT = ImageFont.load_default()
-
-# --- Create or append to metadata file ---
-csv_exists = os.path.exists(CSV_FILE)
-with open(CSV_FILE, mode="a", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    # Write header only if file is new
-    if not csv_exists:
-        writer.writerow(["tile_path", "set_type", "parent_image", "row", "col", "tile_index"])
-
-    def split_image(img_path, dst_folder, set_type):
-        """Splits a single 800x600 image into 64 tiles and adds grid overlay"""
-        base_name = os.path.splitext(os.path.basename(img_path))[0]
-        os.makedirs(dst_folder, exist_ok=True)
-        img = Image.open(img_path).convert("RGB")
-        w, h = img.size
-
-        # Resize safety
-        if w != IMG_W or h != IMG_H:
-            img = img.resize((IMG_W, IMG_H))
-
-        # Check if tiles already exist for this frame
-        grid_out_path = os.path.join(dst_folder, f"{base_name}_grid_overlay.png")
-        first_tile_path = os.path.join(dst_folder, f"{base_name}_tile_01.png")
-        
-        if os.path.exists(first_tile_path) and os.path.exists(grid_out_path):
-            print(f"  Skipping {base_name} - tiles already exist")
-            return False  # Indicate frame was skipped
-        
-        # === GRID OVERLAY VISUALIZATION ===
-        if DRAW_GRID:
-            grid_img = img.copy().convert("RGBA")
-            overlay = Image.new("RGBA", grid_img.size, (255, 255, 255, 0))
-            draw = ImageDraw.Draw(overlay)
-
-            # Semi-transparent yellow grid lines
-            for r in range(1, TILE_ROWS):
-                y = r * TILE_H
-                draw.line([(0, y), (IMG_W, y)], fill=(255, 255, 0, 160), width=2)
-            for c in range(1, TILE_COLS):
-                x = c * TILE_W
-                draw.line([(x, 0), (x, IMG_H)], fill=(255, 255, 0, 160), width=2)
-
-            # Black cell numbers (1–64)
-            tile_index = 1
-            for r in range(TILE_ROWS):
-                for c in range(TILE_COLS):
-                    text = str(tile_index)
-                    text_x = c * TILE_W + TILE_W / 2 - 8
-                    text_y = r * TILE_H + TILE_H / 2 - 8
-                    draw.text((text_x, text_y), text, fill=(0, 0, 0, 255), font=FONT)
-                    tile_index += 1
-
-            combined = Image.alpha_composite(grid_img, overlay)
-            combined.convert("RGB").save(grid_out_path)
-
-        # === TILE EXTRACTION ===
+def level_tiles_folder(set_type, frame_id, level):
+    """A frame's _tiles folder within an extra grid level."""
+    return os.path.join(level_dir(DST_BASE, level), set_type, f"{frame_id}_tiles")
+
+
+def level_files_exist(set_type, frame_id, levels, tile_ext=".png"):
+    """True if the overlay and first tile of every extra grid level exist for a frame."""
+    for level in levels:
+        level_folder = level_tiles_folder(set_type, frame_id, level)
+        first_tile = f"{frame_id}_tile_{1:0{tile_number_width(level)}d}{tile_ext}"
+        if not (os.path.exists(os.path.join(level_folder, f"{frame_id}_grid_overlay.png"))
+                and os.path.exists(os.path.join(level_folder, first_tile))):
+            return False
+    return True
+
+
+def split_image(img_path, dst_folder, set_type, store=None, force=False, writer=None,
+                levels=(), level_rows=None, blobs=None, features=None, size=None):
+    """
+    Splits a single 800x600 image into 64 tiles and adds grid overlay.
+
+    Tiles are saved as files in dst_folder (through ``writer``, a
+    TileWriter, when given), appended to ``store`` (a TileStoreWriter), or
+    stored by content through ``blobs`` (a BlobIndex). Extra grid
+    ``levels`` and tile ``features`` come from the same decode (see
+    tile_frame). Existing tiles are kept unless ``force`` (the frame
+    changed). ``size`` is the frame's (width, height) when already known
+    (dataset_info.csv): a frame known to be 800x600 is decoded without
+    probing its header for a reduced JPEG decode. Returns the tiles_info
+    rows for the frame, or None if it was skipped.
+    """
+    base_name = os.path.splitext(os.path.basename(img_path))[0]
+    os.makedirs(dst_folder, exist_ok=True)
+
+    # Check if tiles already exist for this frame (before paying for a decode)
+    tile_ext = writer.ext if writer is not None else ".png"
+    grid_out_path = os.path.join(dst_folder, f"{base_name}_grid_overlay.png")
+    first_tile_path = os.path.join(dst_folder, f"{base_name}_tile_01{tile_ext}")
+
+    if not force and store is None and blobs is None and os.path.exists(first_tile_path) and os.path.exists(grid_out_path) \
+            and level_files_exist(set_type, base_name, levels, tile_ext):
+        print(f"  Skipping {base_name} - tiles already exist")
+        return None  # Indicate frame was skipped
+
+    # Decode straight to RGB (large JPEGs decode at reduced size), then resize to 800x600 if needed
+    target_size = None if size == (IMG_W, IMG_H) else (IMG_W, IMG_H)
+    with instrument.span("decode", frames=1, bytes=os.path.getsize(img_path)):
+        img = decode_image(img_path, "rgb", target_size)
+    if img.shape[:2] != (IMG_H, IMG_W):
+        with instrument.span("resize", frames=1):
+            img = resize_image(img, (IMG_W, IMG_H))
+
+    return tile_frame(img, base_name, dst_folder, set_type, store, writer, levels, level_rows, blobs, features)
+
+
+def place_tile(files, tile_path, tile, blobs=None, owner=None):
+    """
+    Queue a tile for writing; returns the path its tiles_info row points at.
+
+    With ``blobs`` (a BlobIndex) the tile goes to its content-addressed
+    blob instead of ``tile_path``, and is only written if that blob is new
+    (``owner``, the frame, then writes it; see BlobIndex.settle).
+    """
+    if blobs is not None:
+        with instrument.span("hash", tiles=1):
+            tile_path, new = blobs.add(tile, owner)
+        if not new:
+            return tile_path
+    files.append((tile_path, tile))
+    return tile_path
+
+
+def tile_frame(img, base_name, dst_folder, set_type, store=None, writer=None,
+               levels=(), level_rows=None, blobs=None, features=None):
+    """
+    Writes the grid overlay and the 64 tiles of an already decoded 800x600 frame.
+
+    ``img`` is an RGB numpy array (H, W, 3) or PIL image. Used by split_image() and by stages that
+    decode frames themselves (e.g. streaming video ingestion). With a
+    ``writer`` (TileWriter) the files are only queued: the frame is done
+    when the writer reports it. Returns the tiles_info rows for the frame.
+
+    Each extra grid level in ``levels`` ((cols, rows) pairs) gets its own
+    overlay and tile files under frames_dataset_tiles/grid_CxR/, cut from
+    the same pixels (always as files, also with a packed ``store``); its
+    tiles_info rows go to ``level_rows[level]``. With ``blobs`` (a
+    BlobIndex) tiles are stored by content: tiles seen before are not
+    written again. With a ``features`` dict, the frame's 8x8 tile
+    descriptors (src.tile_features) go to ``features[base_name]``.
+    """
+    os.makedirs(dst_folder, exist_ok=True)
+    grid_out_path = os.path.join(dst_folder, f"{base_name}_grid_overlay.png")
+    frame = np.asarray(img)
+    files = []
+
+    # === GRID OVERLAY VISUALIZATION ===
+    if DRAW_GRID:
+        with instrument.span("overlay", frames=1):
+            overlay = grid_overlay((IMG_W, IMG_H), TILE_COLS, TILE_ROWS)
+            files.append((grid_out_path, overlay.apply(frame)))
+
+    # === TILE EXTRACTION ===
+    # Tile (r, c) is a view into the frame; nothing is copied until it is encoded
+    with instrument.span("crop", tiles=TILE_COLS * TILE_ROWS):
+        tiles = split_images_into_grid(frame[np.newaxis], TILE_COLS, TILE_ROWS)[0]
+    if features is not None:
+        with instrument.span("features", frames=1):
+            features[base_name] = grid_features(frame, TILE_COLS, TILE_ROWS)
+    rows = []
+    if store is not None:
+        # Packed store: tiles_info points at the split's store file, the
+        # store index maps (parent_image, tile_index) to the array offset
+        with instrument.span("file_write", files=0, bytes=tiles.nbytes):
+            store.add_frame(base_name, tiles)
+        tile_path = os.path.join(os.path.dirname(dst_folder), PACKED_DIR, STORE_DATA)
+        for r in range(TILE_ROWS):
+            for c in range(TILE_COLS):
+                rows.append([tile_path, set_type, base_name, r + 1, c + 1, r * TILE_COLS + c + 1])
+    else:
+        tile_ext = writer.ext if writer is not None else ".png"
         tile_index = 1
         for r in range(TILE_ROWS):
             for c in range(TILE_COLS):
-                left, upper = c * TILE_W, r * TILE_H
-                right, lower = left + TILE_W, upper + TILE_H
-                tile = img.crop((left, upper, right, lower))
-
-                tile_filename = f"{base_name}_tile_{tile_index:02d}.png"
-                tile_path = os.path.join(dst_folder, tile_filename)
-                tile.save(tile_path)
-                writer.writerow([tile_path, set_type, base_name, r + 1, c + 1, tile_index])
+                tile_filename = f"{base_name}_tile_{tile_index:02d}{tile_ext}"
+                tile_path = place_tile(files, os.path.join(dst_folder, tile_filename), tiles[r, c], blobs,
+                                       base_name)
+                rows.append([tile_path, set_type, base_name, r + 1, c + 1, tile_index])
                 tile_index += 1
-        
-        return True  # Indicate frame was processed
 
-    # --- Process train/test images ---
+    # === EXTRA GRID LEVELS (same decoded frame) ===
+    for level in levels:
+        cols, grid_rows = level
+        level_folder = level_tiles_folder(set_type, base_name, level)
+        os.makedirs(level_folder, exist_ok=True)
+        if DRAW_GRID:
+            with instrument.span("overlay", frames=1):
+                overlay = grid_overlay((IMG_W, IMG_H), cols, grid_rows)
+                files.append((os.path.join(level_folder, f"{base_name}_grid_overlay.png"), overlay.apply(frame)))
+        with instrument.span("crop", tiles=cols * grid_rows):
+            level_tiles = split_images_into_grid(frame[np.newaxis], cols, grid_rows)[0]
+        tile_ext = writer.ext if writer is not None else ".png"
+        width = tile_number_width(level)
+        out = level_rows.setdefault(level, []) if level_rows is not None else []
+        for r in range(grid_rows):
+            for c in range(cols):
+                tile_index = r * cols + c + 1
+                tile_path = place_tile(files, os.path.join(level_folder,
+                                                           f"{base_name}_tile_{tile_index:0{width}d}{tile_ext}"),
+                                       level_tiles[r, c], blobs, base_name)
+                out.append([tile_path, set_type, base_name, r + 1, c + 1, tile_index])
+
+    if writer is not None:
+        writer.write_frame(base_name, files)
+    else:
+        for path, image in files:
+            write_tile(image, path, atomic=blobs is not None)
+        if blobs is not None:
+            blobs.settle()  # Written synchronously: the frame's new blobs exist now
+    return rows  # Indicate frame was processed
+
+
+def frame_outputs(set_type, frame_id, output="png", levels=(), dedup_tiles=False):
+    """Paths a frame's tiles/overlay are written to (recorded in the manifest)."""
+    dst_folder = os.path.join(DST_BASE, set_type, f"{frame_id}_tiles")
+    outputs = [os.path.join(dst_folder, f"{frame_id}_grid_overlay.png")]
+    if output == "packed":
+        outputs.append(os.path.join(DST_BASE, set_type, PACKED_DIR, STORE_DATA))
+    elif dedup_tiles:
+        outputs.append(os.path.join(DST_BASE, BLOB_DIR))
+    else:
+        outputs += [os.path.join(dst_folder, f"{frame_id}_tile_{i:02d}.{output}")
+                    for i in range(1, TILE_COLS * TILE_ROWS + 1)]
+    ext = "npy" if output == "npy" else "png"
+    for level in levels:
+        level_folder = level_tiles_folder(set_type, frame_id, level)
+        width = tile_number_width(level)
+        outputs.append(os.path.join(level_folder, f"{frame_id}_grid_overlay.png"))
+        if dedup_tiles:
+            continue
+        outputs += [os.path.join(level_folder, f"{frame_id}_tile_{i:0{width}d}.{ext}")
+                    for i in range(1, level[0] * level[1] + 1)]
+    return outputs
+
+
+def tiles_stage(output="png", levels=(), dedup_tiles=False, features=True):
+    """
+    Manifest stage of a tiling configuration.
+
+    A different configuration is a different output, so every frame gets
+    (re)checked: e.g. frames tiled with --no-features (or with an older
+    FEATURE_VERSION) have their c1-c64 filled in by the next default run,
+    without re-tiling (their tiles are adopted).
+    """
+    stage = f"tiles:{output}"
+    if levels:
+        stage += ":" + "+".join(level_name(level) for level in levels)
+    if dedup_tiles:
+        stage += ":dedup"
+    if features:
+        stage += f":f{FEATURE_VERSION}"
+    return stage
+
+
+_blob_indexes = {}
+
+
+def blob_index(ext):
+    """
+    The process's BlobIndex of frames_dataset_tiles/tile_blobs (listed once, shared by its chunks).
+
+    Writes left pending by an earlier chunk that was interrupted are dropped.
+    """
+    index = _blob_indexes.get(ext)
+    if index is None:
+        with instrument.span("scan"):
+            index = _blob_indexes[ext] = BlobIndex(os.path.join(DST_BASE, BLOB_DIR), ext)
+    index.rollback()
+    return index
+
+
+def level_shards(set_type, chunk_id, level):
+    """(tiles_info shard, labels shard) of one chunk for an extra grid level."""
+    stem = os.path.join(SHARD_DIR, f"{set_type}_{chunk_id:06d}_{level_name(level)}")
+    return stem + ".csv", stem + "_labels.csv"
+
+
+def process_chunk(set_type, chunk_id, frames, output="png", writer_opts=None, levels=(),
+                  dedup_tiles=False, frame_hashes=None, frame_dims=None):
+    """
+    Tile one chunk of frames and write its rows to private shards.
+
+    ``frames`` is a list of (img_file, force) pairs; force re-tiles a frame
+    whose content changed even though its outputs exist. Each chunk gets a
+    tiles_info shard (rows of tiled frames) and a labels shard (label rows
+    of every frame in the chunk, tiled or skipped); with output="packed" it
+    also gets its own packed tile store. Files are written by a TileWriter
+    built from ``writer_opts`` (compress_level, threads, max_pending); a
+    frame whose files failed to write is reported and left out of the
+    tiles_info shard, so the next run retries it. Runs inside a worker
+    process in parallel mode, so it never touches the shared outputs.
+    Extra grid ``levels`` get their own pair of shards per chunk; their
+    labels are derived from the frame's 8x8 labels. With ``dedup_tiles``
+    tiles are stored once per distinct content (see src.tile_blobs).
+    ``frame_hashes`` (img_file -> content hash) turns on the c1-c64 tile
+    descriptors: taken from the feature cache, else computed from the
+    tiled frame (or decoded for frames that are not re-tiled) and cached.
+    ``frame_dims`` (img_file -> (width, height)) are the known frame sizes
+    passed on to split_image.
+    Returns (tiles_shard, labels_shard, processed_ids, skipped_ids, level_shards)
+    with level_shards mapping each level to its (tiles_shard, labels_shard).
+    """
+    src_dir = os.path.join(SRC_BASE, set_type)
+    dst_dir = os.path.join(DST_BASE, set_type)
+    tiles_shard = os.path.join(SHARD_DIR, f"{set_type}_{chunk_id:06d}.csv")
+    labels_shard = os.path.join(SHARD_DIR, f"{set_type}_{chunk_id:06d}_labels.csv")
+
+    store = None
+    if output == "packed":
+        packed_frames = stored_frames(os.path.join(dst_dir, PACKED_DIR))
+        store = TileStoreWriter(os.path.join(SHARD_DIR, f"{set_type}_{chunk_id:06d}_store"),
+                                (TILE_H, TILE_W, 3))
+
+    # Labels of the whole chunk in one query (the parent synced the store before dispatch)
+    with instrument.span("label_query", frames=len(frames)), LabelStore(LABEL_STORE_FILE) as label_store:
+        chunk_labels = label_store.label_matrix([os.path.splitext(f)[0] for f, _ in frames],
+                                                TILE_COLS * TILE_ROWS)
+
+    # Every other level's labels follow from the 8x8 ones (aggregated or expanded)
+    level_labels = {level: derive_labels(chunk_labels, (TILE_COLS, TILE_ROWS), level, LEVEL_LABEL_REDUCE)
+                    for level in levels}
+
+    feature_cache = FeatureCache(FEATURE_CACHE_FILE) if frame_hashes is not None else None
+    cached_features = feature_cache.get(frame_hashes.values(), TILE_COLS, TILE_ROWS) if feature_cache else {}
+    new_features = []
+
+    writer = TileWriter("npy" if output == "npy" else "png", atomic=dedup_tiles, **(writer_opts or {}))
+    blobs = blob_index(writer.ext) if dedup_tiles and output != "packed" else None
+    blobs_before = (blobs.added, blobs.reused) if blobs is not None else None
+    frame_rows = {}
+    frame_level_rows = {}
+    skipped = []
+    with open(tiles_shard, mode="w", newline="") as tilesfile, \
+            open(labels_shard, mode="w", newline="") as labelsfile:
+        tiles_writer = csv.writer(tilesfile)
+        labels_writer = csv.writer(labelsfile, lineterminator="\n")  # Match pandas output
+        level_files = {level: [open(path, mode="w", newline="") for path in level_shards(set_type, chunk_id, level)]
+                       for level in levels}
+        for k, ((img_file, force), frame_labels) in enumerate(zip(frames, chunk_labels)):
+            frame_id = os.path.splitext(img_file)[0]
+            img_path = os.path.join(src_dir, img_file)
+            img_out_folder = os.path.join(dst_dir, f"{frame_id}_tiles")
+            level_rows = {}
+            frame_hash = frame_hashes.get(img_file) if frame_hashes is not None else None
+            tile_features = cached_features.get(frame_hash)
+            computed = {} if feature_cache is not None and tile_features is None else None
+            if store is not None and not force and frame_id in packed_frames \
+                    and level_files_exist(set_type, frame_id, levels, writer.ext):
+                print(f"  Skipping {frame_id} - tiles already packed")
+                rows = None
+            else:
+                rows = split_image(img_path, img_out_folder, set_type, store, force, writer,
+                                   levels, level_rows, blobs, computed, (frame_dims or {}).get(img_file))
+            if rows is None:
+                skipped.append(frame_id)
+            else:
+                frame_rows[frame_id] = rows
+                frame_level_rows[frame_id] = level_rows
+            if computed is not None:
+                if frame_id not in computed:
+                    # Not re-tiled, so not decoded yet
+                    with instrument.span("features", frames=1):
+                        computed[frame_id] = frame_features(img_path, (IMG_W, IMG_H), TILE_COLS, TILE_ROWS)
+                tile_features = computed[frame_id]
+                new_features.append((frame_hash, tile_features))
+            with instrument.span("csv_write", rows=TILE_COLS * TILE_ROWS):
+                labels_writer.writerows(frame_label_rows(frame_id, img_out_folder, TILE_COLS, TILE_ROWS,
+                                                         labels=frame_labels, features=tile_features))
+                for level in levels:
+                    csv.writer(level_files[level][1], lineterminator="\n").writerows(frame_label_rows(
+                        frame_id, level_tiles_folder(set_type, frame_id, level), level[0], level[1],
+                        labels=level_labels[level][k]))
+
+        # Wait for the queued files; only frames written completely get tiles_info rows
+        failed = {frame_id: error for frame_id, error in writer.close() if error is not None}
+        if blobs is not None:
+            # Only blobs that were written join the index; frames reusing a lost one are retried too
+            for frame_id in blobs.settle(failed) - set(failed):
+                failed[frame_id] = "a tile blob it shares with a failed frame was not written"
+        processed = []
+        for frame_id, rows in frame_rows.items():
+            if frame_id in failed:
+                print(f"  Failed to write tiles of {frame_id}: {failed[frame_id]}")
+                continue
+            with instrument.span("csv_write", rows=len(rows)):
+                tiles_writer.writerows(rows)
+                for level, level_rows in frame_level_rows[frame_id].items():
+                    csv.writer(level_files[level][0]).writerows(level_rows)
+            processed.append(frame_id)
+        for files in level_files.values():
+            for f in files:
+                f.close()
+
+    if store is not None:
+        store.close()
+    if feature_cache is not None:
+        feature_cache.put(new_features, TILE_COLS, TILE_ROWS)
+        feature_cache.close()
+    if blobs is not None:
+        instrument.count("tile_blobs", new=blobs.added - blobs_before[0], reused=blobs.reused - blobs_before[1])
+    instrument.flush()  # Worker processes report their own totals
+    return (tiles_shard, labels_shard, processed, skipped,
+            {level: level_shards(set_type, chunk_id, level) for level in levels})
+
+
+def merge_shards(tasks, results, removed, levels=()):
+    """
+    Merge shards in the given (deterministic) task order.
+
+    Rows of re-tiled and removed frames are dropped from tiles_info.csv
+    before the tiles_info shards are appended (duplicate rows left by older
+    runs are dropped too); objects_{split}_dataset.csv is rewritten the same
+    way from the labels shards. Per-chunk packed stores (if any) are
+    appended to the split's packed store. ``removed`` maps set_type to the
+    frame ids that no longer exist. The tables of each extra grid level in
+    ``levels`` are merged the same way from the level shards. The label
+    stats cache of each split (check_label_distribution.py) gets the same
+    changes, read from the labels shards.
+    """
+    with instrument.span("csv_merge"):
+        for set_type, chunk_id, _, output in (task[:4] for task in tasks):
+            if output == "packed":
+                append_store(os.path.join(DST_BASE, set_type, PACKED_DIR),
+                             os.path.join(SHARD_DIR, f"{set_type}_{chunk_id:06d}_store"))
+
+        retiled = {(task[0], frame_id) for task, res in zip(tasks, results) for frame_id in res[2]}
+        retiled |= {(set_type, frame_id) for set_type, ids in removed.items() for frame_id in ids}
+
+        # (output dir, cells per frame, [(tiles_shard, labels_shard) per result]) per grid level
+        grids = [(DST_BASE, TILE_COLS * TILE_ROWS, [res[:2] for res in results])]
+        grids += [(level_dir(DST_BASE, level), level[0] * level[1], [res[4][level] for res in results])
+                  for level in levels]
+        for base_dir, num_tiles, shards in grids:
+            rewrite_csv(os.path.join(base_dir, "tiles_info.csv"), CSV_HEADER,
+                        drop=lambda row: (row[1], row[2]) in retiled,
+                        key=lambda row: (row[1], row[2], row[5]),
+                        appended=[tiles_shard for tiles_shard, _ in shards])
+
+            for set_type in ["train", "test"]:
+                set_tasks = [(task, pair) for task, pair in zip(tasks, shards) if task[0] == set_type]
+                if not set_tasks and not removed.get(set_type):
+                    continue
+                replaced = {f"{os.path.splitext(img_file)[0]}_grid_overlay.png"
+                            for task, _ in set_tasks for img_file, _ in task[2]}
+                replaced |= {f"{frame_id}_grid_overlay.png" for frame_id in removed.get(set_type, ())}
+                split_dir = os.path.join(base_dir, set_type)
+                os.makedirs(split_dir, exist_ok=True)
+                labels_csv = labels_csv_path(split_dir, set_type)
+                previous = LabelStatsCache.signature(labels_csv) if os.path.exists(labels_csv) else None
+                rewrite_csv(labels_csv, label_columns(num_tiles),
+                            drop=lambda row: row[0] in replaced,
+                            appended=[pair[1] for _, pair in set_tasks],
+                            lineterminator="\n")  # Match pandas output
+                if base_dir == DST_BASE:
+                    update_split_stats(split_dir, set_type, labels_csv, previous,
+                                       [pair[1] for _, pair in set_tasks], removed.get(set_type, ()))
+
+            for tiles_shard, labels_shard in shards:
+                os.remove(tiles_shard)
+                os.remove(labels_shard)
+
+
+def update_split_stats(split_dir, set_type, labels_csv, previous, labels_shards, removed):
+    """Apply the rows of merged labels shards (and removed frames) to the split's label stats cache."""
+    frame_ids, labels = [], []
+    for shard in labels_shards:
+        if os.path.getsize(shard):
+            ids, shard_labels = read_label_matrix(shard, TILE_COLS * TILE_ROWS, header=False)
+            frame_ids += ids
+            labels.append(shard_labels)
+    labels = np.concatenate(labels) if labels else np.zeros((0, TILE_COLS * TILE_ROWS), dtype=np.int8)
+    update_stats_cache(stats_cache_path(split_dir, set_type), labels_csv, previous, frame_ids, labels, removed)
+
+
+def main(workers=1, chunk_size=CHUNK_SIZE, output="png", rescan=False,
+         png_compression=DEFAULT_PNG_COMPRESSION, writer_threads=WRITER_THREADS,
+         max_pending=MAX_PENDING, levels=(), dedup_tiles=False, features=True, pool=None):
+    """
+    Tile every new/changed frame and update the metadata (see the notes at the top).
+
+    ``pool`` is an already running ProcessPoolExecutor to tile with instead
+    of starting one for this call (long-running callers such as the watch
+    mode keep one). Returns (frames tiled, frames removed from the metadata).
+    """
+    # --- Create output structure ---
+    os.makedirs(os.path.join(DST_BASE, "train"), exist_ok=True)
+    os.makedirs(os.path.join(DST_BASE, "test"), exist_ok=True)
+    os.makedirs(SHARD_DIR, exist_ok=True)
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    # The base 8x8 grid is always produced; only the other levels are extra
+    levels = [level for level in levels if level != (TILE_COLS, TILE_ROWS)]
+    for level in levels:
+        if not nests(level, (TILE_COLS, TILE_ROWS)):
+            raise ValueError(f"Grid level {level_name(level)} does not nest with {TILE_COLS}x{TILE_ROWS}")
+    dedup_tiles = dedup_tiles and output != "packed"  # A packed store has no per-tile files
+    stage = tiles_stage(output, levels, dedup_tiles, features)
+    writer_opts = {"compress_level": png_compression, "threads": writer_threads,
+                   "max_pending": max_pending}
+    manifest = Manifest(MANIFEST_FILE)
+    label_store = LabelStore(LABEL_STORE_FILE)
+
+    # --- Plan chunks of new/changed train/test images ---
+    tasks = []
+    signatures = {}
+    removed = {}
+    unchanged_count = {}
+    for set_type in ["train", "test"]:
+        src_dir = os.path.abspath(os.path.join(SRC_BASE, set_type))  # The manifest keys frames by absolute path
+        with instrument.span("scan"):
+            current = manifest.scan(src_dir, rescan=rescan)
+        recorded = manifest.recorded(stage, src_dir)
+        pending, gone = diff(current, recorded)
+        signatures.update(current)
+        removed[set_type] = [os.path.splitext(os.path.basename(path))[0] for path in gone]
+        manifest.forget(stage, gone)
+        unchanged_count[set_type] = len(current) - len(pending)
+
+        # Frames the manifest knew about changed content: re-tile even if tiles exist
+        frames = [(os.path.basename(path), path in recorded) for path in pending]
+        # Dimensions from dataset_info.csv (header-probed) where still valid: no header read to plan a decode
+        dims = {os.path.basename(path): size for path, size in frame_sizes(
+            os.path.join(SRC_BASE, "dataset_info.csv"), os.path.dirname(os.path.abspath(SRC_BASE)),
+            pending).items()}
+        with instrument.span("label_sync", frames=len(frames)):
+            label_store.sync_frame_csvs(os.path.join(DST_BASE, set_type),
+                                        [os.path.splitext(img_file)[0] for img_file, _ in frames])
+        for chunk_id, start in enumerate(range(0, len(frames), chunk_size)):
+            chunk = frames[start:start + chunk_size]
+            hashes = {img_file: current[os.path.join(src_dir, img_file)] for img_file, _ in chunk} \
+                if features else None
+            chunk_dims = {img_file: dims[img_file] for img_file, _ in chunk if img_file in dims}
+            tasks.append((set_type, chunk_id, chunk, output, writer_opts, levels, dedup_tiles, hashes, chunk_dims))
+
+    label_store.close()
+
+    # --- Process chunks (in-process or in a worker pool) ---
+    print(f"\nProcessing {sum(len(t[2]) for t in tasks)} new/changed images with {workers} worker(s)...")
+    to_resize = sum(1 for task in tasks for size in task[8].values() if size != (IMG_W, IMG_H))
+    if to_resize:
+        print(f"  {to_resize} of them are not {IMG_W}x{IMG_H} and will be resized")
+    if pool is not None:
+        results = list(pool.map(process_chunk, *zip(*tasks))) if tasks else []
+    elif workers == 1:
+        results = [process_chunk(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() yields in submission order, which fixes the merge order
+            results = list(pool.map(process_chunk, *zip(*tasks))) if tasks else []
+
+    if tasks or any(removed.values()):
+        merge_shards(tasks, results, removed, levels)
+
+    # --- Record what was produced, only after the metadata is in place ---
+    for task, res in zip(tasks, results):
+        set_type = task[0]
+        src_dir = os.path.abspath(os.path.join(SRC_BASE, set_type))
+        done = set(res[2]) | set(res[3])  # Frames whose files failed are retried next run
+        for img_file, _ in task[2]:
+            path = os.path.join(src_dir, img_file)
+            frame_id = os.path.splitext(img_file)[0]
+            if frame_id not in done:
+                continue
+            outputs = frame_outputs(set_type, frame_id, output, levels, dedup_tiles)
+            manifest.record(stage, path, signatures[path], outputs)
+    manifest.close()
+
     for set_type in ["train", "test"]:
-        src_dir = os.path.join(SRC_BASE, set_type)
-        dst_dir = os.path.join(DST_BASE, set_type)
-
-        print(f"\nProcessing {set_type.upper()} images...")
-        processed_count = 0
-        skipped_count = 0
-        
-        for img_file in os.listdir(src_dir):
-            if img_file.lower().endswith(".png"):
-                img_path = os.path.join(src_dir, img_file)
-                img_out_folder = os.path.join(dst_dir, f"{os.path.splitext(img_file)[0]}_tiles")
-                was_processed = split_image(img_path, img_out_folder, set_type)
-                if was_processed:
-                    processed_count += 1
-                else:
-                    skipped_count += 1
-        
-        print(f"  Processed: {processed_count} new frames")
+        set_results = [res for task, res in zip(tasks, results) if task[0] == set_type]
+        processed_count = sum(len(res[2]) for res in set_results)
+        skipped_count = sum(len(res[3]) for res in set_results)
+        print(f"\n{set_type.upper()} images:")
+        print(f"  Processed: {processed_count} new/changed frames")
         if skipped_count > 0:
-            print(f"  Skipped: {skipped_count} existing frames")
-
-print("\nAll images processed!")
-print(f"Metadata saved/updated: {CSV_FILE}")
-print("-----------------------------------------------------------")
-print("Note: CSV file is appended to (not overwritten)")
-print("Existing tiles are preserved and skipped")
-print("-----------------------------------------------------------")
-
-# --- ZIP CREATION (optional - commented out to avoid overwriting) ---
-# Uncomment if you want to recreate ZIP on each run
-# print("\nCreating ZIP archive...")
-# if os.path.exists(ZIP_FILE):
-#     os.remove(ZIP_FILE)
-# shutil.make_archive(DST_BASE, 'zip', DST_BASE)
-# print("Dataset successfully zipped!")
-# print(f"ZIP file: {ZIP_FILE}")
-
-print("\nYour dataset is ready for ML training or upload.")
-print("-----------------------------------------------------------")
+            print(f"  Adopted: {skipped_count} frames with existing tiles")
+        print(f"  Unchanged: {unchanged_count[set_type]} frames")
+        if removed[set_type]:
+            print(f"  Removed from metadata: {len(removed[set_type])} deleted frames")
+
+    print("\nAll images processed!")
+    print(f"Metadata saved/updated: {CSV_FILE}")
+    print(f"Label CSVs updated: {DST_BASE}/{{train,test}}/objects_{{split}}_dataset.csv")
+    for level in levels:
+        print(f"Grid level {level_name(level)}: {level_dir(DST_BASE, level)}/ (tiles_info.csv + label CSVs)")
+    if dedup_tiles:
+        blob_dir = os.path.join(DST_BASE, BLOB_DIR)
+        with open(CSV_FILE, newline="") as f:
+            paths = [row[0] for row in csv.reader(f) if row and row[0].startswith(blob_dir)]
+        print(f"Tile blobs: {len(set(paths))} distinct files for {len(paths)} 8x8 tiles in {blob_dir}")
+    print("-----------------------------------------------------------")
+    print("Note: rows of new/changed frames replace their old rows (no duplicates)")
+    print("Unchanged frames are not re-listed, re-read or re-tiled")
+    print("-----------------------------------------------------------")
+
+    # --- PACKAGING ---
+    # Re-zipping the whole tree on every run is replaced by append-only tar
+    # shards: scripts/pack_shards.py packs only new/re-tiled frames
+    print("\nTo package new frames for training nodes: python scripts/pack_shards.py")
+    print("\nYour dataset is ready for ML training or upload.")
+    print("-----------------------------------------------------------")
+    return sum(len(res[2]) for res in results), sum(len(ids) for ids in removed.values())
+
+
+def cli(argv=None):
+    """Tile the new and changed frames of both splits."""
+    parser = argparse.ArgumentParser(description="Split frames into 8x8 numbered grid tiles.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for tiling (1 = single process, 0 = all CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Frames per worker task / tiles_info shard")
+    parser.add_argument("--output", choices=["png", "npy", "packed"], default="png",
+                        help="Save tiles as PNGs, raw .npy arrays, or into a packed, "
+                             "memory-mappable store per split")
+    parser.add_argument("--png-compression", type=int, choices=range(10), default=DEFAULT_PNG_COMPRESSION,
+                        metavar="0-9", help="zlib level of PNG tiles/overlays (lossless at any level)")
+    parser.add_argument("--fast", action="store_true",
+                        help=f"Fast lossless preset: PNG compression level {FAST_PNG_COMPRESSION}")
+    parser.add_argument("--writer-threads", type=int, default=WRITER_THREADS,
+                        help="Threads encoding/writing tiles per process (0 = write synchronously)")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING,
+                        help="Tile files queued per process before tiling waits for the writers")
+    parser.add_argument("--levels", type=parse_levels, default=[], metavar="CxR[,CxR...]",
+                        help="Extra grid levels tiled from the same decode, e.g. 4x4,16x16 "
+                             "(must nest with 8x8; written to frames_dataset_tiles/grid_CxR/)")
+    parser.add_argument("--dedup-tiles", action="store_true",
+                        help="Store each distinct tile once (content-addressed, under "
+                             f"{DST_BASE}/{BLOB_DIR}/); repeated tiles point at the shared file")
+    parser.add_argument("--no-features", action="store_true",
+                        help="Leave c1-c64 of the label tables at 0.0 instead of computing tile descriptors")
+    parser.add_argument("--rescan", action="store_true",
+                        help="List frame folders even if their mtime is unchanged "
+                             "(known frames are always re-stat'ed)")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    instrument.run_cli("tiles", lambda args: main(
+        workers=args.workers, chunk_size=args.chunk_size, output=args.output, rescan=args.rescan,
+        png_compression=FAST_PNG_COMPRESSION if args.fast else args.png_compression,
+        writer_threads=args.writer_threads, max_pending=args.max_pending, levels=args.levels,
+        dedup_tiles=args.dedup_tiles, features=not args.no_features), args)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+video_to_tiles.py
+----------------------------------------------------
+Streams frames from a local video straight into the tiling stage.
+
+Frames are read as raw RGB from an ffmpeg pipe (or cv2.VideoCapture when
+ffmpeg is not on PATH) every --gap seconds, resized to 800x600 while
+decoding, and tiled in memory: grid overlay, 64 tiles, tiles_info rows and
+label rows (c1-c64 = tile descriptors, src/tile_features.py) are produced
+without ever writing or re-reading a PNG frame.
+
+Frame numbers come from the frame registry (src/frame_registry.py), and
+each new frame goes to test or train by a hash of its name (about 20%
+test, as with youtube_video_to_frames.sh). Pass --save-frames to also keep
+the full 800x600 frames in frames_dataset/{train,test}/: they are added to
+dataset_info.csv, recorded in the tiling manifest (so
+split_8x8_grid_numbered.py does not tile them again) and their tile
+descriptors go to the feature cache. Without it, the frames only exist as
+tiles; generate_per_frame_labels_csv.py --full keeps their label rows.
+
+Usage (from pml-ds/):
+    python scripts/video_to_tiles.py video.mp4 --gap 2 --frames 300
+
+Author: Cordial Dude
+----------------------------------------------------
+"""
+
+import os
+import sys
+import csv
+import argparse
+from tqdm import tqdm
+
+# Add parent directory to path to find src module (and the tiling script)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+for path in (parent_dir, script_dir):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from src.video_ingest import iter_video_frames
+from src.labels import frame_label_rows
+from src.tile_store import TileStoreWriter
+from src.tile_writer import TileWriter, write_tile
+from src.frame_registry import FRAMES_DIR, dataset_registry, registry_path, assign_split
+from src.manifest import Manifest
+from src.tile_features import FeatureCache
+import split_8x8_grid_numbered as tiling
+from src import instrument
+
+DATASET_INFO_FILE = os.path.join(FRAMES_DIR, "dataset_info.csv")
+
+
+def record_saved_frames(shards, output):
+    """
+    Record saved, tiled frames in the tiling manifest and their descriptors in the feature cache.
+
+    As run_pipeline.py does for its frames: the next tiles run sees them as
+    unchanged, and the labels stage does not decode them again.
+    """
+    with instrument.span("manifest"), Manifest(tiling.MANIFEST_FILE) as manifest, \
+            FeatureCache(tiling.FEATURE_CACHE_FILE) as cache:
+        stage = tiling.tiles_stage(output)
+        for set_type, shard in shards.items():
+            signatures = manifest.scan(os.path.join(tiling.SRC_BASE, set_type))
+            cached = []
+            for frame_id in shard["frames"]:
+                path = os.path.abspath(os.path.join(tiling.SRC_BASE, set_type, f"{frame_id}.png"))
+                if path in signatures:
+                    manifest.record(stage, path, signatures[path],
+                                    tiling.frame_outputs(set_type, frame_id, output))
+                    cached.append((signatures[path], shard["features"][frame_id]))
+            cache.put(cached, tiling.TILE_COLS, tiling.TILE_ROWS)
+
+
+def ingest_video(video_path, gap, total_frames, save_frames=False, output="png", backend=None):
+    """Stream, tile and register up to ``total_frames`` frames of a video."""
+    for set_type in ["train", "test"]:
+        os.makedirs(os.path.join(tiling.DST_BASE, set_type), exist_ok=True)
+        if save_frames:
+            os.makedirs(os.path.join(tiling.SRC_BASE, set_type), exist_ok=True)
+    os.makedirs(tiling.SHARD_DIR, exist_ok=True)
+
+    registry = dataset_registry()
+    if registry.last_frame:
+        print(f"Found existing frames. Continuing from frame_{registry.last_frame + 1:04d}")
+    saved_rows = []
+
+    # One "chunk" per split, so the tiling stage's shard merge can be reused
+    shards = {}
+    for set_type in ["train", "test"]:
+        tiles_shard = os.path.join(tiling.SHARD_DIR, f"{set_type}_{0:06d}.csv")
+        labels_shard = os.path.join(tiling.SHARD_DIR, f"{set_type}_{0:06d}_labels.csv")
+        store = None
+        if output == "packed":
+            store = TileStoreWriter(os.path.join(tiling.SHARD_DIR, f"{set_type}_{0:06d}_store"),
+                                    (tiling.TILE_H, tiling.TILE_W, 3))
+        tiles_file = open(tiles_shard, mode="w", newline="")
+        labels_file = open(labels_shard, mode="w", newline="")
+        shards[set_type] = {
+            "paths": (tiles_shard, labels_shard),
+            "files": (tiles_file, labels_file),
+            "tiles_writer": csv.writer(tiles_file),
+            "labels_writer": csv.writer(labels_file, lineterminator="\n"),  # Match pandas output
+            "store": store,
+            "rows": {},  # frame_id -> (tiles_info rows, label rows), until its files are written
+            "features": {},  # frame_id -> tile descriptors of saved frames
+        }
+    # Encodes/writes tiles while ffmpeg decodes the next frames
+    writer = TileWriter("png")
+
+    try:
+        frames = instrument.timed_iter("decode", iter_video_frames(
+            video_path, gap, total_frames, size=(tiling.IMG_W, tiling.IMG_H), backend=backend))
+        for frame in tqdm(frames, total=total_frames, desc="Ingesting"):
+            frame_id = f"frame_{registry.allocate(1):04d}"
+            set_type = assign_split(frame_id)
+            shard = shards[set_type]
+            if save_frames:
+                frame_path = os.path.join(tiling.SRC_BASE, set_type, f"{frame_id}.png")
+                write_tile(frame, frame_path)
+                st = os.stat(frame_path)
+                saved_rows.append({"image_path": registry_path(frame_path), "set_type": set_type, "size": st.st_size,
+                                   "mtime_ns": st.st_mtime_ns, "width": frame.shape[1],
+                                   "height": frame.shape[0], "format": "PNG"})
+
+            dst_folder = os.path.join(tiling.DST_BASE, set_type, f"{frame_id}_tiles")
+            features = {}
+            rows = tiling.tile_frame(frame, frame_id, dst_folder, set_type, shard["store"], writer,
+                                     features=features)
+            shard["rows"][frame_id] = (rows, frame_label_rows(frame_id, dst_folder, tiling.TILE_COLS,
+                                                              tiling.TILE_ROWS, features=features[frame_id]))
+            if save_frames:
+                shard["features"][frame_id] = features[frame_id]
+
+        # Only frames whose files were all written are registered
+        failed = {frame_id: error for frame_id, error in writer.close() if error is not None}
+        for shard in shards.values():
+            shard["frames"] = []
+            for frame_id, (rows, label_rows) in shard["rows"].items():
+                if frame_id in failed:
+                    print(f"  Failed to write tiles of {frame_id}: {failed[frame_id]}")
+                    continue
+                with instrument.span("csv_write", rows=len(rows) + len(label_rows)):
+                    shard["tiles_writer"].writerows(rows)
+                    shard["labels_writer"].writerows(label_rows)
+                shard["frames"].append(frame_id)
+    finally:
+        writer.close()
+        for shard in shards.values():
+            for f in shard["files"]:
+                f.close()
+            if shard["store"] is not None:
+                shard["store"].close()
+
+    # Merge exactly like the tiling stage: new rows appended, nothing duplicated
+    tasks, results = [], []
+    for set_type, shard in shards.items():
+        tasks.append((set_type, 0, [(f"{frame_id}.png", False) for frame_id in shard["frames"]], output))
+        results.append(shard["paths"] + (shard["frames"], []))
+    tiling.merge_shards(tasks, results, removed={})
+    if saved_rows:
+        registry.add(saved_rows)
+        registry.export(DATASET_INFO_FILE)
+        record_saved_frames(shards, output)
+    registry.close()
+
+    return {set_type: len(shard["frames"]) for set_type, shard in shards.items()}
+
+
+def cli(argv=None):
+    """Stream a local video into tiles and report the new frames per split."""
+    parser = argparse.ArgumentParser(description="Stream frames from a local video into 8x8 tiles.")
+    parser.add_argument("video", help="Path to a local video file")
+    parser.add_argument("--gap", type=float, default=2.0,
+                        help="Time gap between frames, in seconds")
+    parser.add_argument("--frames", type=int, default=300,
+                        help="Total number of frames to capture")
+    parser.add_argument("--save-frames", action="store_true",
+                        help="Also write the 800x600 frames to frames_dataset/{train,test}/")
+    parser.add_argument("--output", choices=["png", "packed"], default="png",
+                        help="Save tiles as PNGs or into a packed store per split")
+    parser.add_argument("--backend", choices=["ffmpeg", "opencv"], default=None,
+                        help="Frame decoder (default: ffmpeg if on PATH, else OpenCV)")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    counts = instrument.run_cli("video_ingest", lambda args: ingest_video(
+        args.video, args.gap, args.frames, save_frames=args.save_frames,
+        output=args.output, backend=args.backend), args)
+
+    print("\nDone!")
+    print(f"New train frames: {counts['train']}")
+    print(f"New test frames:  {counts['test']}")
+    print(f"Metadata updated: {tiling.CSV_FILE}")
+    if not args.save_frames:
+        print("Note: full frames were not saved (use --save-frames to keep them)")
+
+
+if __name__ == "__main__":
+    cli()
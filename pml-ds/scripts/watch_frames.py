@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+watch_frames.py
+----------------------------------------------------
+Long-running watch mode: tiles and labels frames within seconds of their
+arrival, instead of after the next full run_pipeline.sh.
+
+Every --interval seconds the frame folders are checked: a folder is only
+listed when its mtime changed (a file was added, removed or renamed into
+it), and the frames it held last time are stat'ed (one stat per frame, no
+hashing), so a frame rewritten in place is picked up too. When anything
+changed, the watcher waits until nothing has changed for --window seconds
+(at most --max-wait), so a burst of frames becomes one batch, and then
+runs the normal incremental stages on it:
+
+- split_8x8_grid_numbered.py: only new/changed frames are tiled (the
+  content-hash manifest picks them out), on a worker pool that stays up
+  between batches; tiles_info.csv and objects_{split}_dataset.csv are
+  rewritten atomically (temp file + rename), so readers never see a
+  partial file
+- check_label_distribution.py: label_stats_{split}.json (also atomic)
+
+With --incoming DIR, frames dropped into DIR (e.g. frames_dataset/, where
+ffmpeg writes frame_0001.png, ...) are first numbered, split and added to
+dataset_info.csv by register_frames.py. On file systems with coarse
+folder timestamps, --rescan-every lists every folder now and then.
+
+Usage (from pml-ds/):
+    python scripts/watch_frames.py --workers 4
+    python scripts/watch_frames.py --incoming frames_dataset --window 1
+
+Stop with Ctrl+C; a batch that was interrupted is redone on the next start.
+
+Author: Cordial Dude
+----------------------------------------------------
+"""
+
+import io
+import os
+import sys
+import time
+import signal
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Add parent directory to path to find src module (and the stage scripts)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+for path in (parent_dir, script_dir):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import split_8x8_grid_numbered as tiling
+from check_label_distribution import analyze_split
+from register_frames import register_frames
+from src.manifest import IMAGE_EXTS
+from src import instrument
+
+# ================= CONFIGURATION =================
+POLL_INTERVAL = 1.0    # Seconds between folder checks
+BATCH_WINDOW = 2.0     # Quiet seconds that close a batch
+MAX_BATCH_WAIT = 10.0  # Longest a batch waits for frames to stop arriving
+RESCAN_EVERY = 300.0   # Seconds between full listings of the frame folders (0 = never)
+# =================================================
+
+
+def folder_state(dirs, listings: dict, rescan: bool = False) -> tuple:
+    """
+    mtime of each watched folder and size/mtime of each frame in it (None if missing).
+
+    A folder is only listed if its mtime differs from the one in
+    ``listings`` (dict folder -> (mtime, frame names), updated in place) or
+    ``rescan`` is set; otherwise the frames it held last time are stat'ed.
+    """
+    state = []
+    for d in dirs:
+        try:
+            dir_mtime = os.stat(d).st_mtime_ns
+        except FileNotFoundError:
+            listings.pop(d, None)
+            state.append(None)
+            continue
+        listed = listings.get(d)
+        if rescan or listed is None or listed[0] != dir_mtime:
+            with os.scandir(d) as entries:
+                names = sorted(entry.name for entry in entries
+                               if entry.name.lower().endswith(IMAGE_EXTS) and entry.is_file())
+            listings[d] = (dir_mtime, names)
+        else:
+            names = listed[1]
+        frames = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(d, name))
+            except FileNotFoundError:
+                continue
+            frames.append((name, st.st_size, st.st_mtime_ns))
+        state.append((dir_mtime, tuple(frames)))
+    return tuple(state)
+
+
+def settle(dirs, listings, state, window=BATCH_WINDOW, max_wait=MAX_BATCH_WAIT) -> tuple:
+    """Wait until the folders stay unchanged for ``window`` seconds (at most ``max_wait``)."""
+    deadline = time.monotonic() + max_wait
+    while time.monotonic() < deadline:
+        time.sleep(min(window, max(0.0, deadline - time.monotonic())))
+        latest = folder_state(dirs, listings)
+        if latest == state:
+            break
+        state = latest
+    return state
+
+
+def reports(verbose: bool):
+    """Where the stages' printed reports go: the console with --verbose, nowhere otherwise."""
+    return contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO())
+
+
+def run_batch(pool, workers, rescan=False, verbose=False, tiling_opts=None) -> tuple:
+    """
+    One watch batch: tile new/changed frames, then refresh the label stats.
+
+    Returns:
+        (frames tiled, frames removed from the metadata)
+    """
+    with reports(verbose):
+        tiled, removed = tiling.main(workers=workers, rescan=rescan, pool=pool, **(tiling_opts or {}))
+        if tiled or removed:
+            for split in ["train", "test"]:
+                analyze_split(split, quiet=True)
+    return tiled, removed
+
+
+def watch(workers=1, interval=POLL_INTERVAL, window=BATCH_WINDOW, max_wait=MAX_BATCH_WAIT,
+          rescan_every=RESCAN_EVERY, incoming=None, verbose=False, tiling_opts=None) -> None:
+    """Poll the frame folders and process each batch of changes until interrupted."""
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    dirs = [os.path.join(tiling.SRC_BASE, split) for split in ["train", "test"]]
+    if incoming is not None:
+        dirs.append(incoming)
+    print(f"Watching {', '.join(dirs)} (every {interval:g}s, batch window {window:g}s, "
+          f"{workers} worker(s)); Ctrl+C to stop")
+
+    # Workers ignore Ctrl+C; the watcher stops them itself
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=signal.signal,
+                               initargs=(signal.SIGINT, signal.SIG_IGN)) if workers > 1 else None
+    state = None  # Unknown: the first batch catches up on anything that arrived while stopped
+    listings = {}  # Folder -> (mtime, frame names) of its last listing
+    last_rescan = time.monotonic()
+    try:
+        while True:
+            rescan = bool(rescan_every) and time.monotonic() - last_rescan >= rescan_every
+            current = folder_state(dirs, listings, rescan)
+            if current != state or rescan:
+                if state is not None:
+                    current = settle(dirs, listings, current, window, max_wait)
+                start = time.perf_counter()
+                with instrument.stage("watch"):
+                    registered = 0
+                    if incoming is not None:
+                        with reports(verbose):
+                            registered = register_frames(incoming)
+                    # Snapshot before tiling: frames arriving meanwhile start the next batch
+                    state = folder_state(dirs, listings)
+                    tiled, removed = run_batch(pool, workers, rescan, verbose, tiling_opts)
+                if rescan:
+                    last_rescan = time.monotonic()
+                if registered or tiled or removed:
+                    print(f"[{time.strftime('%H:%M:%S')}] {registered} registered, {tiled} tiled, "
+                          f"{removed} removed in {time.perf_counter() - start:.2f}s", flush=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def cli(argv=None):
+    """Watch the frame folders until interrupted (each batch is its own profiling stage)."""
+    parser = argparse.ArgumentParser(description="Tile and label new frames as they arrive.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Tiling worker processes, kept up between batches (0 = all CPUs)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                        help="Seconds between checks of the frame folders")
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW,
+                        help="Quiet seconds after the last change before a batch is processed")
+    parser.add_argument("--max-wait", type=float, default=MAX_BATCH_WAIT,
+                        help="Longest a batch waits for frames to stop arriving, in seconds")
+    parser.add_argument("--rescan-every", type=float, default=RESCAN_EVERY,
+                        help="Seconds between full listings of the frame folders, for file systems "
+                             "with coarse folder timestamps (0 = never)")
+    parser.add_argument("--incoming", default=None, metavar="DIR",
+                        help="Also register frame_NNNN images dropped into DIR (see register_frames.py)")
+    parser.add_argument("--output", choices=["png", "npy", "packed"], default="png",
+                        help="Tile output, as in split_8x8_grid_numbered.py")
+    parser.add_argument("--no-features", action="store_true",
+                        help="Leave c1-c64 of the label tables at 0.0")
+    parser.add_argument("--verbose", action="store_true", help="Show the full report of every batch")
+    instrument.add_profile_arg(parser)
+    args = parser.parse_args(argv)
+    instrument.run_cli(None, lambda args: watch(
+        workers=args.workers, interval=args.interval, window=args.window, max_wait=args.max_wait,
+        rescan_every=args.rescan_every, incoming=args.incoming, verbose=args.verbose,
+        tiling_opts={"output": args.output, "features": not args.no_features}), args)
+
+
+if __name__ == "__main__":
+    cli()
@@ -5,7 +5,7 @@
 # - Stable (downloads video before processing)
 # - Captures frames at user-defined interval
 # - High quality (q:v=2)
-# - Creates train/test split
+# - Creates train/test split (by frame name hash, via the frame registry)
 # - Safe reruns - appends new frames without overwriting existing ones
 # - Sequential frame numbering continues from existing frames
 # ===========================================================
@@ -59,32 +59,6 @@ New-Item -ItemType Directory -Force -Path $TRAIN_DIR | Out-Null
 New-Item -ItemType Directory -Force -Path $TEST_DIR | Out-Null
 New-Item -ItemType Directory -Force -Path $BASE_DIR | Out-Null
 
-# --- Find highest existing frame number ---
-function Find-NextFrameNumber {
-    $maxNum = 0
-    $pattern = "frame_(\d+)\.png"
-    
-    # Check train and test directories
-    $allFrames = Get-ChildItem -Path $TRAIN_DIR, $TEST_DIR -Filter "frame_*.png" -ErrorAction SilentlyContinue
-    
-    foreach ($file in $allFrames) {
-        if ($file.Name -match $pattern) {
-            $num = [int]$matches[1]
-            if ($num -gt $maxNum) {
-                $maxNum = $num
-            }
-        }
-    }
-    
-    return $maxNum
-}
-
-$NEXT_FRAME_NUM = Find-NextFrameNumber
-if ($NEXT_FRAME_NUM -gt 0) {
-    $nextFrameName = "frame_{0:D4}.png" -f ($NEXT_FRAME_NUM + 1)
-    Write-Host "Found existing frames. Continuing from $nextFrameName"
-}
-
 # --- Step 1: Download video safely ---
 Write-Host "Downloading video locally for stable processing..."
 & yt-dlp -f "best[ext=mp4]" -o $TEMP_FILE --no-playlist $YT_URL
@@ -105,51 +79,28 @@ if ($LASTEXITCODE -ne 0) {
     exit 1
 }
 
-# --- Step 3: Train/Test split with sequential numbering ---
-Write-Host "Splitting frames into train/test sets with sequential numbering..."
-$extractedFrames = Get-ChildItem -Path $BASE_DIR -Filter "frame_*.png" | Where-Object { $_.Name -match "^frame_\d+\.png$" }
-$TOTAL = $extractedFrames.Count
+# --- Step 3: Number, split and register the new frames ---
+# The frame registry (frames_dataset\.frame_registry.sqlite) allocates the
+# numbers and assigns each frame to train/test by a hash of its name, then
+# appends the frames to dataset_info.csv; nothing re-lists train\ or test\
+Write-Host "Numbering new frames and splitting them into train/test sets..."
+& python scripts\register_frames.py --incoming $BASE_DIR
 
-if ($TOTAL -eq 0) {
-    Write-Host "Error: No frames extracted."
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "Error: Registering frames failed."
     Remove-Item $TEMP_FILE -ErrorAction SilentlyContinue
     exit 1
 }
 
-$TEST_COUNT = [Math]::Floor($TOTAL / 5)  # 20% test
-$COUNT = 0
-$CURRENT_FRAME_NUM = $NEXT_FRAME_NUM + 1
-
-foreach ($IMG in $extractedFrames) {
-    $NEW_NAME = "frame_{0:D4}.png" -f $CURRENT_FRAME_NUM
-    
-    if ($COUNT -lt $TEST_COUNT) {
-        Move-Item -Path $IMG.FullName -Destination (Join-Path $TEST_DIR $NEW_NAME) -Force
-    } else {
-        Move-Item -Path $IMG.FullName -Destination (Join-Path $TRAIN_DIR $NEW_NAME) -Force
-    }
-    
-    $COUNT++
-    $CURRENT_FRAME_NUM++
-}
-
 # --- Step 4: Cleanup ---
 Remove-Item $TEMP_FILE -ErrorAction SilentlyContinue
 
 # --- Summary ---
-$trainCount = (Get-ChildItem -Path $TRAIN_DIR -Filter "*.png" -ErrorAction SilentlyContinue).Count
-$testCount = (Get-ChildItem -Path $TEST_DIR -Filter "*.png" -ErrorAction SilentlyContinue).Count
-
 Write-Host ""
 Write-Host "Done!"
-Write-Host "Total train images: $trainCount"
-Write-Host "Total test images:  $testCount"
-Write-Host "New frames added: $COUNT"
 Write-Host "-----------------------------------------------------------"
 Write-Host "High-quality frames captured at every $GAP seconds"
 Write-Host "All frames are PNGs — full resolution"
 Write-Host "Frame numbering continues sequentially from existing frames"
-Write-Host ""
-Write-Host "Note: Run scripts\generate_dataset_info_csv.py to generate/update dataset_info.csv"
+Write-Host "dataset_info.csv already lists the new frames"
 Write-Host "-----------------------------------------------------------"
-
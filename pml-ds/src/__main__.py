@@ -0,0 +1,7 @@
+"""``python -m src``: the pipeline command line (see src/cli.py)."""
+
+import sys
+
+from src.cli import main
+
+sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Single command-line entry point for every pipeline stage.
+
+    python -m src <command> [options] [+ <command> [options] ...]
+
+Run from pml-ds/, like the scripts. Each command is the matching script
+in scripts/ (same options; ``python -m src <command> --help``), but its
+module, and with it OpenCV, pandas, PIL etc., is only imported when the
+command runs: ``python -m src --help`` imports none of them.
+
+Commands joined with ``+`` run one after another in the same process,
+so the interpreter and the heavy libraries start once. Modules and their
+in-memory caches (rendered grid overlays, fonts, the tile blob index,
+the tiling module video/pipeline stages reuse) are shared by the stages.
+The chain stops at the first command that fails. ``--profile PATH``
+before the first command profiles every stage of the chain under one run
+id and prints a whole-run summary at the end.
+"""
+
+import os
+import sys
+import importlib
+
+from src import instrument
+
+# command -> (module in scripts/, one-line description), in pipeline order
+COMMANDS = {
+    "register": ("register_frames", "Number new frames, split them and update dataset_info.csv"),
+    "dedup": ("dedup_frames", "Move near-duplicate frames out of the dataset"),
+    "dataset-info": ("generate_dataset_info_csv", "Rebuild dataset_info.csv from the frame folders"),
+    "tiles": ("split_8x8_grid_numbered", "Split frames into 8x8 tiles and write the label CSVs"),
+    "labels": ("generate_per_frame_labels_csv", "Refresh the consolidated label CSVs"),
+    "stats": ("check_label_distribution", "Label distribution per split"),
+    "video": ("video_to_tiles", "Stream a local video straight into tiles"),
+    "pipeline": ("run_pipeline", "Resumable video -> dataset pipeline with overlapping stages"),
+    "watch": ("watch_frames", "Tile and label new frames as they arrive"),
+    "pack": ("pack_shards", "Pack new/re-tiled frames into tar shards"),
+    "benchmark": ("benchmark_pipeline", "Per-stage benchmark on synthetic frames"),
+}
+SEPARATOR = "+"
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+
+
+def usage() -> str:
+    lines = ["usage: python -m src [--profile PATH] <command> [options] [+ <command> [options] ...]",
+             "", "commands:"]
+    lines += [f"  {name:<14}{description}" for name, (_, description) in COMMANDS.items()]
+    lines += ["", "Options of a command: python -m src <command> --help",
+              f"Commands joined with '{SEPARATOR}' run in one process, in order."]
+    return "\n".join(lines)
+
+
+def split_chain(argv) -> list:
+    """[command, arg, ..., "+", command, ...] -> [(command, [args])]."""
+    chain = []
+    current = None
+    for arg in argv:
+        if arg == SEPARATOR:
+            current = None
+        elif current is None:
+            current = []
+            chain.append((arg, current))
+        else:
+            current.append(arg)
+    return chain
+
+
+def load(command: str):
+    """Import the script module of a command (only now, with its dependencies)."""
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+    return importlib.import_module(COMMANDS[command][0])
+
+
+def run(command: str, args) -> int:
+    """Run one command in this process; returns its exit status."""
+    argv0 = sys.argv[0]
+    sys.argv[0] = f"python -m src {command}"  # Program name in the command's --help/usage
+    try:
+        status = load(command).cli(list(args))
+    except SystemExit as e:  # argparse errors/--help and the scripts' own sys.exit()
+        status = e.code
+    finally:
+        sys.argv[0] = argv0
+    if status is None or isinstance(status, int):
+        return status or 0
+    print(status, file=sys.stderr)
+    return 1
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    profile = None
+    while argv and argv[0].startswith("-"):
+        option = argv.pop(0)
+        if option in ("-h", "--help"):
+            print(usage())
+            return 0
+        if option == "--profile" and argv:
+            profile = argv.pop(0)
+        elif option.startswith("--profile="):
+            profile = option.split("=", 1)[1]
+        else:
+            print(f"Unknown option: {option}\n\n{usage()}", file=sys.stderr)
+            return 2
+
+    chain = split_chain(argv)
+    if not chain:
+        print(usage(), file=sys.stderr)
+        return 2
+    unknown = [command for command, _ in chain if command not in COMMANDS]
+    if unknown:
+        print(f"Unknown command: {', '.join(unknown)}\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    if profile:
+        instrument.enable(profile)
+    for command, args in chain:
+        if len(chain) > 1:
+            print(f"\n=========== {command} ===========")
+        status = run(command, args)
+        if status:
+            if len(chain) > 1:
+                print(f"\n{command} failed (exit status {status}); stopping", file=sys.stderr)
+            return status
+    if profile and len(chain) > 1:
+        print("\n=========== whole run ===========")
+        instrument.print_summary(instrument.summarize(profile))
+    return 0
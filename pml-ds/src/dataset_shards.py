@@ -0,0 +1,271 @@
+"""
+Append-only tar shards of the tiled dataset, for shipping to training nodes.
+
+Each shard holds the files of up to a fixed number of frames (grid
+overlay, then the tiles in tile_index order) as members of a standard tar
+archive:
+
+    shard-000000.tar[.gz]     the archive
+    shard-000000.index.csv    name,set_type,parent_image,tile_index,offset,length
+
+Shards are never modified once written: new or re-tiled frames go to new
+shards, and ``catalog.sqlite`` says which shard holds the current copy of
+each frame.
+
+With gzip compression every member (its tar header and data) is a
+separate gzip member. Concatenated they are an ordinary .tar.gz that
+``tar xzf`` (or Python's gzip module) streams, and each member can
+still be read on its own: the index gives the byte range of every member
+record (offset/length in the shard file), compressed or not. Tile index
+values are empty for overlays.
+"""
+
+import io
+import os
+import csv
+import gzip
+import zlib
+import sqlite3
+import tarfile
+import cv2
+import numpy as np
+
+SHARD_DIR = "frames_dataset_tiles_shards"
+SHARD_FRAMES = 256         # Frames per shard
+INDEX_HEADER = ["name", "set_type", "parent_image", "tile_index", "offset", "length"]
+COMPRESSIONS = ("gzip", "none")
+
+_BLOCK = tarfile.BLOCKSIZE
+
+
+def shard_name(number: int, compress: str = "gzip") -> str:
+    return f"shard-{number:06d}.tar" + (".gz" if compress == "gzip" else "")
+
+
+def index_path(shard_path: str) -> str:
+    """Index CSV of a shard (shard-000000.tar.gz -> shard-000000.index.csv)."""
+    stem = shard_path[:-len(".gz")] if shard_path.endswith(".gz") else shard_path
+    return stem[:-len(".tar")] + ".index.csv"
+
+
+def _record(name: str, data: bytes, mtime: float) -> bytes:
+    """Tar header(s) + data of one member, padded to whole blocks."""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    pad = -len(data) % _BLOCK
+    return info.tobuf(format=tarfile.GNU_FORMAT) + data + b"\0" * pad
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    c = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return c.compress(data) + c.flush()
+
+
+def write_shard(shard_path: str, members, compress: str = "gzip", level: int = 6) -> list:
+    """
+    Write one shard and its index.
+
+    The shard is written under a temporary name and renamed when complete,
+    so a shard that exists is never partial. Runs in worker processes.
+
+    Args:
+        shard_path: Output archive path
+        members: (name, source file, set_type, parent_image, tile_index or "")
+            per member, in order
+        compress: "gzip" (one gzip member per tar member) or "none"
+        level: zlib compression level
+
+    Returns:
+        Index rows (INDEX_HEADER order)
+    """
+    if compress not in COMPRESSIONS:
+        raise ValueError(f"Unknown shard compression: {compress}")
+    rows = []
+    tmp_path = shard_path + ".tmp"
+    with open(tmp_path, "wb") as out:
+        for name, src, set_type, parent_image, tile_index in members:
+            with open(src, "rb") as f:
+                data = f.read()
+            record = _record(name, data, os.stat(src).st_mtime)
+            if compress == "gzip":
+                record = _gzip(record, level)
+            rows.append([name, set_type, parent_image, tile_index, out.tell(), len(record)])
+            out.write(record)
+        end = b"\0" * (2 * _BLOCK)  # End-of-archive marker
+        out.write(_gzip(end, level) if compress == "gzip" else end)
+
+    tmp_index = index_path(shard_path) + ".tmp"
+    with open(tmp_index, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(INDEX_HEADER)
+        writer.writerows(rows)
+    os.replace(tmp_index, index_path(shard_path))
+    os.replace(tmp_path, shard_path)
+    return rows
+
+
+def read_member(shard_path: str, offset: int, length: int) -> bytes:
+    """Data of the member whose record is at ``offset`` (an index row's offset/length)."""
+    with open(shard_path, "rb") as f:
+        f.seek(offset)
+        record = f.read(length)
+    if shard_path.endswith(".gz"):
+        record = zlib.decompress(record, 31)
+    with tarfile.open(fileobj=io.BytesIO(record)) as tar:
+        member = tar.next()
+        return tar.extractfile(member).read()
+
+
+def decode_tile(name: str, data: bytes) -> np.ndarray:
+    """Decode a tile or overlay member to an RGB uint8 array (.png) or its array (.npy)."""
+    if name.endswith(".npy"):
+        return np.load(io.BytesIO(data))
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Failed to decode shard member {name}")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def iter_shard(shard_path: str):
+    """Stream (name, data) of every member of a shard, in order (no index needed)."""
+    # gzip (unlike tarfile's own stream mode) reads all gzip members of the file
+    opener = gzip.open if shard_path.endswith(".gz") else open
+    with opener(shard_path, "rb") as f, tarfile.open(fileobj=f, mode="r|") as tar:
+        for member in tar:
+            if member.isfile():
+                yield member.name, tar.extractfile(member).read()
+
+
+class ShardCatalog:
+    """
+    Which shard holds the current copy of each frame.
+
+    Args:
+        shard_dir: Shard directory (the catalog is shard_dir/catalog.sqlite)
+    """
+
+    def __init__(self, shard_dir: str):
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shard_dir = shard_dir
+        self.db = sqlite3.connect(os.path.join(shard_dir, "catalog.sqlite"))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                number INTEGER PRIMARY KEY, file TEXT, frames INTEGER, members INTEGER, bytes INTEGER);
+            CREATE TABLE IF NOT EXISTS frames (
+                set_type TEXT, parent_image TEXT, shard INTEGER, signature TEXT,
+                PRIMARY KEY (set_type, parent_image));
+        """)
+
+    def signatures(self) -> dict:
+        """(set_type, parent_image) -> signature of every packed frame."""
+        return {(s, p): sig for s, p, sig in self.db.execute(
+            "SELECT set_type, parent_image, signature FROM frames")}
+
+    def next_number(self) -> int:
+        return self.db.execute("SELECT COALESCE(MAX(number) + 1, 0) FROM shards").fetchone()[0]
+
+    def add_shard(self, number: int, file: str, frames, members: int) -> None:
+        """
+        Record a written shard and point its frames at it.
+
+        Args:
+            number: Shard number
+            file: Shard file name (in shard_dir)
+            frames: (set_type, parent_image, signature) per frame
+            members: Number of members
+        """
+        size = os.path.getsize(os.path.join(self.shard_dir, file))
+        frames = list(frames)
+        self.db.execute("INSERT OR REPLACE INTO shards VALUES (?, ?, ?, ?, ?)",
+                        (number, file, len(frames), members, size))
+        self.db.executemany("INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?)",
+                            [(s, p, number, sig) for s, p, sig in frames])
+        self.db.commit()
+
+    def remove_frames(self, keys) -> None:
+        """Forget frames that are no longer in the dataset."""
+        self.db.executemany("DELETE FROM frames WHERE set_type = ? AND parent_image = ?", list(keys))
+        self.db.commit()
+
+    def shards(self) -> list:
+        """(number, file) of every shard, in order."""
+        return self.db.execute("SELECT number, file FROM shards ORDER BY number").fetchall()
+
+    def frame_shards(self) -> dict:
+        """(set_type, parent_image) -> shard number of every current frame."""
+        return {(s, p): n for s, p, n in self.db.execute("SELECT set_type, parent_image, shard FROM frames")}
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShardReader:
+    """
+    Read the current tiles of a shard directory, sequentially or by key.
+
+    Args:
+        shard_dir: Shard directory (with catalog.sqlite)
+    """
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = shard_dir
+        with ShardCatalog(shard_dir) as catalog:
+            self._files = dict(catalog.shards())
+            self._frames = catalog.frame_shards()
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self._frames)
+
+    def _index(self, number: int) -> dict:
+        index = self._indexes.get(number)
+        if index is None:
+            with open(index_path(os.path.join(self.shard_dir, self._files[number])), newline="") as f:
+                index = {(row["set_type"], row["parent_image"], row["tile_index"]): row
+                         for row in csv.DictReader(f)}
+            self._indexes[number] = index
+        return index
+
+    def read(self, set_type: str, parent_image: str, tile_index=None) -> tuple:
+        """
+        One member of a frame through the shard index (one seek and read).
+
+        Args:
+            set_type: "train" or "test"
+            parent_image: Frame id (e.g. "frame_0084")
+            tile_index: 1-based tile index, or None for the grid overlay
+
+        Returns:
+            (name, raw file bytes)
+        """
+        number = self._frames[(set_type, parent_image)]
+        row = self._index(number)[(set_type, parent_image, "" if tile_index is None else str(tile_index))]
+        data = read_member(os.path.join(self.shard_dir, self._files[number]),
+                           int(row["offset"]), int(row["length"]))
+        return row["name"], data
+
+    def tile(self, set_type: str, parent_image: str, tile_index: int) -> np.ndarray:
+        """Decoded tile (RGB uint8 for PNG tiles)."""
+        return decode_tile(*self.read(set_type, parent_image, tile_index))
+
+    def __iter__(self):
+        """
+        Stream (set_type, parent_image, tile_index or None, name, data) over all
+        shards in order, skipping copies of frames that a later shard replaced.
+        """
+        for number, file in sorted(self._files.items()):
+            index = self._index(number)
+            by_name = {row["name"]: key for key, row in index.items()}
+            for name, data in iter_shard(os.path.join(self.shard_dir, file)):
+                set_type, parent_image, tile_index = by_name[name]
+                if self._frames.get((set_type, parent_image)) != number:
+                    continue
+                yield set_type, parent_image, int(tile_index) if tile_index else None, name, data
@@ -0,0 +1,200 @@
+"""
+Perceptual frame hashes and a persistent index for near-duplicate lookup.
+
+A frame's hash is a 64-bit difference hash (dHash): the frame is decoded
+straight to a small grayscale image (JPEGs are downscaled while decoding),
+shrunk to 9x8 pixels, and each bit says whether a pixel is brighter than
+its right neighbour. Near-identical frames (static shots, replays,
+re-encodes) differ in only a few bits. Bits are computed for a whole batch
+at once, and distances to every indexed hash are one vectorized XOR +
+popcount.
+
+``HashIndex`` keeps the hash of every frame seen so far (with the file's
+size and mtime, so unchanged files are not decoded again) in SQLite, and
+the hashes of kept frames in memory for lookups.
+"""
+
+import os
+import sqlite3
+import numpy as np
+import cv2
+
+HASH_SIZE = 8            # 8x8 = 64 bit hashes
+DEFAULT_THRESHOLD = 4    # Max differing bits (of 64) for a near duplicate
+
+if hasattr(np, "bitwise_count"):
+    def popcount(values: np.ndarray) -> np.ndarray:
+        """Number of set bits of each uint64."""
+        return np.bitwise_count(values).astype(np.int64)
+else:
+    _BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(values: np.ndarray) -> np.ndarray:
+        """Number of set bits of each uint64."""
+        values = np.ascontiguousarray(values, dtype=np.uint64)
+        return _BYTE_BITS[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.int64)
+
+
+def hash_thumbnail(img_path: str, hash_size: int = HASH_SIZE) -> np.ndarray:
+    """
+    Decode a frame to the small grayscale image a dHash is computed from.
+
+    Args:
+        img_path: Path to the image file
+        hash_size: Hash side; the thumbnail is (hash_size, hash_size + 1)
+
+    Returns:
+        uint8 array (hash_size, hash_size + 1)
+    """
+    img = cv2.imread(img_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if img is None:
+        raise ValueError(f"Failed to read image from {img_path}")
+    return cv2.resize(img, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+
+
+def dhash_batch(thumbnails: np.ndarray) -> np.ndarray:
+    """
+    Difference hashes of a batch of thumbnails.
+
+    Args:
+        thumbnails: uint8 array (N, hash_size, hash_size + 1), hash_size**2 <= 64
+
+    Returns:
+        uint64 array (N,)
+    """
+    thumbnails = np.asarray(thumbnails)
+    bits = (thumbnails[:, :, 1:] > thumbnails[:, :, :-1]).reshape(len(thumbnails), -1)
+    bits = np.pad(bits, ((0, 0), (64 - bits.shape[1], 0)))  # Left-pad to 64 bits
+    return np.packbits(bits, axis=1).view(">u8")[:, 0].astype(np.uint64)
+
+
+def hamming(hashes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Pairwise Hamming distances, (len(hashes), len(others)) int64."""
+    return popcount(np.bitwise_xor(np.asarray(hashes, dtype=np.uint64)[:, None],
+                                   np.asarray(others, dtype=np.uint64)[None, :]))
+
+
+def _to_db(h) -> int:
+    # SQLite integers are signed 64 bit
+    return int(np.uint64(h).astype(np.int64))
+
+
+def _from_db(h: int) -> np.uint64:
+    return np.int64(h).astype(np.uint64)
+
+
+class HashIndex:
+    """
+    Persistent per-frame hashes and near-duplicate decisions.
+
+    Args:
+        db_path: SQLite file (created if missing)
+        chunk: Indexed hashes compared per step in ``nearest`` (bounds memory)
+    """
+
+    def __init__(self, db_path: str, chunk: int = 1 << 16):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS frame_hashes (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash INTEGER,
+                duplicate_of TEXT, distance INTEGER);
+        """)
+        self.chunk = chunk
+        rows = self.db.execute(
+            "SELECT path, hash FROM frame_hashes WHERE duplicate_of IS NULL ORDER BY path").fetchall()
+        self._paths = [path for path, _ in rows]
+        self._hashes = np.array([_from_db(h) for _, h in rows], dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def records(self) -> dict:
+        """path -> (size, mtime_ns, hash, duplicate_of, distance) of every indexed frame."""
+        return {row[0]: (row[1], row[2], _from_db(row[3]), row[4], row[5]) for row in self.db.execute(
+            "SELECT path, size, mtime_ns, hash, duplicate_of, distance FROM frame_hashes")}
+
+    def nearest(self, hashes) -> tuple:
+        """
+        Closest kept frame for each hash.
+
+        Returns:
+            (distances int64, paths) per query; distance 65 and path None
+            when the index is empty
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        best = np.full(len(hashes), 65, dtype=np.int64)
+        where = np.full(len(hashes), -1, dtype=np.int64)
+        for start in range(0, len(self._hashes), self.chunk):
+            dist = hamming(hashes, self._hashes[start:start + self.chunk])
+            arg = dist.argmin(axis=1)
+            d = dist[np.arange(len(hashes)), arg]
+            closer = d < best
+            best[closer] = d[closer]
+            where[closer] = arg[closer] + start
+        return best, [self._paths[i] if i >= 0 else None for i in where]
+
+    def add(self, paths, stats, hashes, threshold: int = DEFAULT_THRESHOLD) -> list:
+        """
+        Index a batch of frames, in order, and decide which are near duplicates.
+
+        A frame is a near duplicate if it is within ``threshold`` bits of a
+        kept frame: one indexed before, or an earlier frame of this batch.
+
+        Args:
+            paths: Frame paths
+            stats: os.stat_result (or (size, mtime_ns)) per frame
+            hashes: uint64 hash per frame (dhash_batch())
+            threshold: Max Hamming distance of a near duplicate
+
+        Returns:
+            List of (duplicate_of or None, distance or None) per frame
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        best, best_paths = self.nearest(hashes)
+        within = hamming(hashes, hashes)
+        kept = []
+        decisions = []
+        for i, path in enumerate(paths):
+            duplicate_of, distance = None, None
+            if best[i] <= threshold:
+                duplicate_of, distance = best_paths[i], int(best[i])
+            if kept:
+                j = kept[int(within[i, kept].argmin())]
+                if within[i, j] <= threshold and (distance is None or within[i, j] < distance):
+                    duplicate_of, distance = paths[j], int(within[i, j])
+            if duplicate_of is None:
+                kept.append(i)
+            decisions.append((duplicate_of, distance))
+
+        rows = []
+        for path, st, h, (duplicate_of, distance) in zip(paths, stats, hashes, decisions):
+            size, mtime_ns = (st.st_size, st.st_mtime_ns) if hasattr(st, "st_size") else st
+            rows.append((path, size, mtime_ns, _to_db(h), duplicate_of, distance))
+        self.db.executemany("INSERT OR REPLACE INTO frame_hashes VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.db.commit()
+        self._paths += [paths[i] for i in kept]
+        self._hashes = np.concatenate([self._hashes, hashes[kept]])
+        return decisions
+
+    def remove(self, paths) -> None:
+        """Drop frames that no longer exist (or were moved away)."""
+        paths = set(paths)
+        if not paths:
+            return
+        self.db.executemany("DELETE FROM frame_hashes WHERE path = ?", [(p,) for p in paths])
+        self.db.commit()
+        keep = [i for i, p in enumerate(self._paths) if p not in paths]
+        self._paths = [self._paths[i] for i in keep]
+        self._hashes = self._hashes[keep]
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,280 @@
+"""
+Persistent frame registry: the frame number counter and every frame's split.
+
+Ingestion used to find the next frame number by listing every frame in
+frames_dataset/{train,test} and to rebuild dataset_info.csv by listing
+them again. The registry keeps the counter and one row per frame (the
+dataset_info.csv columns) in SQLite instead:
+
+- ``allocate`` reserves a block of frame numbers with a single UPDATE,
+  however many frames exist.
+- ``assign_split`` puts a frame in train or test from a hash of its id, so
+  the split of a frame never depends on which other frames exist, and
+  adding frames never moves existing ones.
+- ``export`` appends the rows added since the last export to
+  dataset_info.csv, and only rewrites the file if it was changed by
+  someone else (or frames were removed) in between.
+
+A registry opened on an existing dataset is filled from the frame folders
+once (``bootstrap``); existing frames keep the split they are in.
+"""
+
+import os
+import re
+import csv
+import sqlite3
+import hashlib
+
+from src.frame_scan import DATASET_INFO_FIELDS, PROBE_THREADS, read_dataset_info, scan_frames
+
+REGISTRY_FILE = ".frame_registry.sqlite"  # In the frames dataset folder
+DATASET_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # pml-ds/
+FRAMES_DIR = os.path.join(DATASET_ROOT, "frames_dataset")
+TILES_DIR = os.path.join(DATASET_ROOT, "frames_dataset_tiles")
+TEST_FRACTION = 0.2  # Share of new frames assigned to test
+FRAME_RE = re.compile(r"^frame_(\d+)")
+
+
+def frame_number(name: str) -> int:
+    """Number of a frame file or folder name ("frame_0084.png", "frame_0084_tiles"), or 0."""
+    m = FRAME_RE.match(name)
+    return int(m.group(1)) if m else 0
+
+
+def assign_split(frame_id: str, test_fraction: float = TEST_FRACTION) -> str:
+    """
+    Deterministic train/test assignment of a frame.
+
+    Args:
+        frame_id: Frame name without extension (e.g. "frame_0084")
+        test_fraction: Expected share of frames assigned to test
+
+    Returns:
+        "test" or "train"
+    """
+    digest = hashlib.blake2b(frame_id.encode(), digest_size=8).digest()
+    return "test" if int.from_bytes(digest, "big") < test_fraction * 2 ** 64 else "train"
+
+
+class FrameRegistry:
+    """
+    Frame number counter and per-frame dataset_info rows.
+
+    Args:
+        db_path: SQLite file (created if missing)
+    """
+
+    def __init__(self, db_path: str):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY, value INTEGER);
+            CREATE TABLE IF NOT EXISTS frames (
+                image_path TEXT PRIMARY KEY, set_type TEXT, size TEXT, mtime_ns TEXT,
+                width TEXT, height TEXT, format TEXT, exported INTEGER DEFAULT 0);
+            INSERT OR IGNORE INTO meta VALUES ('last_frame', 0);
+        """)
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM frames").fetchone()[0]
+
+    def _meta(self, name: str, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, name: str, value) -> None:
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, value))
+
+    @property
+    def last_frame(self) -> int:
+        """Highest frame number allocated so far (0 if none)."""
+        return self._meta("last_frame")
+
+    def bootstrapped(self) -> bool:
+        return bool(self._meta("bootstrapped", 0))
+
+    def bootstrap(self, split_dirs: dict, root: str, csv_path: str = None, other_dirs=(),
+                  threads: int = PROBE_THREADS) -> int:
+        """
+        Fill the registry from the frame folders (only done once per registry).
+
+        Args:
+            split_dirs: set_type -> frame folder (e.g. frames_dataset/train)
+            root: Directory image_path values are relative to
+            csv_path: Existing dataset_info.csv; its rows are reused for
+                unchanged frames instead of reading their headers
+            other_dirs: More folders whose frame_NNNN entries count for the
+                counter (e.g. tile folders of frames that were never saved)
+            threads: Header probe threads
+
+        Returns:
+            Number of frames registered
+        """
+        if self.bootstrapped():
+            return 0
+        split_dirs = {set_type: d for set_type, d in split_dirs.items() if os.path.isdir(d)}
+        known = read_dataset_info(csv_path) if csv_path else {}
+        rows, _ = scan_frames(split_dirs, root, known, threads)
+        last = max((frame_number(os.path.basename(row["image_path"])) for row in rows), default=0)
+        for d in other_dirs:
+            if os.path.isdir(d):
+                with os.scandir(d) as entries:
+                    last = max([last] + [frame_number(entry.name) for entry in entries])
+        self.add(rows, commit=False)
+        self._set_meta("last_frame", max(last, self.last_frame))
+        self._set_meta("bootstrapped", 1)
+        self.db.commit()
+        return len(rows)
+
+    def allocate(self, count: int) -> int:
+        """
+        Reserve ``count`` consecutive frame numbers.
+
+        Returns:
+            The first reserved number
+        """
+        with self.db:
+            self.db.execute("UPDATE meta SET value = value + ? WHERE name = 'last_frame'", (count,))
+            last = self._meta("last_frame")
+        return last - count + 1
+
+    def add(self, rows, commit: bool = True) -> None:
+        """Register (or update) frames from dataset_info rows (dicts with DATASET_INFO_FIELDS)."""
+        rows = list(rows)
+        if any(self.db.execute("SELECT 1 FROM frames WHERE image_path = ?", (row["image_path"],)).fetchone()
+               for row in rows):
+            self._set_meta("export_stale", 1)  # An exported row changes: appending is not enough
+        self.db.executemany(
+            "INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            [tuple(str(row[field]) for field in DATASET_INFO_FIELDS) for row in rows])
+        if commit:
+            self.db.commit()
+
+    def remove(self, image_paths) -> None:
+        """Forget frames (e.g. moved out of the dataset); the next export rewrites the CSV."""
+        image_paths = list(image_paths)
+        if not image_paths:
+            return
+        self.db.executemany("DELETE FROM frames WHERE image_path = ?", [(p,) for p in image_paths])
+        self._set_meta("export_stale", 1)
+        self.db.commit()
+
+    def rows(self) -> list:
+        """dataset_info rows of every frame, in registration order."""
+        cursor = self.db.execute(f"SELECT {', '.join(DATASET_INFO_FIELDS)} FROM frames ORDER BY rowid")
+        return [dict(zip(DATASET_INFO_FIELDS, row)) for row in cursor]
+
+    def sync(self, rows) -> None:
+        """
+        Make the registry match a full scan of the frame folders (dataset_info rows).
+
+        Frames that are gone are removed, new or changed ones are added, and
+        the counter is raised past every frame number seen.
+        """
+        rows = list(rows)
+        current = {row["image_path"]: row for row in rows}
+        registered = {row["image_path"]: row for row in self.rows()}
+        self.remove([path for path in registered if path not in current])
+        self.add([row for path, row in current.items()
+                  if {k: str(v) for k, v in row.items()} != registered.get(path)])
+        last = max((frame_number(os.path.basename(path)) for path in current), default=0)
+        self.db.execute("UPDATE meta SET value = MAX(value, ?) WHERE name = 'last_frame'", (last,))
+        self.db.commit()
+
+    def mark_exported(self, csv_path: str) -> None:
+        """Record that ``csv_path`` (written by someone else) holds every registered frame."""
+        st = os.stat(csv_path)
+        self.db.execute("UPDATE frames SET exported = 1 WHERE exported = 0")
+        self._set_meta("export_size", st.st_size)
+        self._set_meta("export_mtime_ns", st.st_mtime_ns)
+        self._set_meta("export_stale", 0)
+        self.db.commit()
+
+    def counts(self) -> dict:
+        """Number of frames per set_type."""
+        return dict(self.db.execute("SELECT set_type, COUNT(*) FROM frames GROUP BY set_type"))
+
+    def export(self, csv_path: str) -> int:
+        """
+        Bring dataset_info.csv up to date with the registry.
+
+        Rows registered since the last export are appended. The whole file is
+        rewritten (atomically) instead if it is missing, if it is not the
+        file the last export left behind (size or mtime changed), or if
+        frames were removed or updated since.
+
+        Returns:
+            Number of rows written
+        """
+        st = os.stat(csv_path) if os.path.exists(csv_path) else None
+        unchanged = (st is not None and not self._meta("export_stale", 0)
+                     and (st.st_size, st.st_mtime_ns) == (self._meta("export_size"), self._meta("export_mtime_ns")))
+        columns = ", ".join(DATASET_INFO_FIELDS)
+        if unchanged:
+            rows = self.db.execute(f"SELECT {columns} FROM frames WHERE exported = 0 ORDER BY rowid").fetchall()
+            if rows:
+                with open(csv_path, mode="a", newline="") as f:
+                    csv.writer(f).writerows(rows)
+        else:
+            rows = self.db.execute(f"SELECT {columns} FROM frames ORDER BY rowid").fetchall()
+            tmp_path = csv_path + ".tmp"
+            with open(tmp_path, mode="w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(DATASET_INFO_FIELDS)
+                writer.writerows(rows)
+            os.replace(tmp_path, csv_path)
+
+        self.mark_exported(csv_path)
+        return len(rows)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_registry(src_base: str, root: str, dst_base: str = None, threads: int = PROBE_THREADS) -> FrameRegistry:
+    """
+    Registry of a frames dataset folder, filled from its folders on first use.
+
+    Args:
+        src_base: Frames dataset folder (with train/, test/, dataset_info.csv)
+        root: Directory image_path values are relative to (pml-ds/)
+        dst_base: Tiles dataset folder; its frame_NNNN_tiles folders count
+            for the counter too (frames tiled without being saved)
+        threads: Header probe threads for the first fill
+    """
+    registry = FrameRegistry(os.path.join(src_base, REGISTRY_FILE))
+    if not registry.bootstrapped():
+        split_dirs = {set_type: os.path.join(src_base, set_type) for set_type in ["train", "test"]}
+        other_dirs = [os.path.join(dst_base, set_type) for set_type in ["train", "test"]] if dst_base else []
+        registry.bootstrap(split_dirs, root, os.path.join(src_base, "dataset_info.csv"), other_dirs, threads)
+    return registry
+
+
+def dataset_registry(threads: int = PROBE_THREADS) -> FrameRegistry:
+    """
+    The frame registry of pml-ds/frames_dataset, whatever the working directory.
+
+    Every stage that numbers frames opens it through here, so they all
+    count from the same file.
+    """
+    return open_registry(FRAMES_DIR, DATASET_ROOT, TILES_DIR, threads)
+
+
+def registry_path(path: str) -> str:
+    """image_path of a frame file as the registry stores it (relative to pml-ds/)."""
+    return os.path.relpath(os.path.abspath(path), DATASET_ROOT)
+
+
+def frame_path(image_path: str) -> str:
+    """Absolute path of a registry image_path."""
+    return os.path.normpath(os.path.join(DATASET_ROOT, image_path))
@@ -0,0 +1,117 @@
+"""
+Incremental frame scanning for dataset_info.csv.
+
+Frames are listed with os.scandir (the stat comes with the listing on most
+platforms) and their width, height and format are read from the image
+header only: PIL's Image.open parses the header and does not decode pixels
+until asked to. Header probes run on a thread pool. Rows of frames whose
+size and mtime are unchanged are reused from the previous CSV without
+opening the file.
+"""
+
+import os
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from src.manifest import IMAGE_EXTS
+from src import instrument
+
+DATASET_INFO_FIELDS = ["image_path", "set_type", "size", "mtime_ns", "width", "height", "format"]
+PROBE_THREADS = 8
+
+
+def probe_image(img_path: str) -> tuple:
+    """
+    Read an image's dimensions and format from its header (no pixel decode).
+
+    Args:
+        img_path: Path to the image file
+
+    Returns:
+        (width, height, format), e.g. (800, 600, "PNG")
+    """
+    with Image.open(img_path) as img:
+        return img.width, img.height, img.format
+
+
+def read_dataset_info(csv_path: str) -> dict:
+    """
+    Rows of an existing dataset_info.csv, by image_path.
+
+    Rows written before the size/mtime/dimension columns existed come back
+    with those fields empty, so they are probed again on the next scan.
+    """
+    if not os.path.exists(csv_path):
+        return {}
+    with open(csv_path, newline="") as f:
+        return {row["image_path"]: {field: row.get(field) or "" for field in DATASET_INFO_FIELDS}
+                for row in csv.DictReader(f)}
+
+
+def scan_frames(split_dirs: dict, root: str, known: dict = None, threads: int = PROBE_THREADS) -> tuple:
+    """
+    List the frames of several split folders, probing only new or changed files.
+
+    Args:
+        split_dirs: set_type -> folder, scanned in this order
+        root: Directory image_path values are relative to
+        known: Previous rows by image_path (read_dataset_info())
+        threads: Header probe threads
+
+    Returns:
+        (rows, probed): rows in split order then file name order, and the
+        image paths that were (re)probed
+    """
+    known = known or {}
+    rows = []
+    to_probe = []
+    with instrument.span("scan"):
+        for set_type, split_dir in split_dirs.items():
+            with os.scandir(split_dir) as entries:
+                found = sorted((entry.name, entry) for entry in entries
+                               if entry.name.lower().endswith(IMAGE_EXTS) and entry.is_file())
+            for _, entry in found:
+                st = entry.stat()
+                rel_path = os.path.relpath(entry.path, root)
+                row = {"image_path": rel_path, "set_type": set_type,
+                       "size": str(st.st_size), "mtime_ns": str(st.st_mtime_ns)}
+                prev = known.get(rel_path)
+                if prev is not None and prev["width"] and all(prev[k] == row[k] for k in row):
+                    row.update(width=prev["width"], height=prev["height"], format=prev["format"])
+                else:
+                    to_probe.append((row, entry.path))
+                rows.append(row)
+
+    with instrument.span("probe", files=len(to_probe)), ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        for (row, _), (width, height, fmt) in zip(to_probe, pool.map(probe_image, [p for _, p in to_probe])):
+            row.update(width=str(width), height=str(height), format=fmt)
+    return rows, [row["image_path"] for row, _ in to_probe]
+
+
+def frame_sizes(csv_path: str, root: str, paths=None) -> dict:
+    """
+    (width, height) of frames from dataset_info.csv (header-probed), by absolute path.
+
+    Only rows whose file still has the recorded size and mtime are used, so
+    a frame rewritten since the last scan is never planned with stale
+    dimensions. ``paths`` limits the lookup (and its stat calls) to some frames.
+
+    Args:
+        csv_path: dataset_info.csv
+        root: Directory its image_path values are relative to
+        paths: Absolute frame paths to look up (default: all rows)
+    """
+    wanted = None if paths is None else set(paths)
+    sizes = {}
+    for rel_path, row in read_dataset_info(csv_path).items():
+        path = os.path.normpath(os.path.join(root, rel_path))
+        if not row["width"] or (wanted is not None and path not in wanted):
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if row["size"] == str(st.st_size) and row["mtime_ns"] == str(st.st_mtime_ns):
+            sizes[path] = (int(row["width"]), int(row["height"]))
+    return sizes
@@ -8,29 +8,52 @@ import numpy as np
 def split_image_into_grid(img: np.ndarray, cols: int = 8, rows: int = 8) -> list:
     """
     Split an image into a grid of tiles.
-    
+
     Args:
         img: Image as numpy array in RGB format (H, W, 3)
         cols: Number of columns in the grid (default: 8)
         rows: Number of rows in the grid (default: 8)
-        
+
     Returns:
         List of tile images as numpy arrays in RGB format
     """
-    h, w = img.shape[:2]
+    grid = split_images_into_grid(img[np.newaxis], cols=cols, rows=rows)[0]
+    return [grid[r, c] for r in range(rows) for c in range(cols)]
+
+
+def split_images_into_grid(frames: np.ndarray, cols: int = 8, rows: int = 8,
+                           copy: bool = False) -> np.ndarray:
+    """
+    Split a stack of images into grid tiles without per-tile copies.
+
+    The grid is built with a single reshape/transpose, so by default the
+    result is a strided view into ``frames``. Tile ``(r, c)`` of frame ``n``
+    is ``tiles[n, r, c]`` and corresponds to ``tile_index = r * cols + c + 1``.
+    Pixels past the last full tile on the right/bottom edge are dropped, as
+    in ``split_image_into_grid``.
+
+    Args:
+        frames: Stack of images as numpy array (N, H, W, C)
+        cols: Number of columns in the grid (default: 8)
+        rows: Number of rows in the grid (default: 8)
+        copy: Return a C-contiguous copy instead of a view. On a contiguous
+            result ``tiles.reshape(N, rows * cols, tile_h, tile_w, C)`` is
+            itself a view, which is what encoders and buffer writes expect.
+
+    Returns:
+        numpy array of shape (N, rows, cols, tile_h, tile_w, C)
+    """
+    if frames.ndim != 4:
+        raise ValueError(f"Expected frames of shape (N, H, W, C), got {frames.shape}")
+    n, h, w, ch = frames.shape
     tile_h = h // rows
     tile_w = w // cols
-    
-    tiles = []
-    for r in range(rows):
-        for c in range(cols):
-            y_start = r * tile_h
-            y_end = y_start + tile_h
-            x_start = c * tile_w
-            x_end = x_start + tile_w
-            
-            tile = img[y_start:y_end, x_start:x_end]
-            tiles.append(tile)
-    
-    return tiles
 
+    # Splitting an axis in two never needs a copy, even on a cropped view
+    tiles = (frames[:, :tile_h * rows, :tile_w * cols]
+             .reshape(n, rows, tile_h, cols, tile_w, ch)
+             .transpose(0, 1, 3, 2, 4, 5))
+
+    if copy:
+        return np.ascontiguousarray(tiles)
+    return tiles
@@ -0,0 +1,281 @@
+"""
+Per-stage timing and counters for the pipeline scripts.
+
+Profiling is off unless the PML_PROFILE environment variable names a
+JSON-lines file; the scripts' --profile PATH flag sets it through
+``enable``, so worker processes started afterwards inherit it. When off,
+``span`` returns a shared no-op context and ``count`` returns at once.
+
+Each process aggregates calls, wall time, CPU time (of the calling thread)
+and counters per span name and appends them as "span" events on
+``flush``. ``stage`` brackets a script's run with "stage_start"/"stage_end"
+events and, at the end, prints and records a "summary" over every process
+of that stage. ``python -m src.instrument profile.jsonl`` summarizes a
+whole file (e.g. a full pipeline run).
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+ENV_VAR = "PML_PROFILE"            # JSON-lines output file; unset = profiling off
+RUN_ENV_VAR = "PML_PROFILE_RUN"    # Shared run id (set by enable() if missing)
+STAGE_ENV_VAR = "PML_PROFILE_STAGE"
+
+_path = os.environ.get(ENV_VAR) or None
+_lock = threading.Lock()
+_totals = {}  # span name -> [calls, wall_s, cpu_s, {counter: value}]
+
+
+def enabled() -> bool:
+    return _path is not None
+
+
+def enable(path: str, run_id: str = None) -> None:
+    """Turn profiling on for this process and the processes it starts."""
+    global _path
+    _path = os.path.abspath(path)
+    os.environ[ENV_VAR] = _path
+    if run_id is not None or RUN_ENV_VAR not in os.environ:
+        os.environ[RUN_ENV_VAR] = run_id or time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+
+
+def _run_id():
+    return os.environ.get(RUN_ENV_VAR, "")
+
+
+if _path is not None:
+    enable(_path)
+
+if hasattr(os, "register_at_fork"):
+    # Forked workers start with empty totals, or the parent's would be reported twice
+    os.register_at_fork(after_in_child=_totals.clear)
+
+
+def _add(name, wall, cpu, counters, calls=1):
+    with _lock:
+        entry = _totals.get(name)
+        if entry is None:
+            entry = _totals[name] = [0, 0.0, 0.0, {}]
+        entry[0] += calls
+        entry[1] += wall
+        entry[2] += cpu
+        for key, value in counters.items():
+            entry[3][key] = entry[3].get(key, 0) + value
+
+
+class _Span:
+    __slots__ = ("name", "counters", "wall", "cpu")
+
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = counters
+
+    def add(self, **counters):
+        """Add to the span's counters (e.g. bytes, once they are known)."""
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        _add(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu, self.counters)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def add(self, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **counters):
+    """
+    Time a block under ``name``.
+
+    Args:
+        name: Sub-step name (e.g. "decode", "encode", "file_write", "csv_write")
+        **counters: Counters to add for this call (e.g. bytes=..., tiles=64)
+
+    Returns:
+        Context manager; its ``add(**counters)`` adds counters from inside the block
+    """
+    if _path is None:
+        return _NULL_SPAN
+    return _Span(name, counters)
+
+
+def count(name: str, **counters) -> None:
+    """Add counters to ``name`` without timing anything."""
+    if _path is not None:
+        _add(name, 0.0, 0.0, counters, calls=0)
+
+
+def timed_iter(name: str, iterable):
+    """Yield from ``iterable``, timing each next() under ``name`` (e.g. a decoder)."""
+    if _path is None:
+        yield from iterable
+        return
+    it = iter(iterable)
+    while True:
+        with span(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                break
+        yield item
+
+
+def _write(events):
+    if _path is None or not events:
+        return
+    parent = os.path.dirname(_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    # One write per batch: appends from several processes do not interleave lines
+    with open(_path, "a") as f:
+        f.write("".join(json.dumps(event) + "\n" for event in events))
+
+
+def flush(stage_name: str = None) -> None:
+    """Append this process's span totals as "span" events and reset them."""
+    if _path is None:
+        return
+    with _lock:
+        totals = dict(_totals)
+        _totals.clear()
+    stage_name = stage_name or os.environ.get(STAGE_ENV_VAR, "")
+    pid = os.getpid()
+    _write([{"event": "span", "run": _run_id(), "stage": stage_name, "pid": pid, "name": name,
+             "calls": calls, "wall_s": wall, "cpu_s": cpu, "counters": counters}
+            for name, (calls, wall, cpu, counters) in totals.items()])
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Bracket a script's run: start/end events, span flush and a printed summary.
+
+    Worker processes started inside the block record their spans under the
+    same stage name (they must call ``flush()`` before returning).
+    """
+    if _path is None:
+        yield
+        return
+    previous = os.environ.get(STAGE_ENV_VAR)
+    os.environ[STAGE_ENV_VAR] = name
+    _write([{"event": "stage_start", "run": _run_id(), "stage": name, "pid": os.getpid(),
+             "time": time.time()}])
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        flush(name)
+        _write([{"event": "stage_end", "run": _run_id(), "stage": name, "pid": os.getpid(),
+                 "time": time.time(), "wall_s": wall, "cpu_s": cpu}])
+        if previous is None:
+            os.environ.pop(STAGE_ENV_VAR, None)
+        else:
+            os.environ[STAGE_ENV_VAR] = previous
+        summary = summarize(_path, run_id=_run_id(), stage_name=name).get(name)
+        if summary is not None:
+            _write([dict(summary, event="summary", run=_run_id(), stage=name)])
+            print_summary({name: summary})
+
+
+def add_profile_arg(parser) -> None:
+    """Add the --profile option every stage script takes to an argparse parser."""
+    parser.add_argument("--profile", default=None, metavar="PATH",
+                        help=f"Append per-step timing events (JSON lines) to PATH (same as setting {ENV_VAR})")
+
+
+def run_cli(stage_name: str, main, args):
+    """
+    Run a script's ``main(args)`` as stage ``stage_name``; returns what it returns.
+
+    ``args`` come from a parser with add_profile_arg(): profiling is turned
+    on first if --profile was given. With ``stage_name`` None the script
+    brackets its own stages (e.g. one per watch batch).
+    """
+    if args.profile:
+        enable(args.profile)
+    if stage_name is None:
+        return main(args)
+    with stage(stage_name):
+        return main(args)
+
+
+def summarize(path: str, run_id: str = None, stage_name: str = None) -> dict:
+    """
+    Fold the events of a profile file into per-stage totals.
+
+    Args:
+        path: JSON-lines profile file
+        run_id: Only this run (default: the last run in the file)
+        stage_name: Only this stage (default: all)
+
+    Returns:
+        Dict stage -> {wall_s, cpu_s, spans: {name: {calls, wall_s, cpu_s, counters}}}
+    """
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    if run_id is None and events:
+        run_id = events[-1].get("run", "")
+    stages = {}
+    for event in events:
+        if event.get("run") != run_id or event["event"] not in ("span", "stage_end"):
+            continue
+        if stage_name is not None and event["stage"] != stage_name:
+            continue
+        entry = stages.setdefault(event["stage"], {"wall_s": 0.0, "cpu_s": 0.0, "spans": {}})
+        if event["event"] == "stage_end":
+            entry["wall_s"] += event["wall_s"]
+            entry["cpu_s"] += event["cpu_s"]
+            continue
+        s = entry["spans"].setdefault(event["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "counters": {}})
+        s["calls"] += event["calls"]
+        s["wall_s"] += event["wall_s"]
+        s["cpu_s"] += event["cpu_s"]
+        for key, value in event["counters"].items():
+            s["counters"][key] = s["counters"].get(key, 0) + value
+    return stages
+
+
+def print_summary(stages: dict, file=None) -> None:
+    """Print summarize() output as one table per stage, slowest sub-step first."""
+    file = file or sys.stdout
+    for name, entry in stages.items():
+        print(f"\n[profile] {name}: {entry['wall_s']:.2f}s wall, {entry['cpu_s']:.2f}s CPU (main process)",
+              file=file)
+        print(f"  {'span':<16}{'calls':>9}{'wall s':>10}{'cpu s':>10}  counters", file=file)
+        for span_name, s in sorted(entry["spans"].items(), key=lambda item: -item[1]["wall_s"]):
+            counters = ", ".join(f"{k}={v:,}" if isinstance(v, int) else f"{k}={v:.3g}"
+                                 for k, v in sorted(s["counters"].items()))
+            print(f"  {span_name:<16}{s['calls']:>9}{s['wall_s']:>10.3f}{s['cpu_s']:>10.3f}  {counters}",
+                  file=file)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarize a pipeline profile (JSON lines).")
+    parser.add_argument("profile", help="File written with PML_PROFILE / --profile")
+    parser.add_argument("--run", default=None, help="Run id (default: the last run in the file)")
+    args = parser.parse_args()
+    print_summary(summarize(args.profile, run_id=args.run))
@@ -0,0 +1,248 @@
+"""
+Label statistics computed from the consolidated objects_{split}_dataset.csv.
+
+The labels of a split are held as one (frames x cells) int8 matrix. Every
+breakdown (per class, per frame, per cell position) is a vectorized
+reduction over that matrix, and the matrix is cached on disk so that a
+report on an unchanged table costs one stat() and one small .npz read.
+Stages that rewrite a table bring the cache along with the frames they
+changed (``update_stats_cache``), so a report after an incremental run
+does not re-read the whole table either.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Label code mapping
+LABEL_CODE_MAP = {
+    0: "no object",
+    1: "ball",
+    2: "bat",
+    3: "stump"
+}
+
+
+def frame_id_from_filename(image_filename: str) -> str:
+    """'frame_0084_grid_overlay.png' -> 'frame_0084'."""
+    name = os.path.splitext(image_filename)[0]
+    return name[:-len("_grid_overlay")] if name.endswith("_grid_overlay") else name
+
+
+def read_label_matrix(table_path: str, num_cells: int = 64, header: bool = True) -> tuple:
+    """
+    Read the label column of a consolidated table into a matrix.
+
+    Args:
+        table_path: objects_{split}_dataset.csv, or the .npz written next to it
+        num_cells: Cells per frame (default: 64)
+        header: False for CSV rows without a header line (e.g. a stage's shard)
+
+    Returns:
+        (frame_ids, labels): list of F frame ids (table order) and an int8
+        (F, num_cells) matrix indexed by cell_number - 1
+    """
+    if table_path.endswith(".npz"):
+        with np.load(table_path) as data:
+            filenames, cells, codes = data["image_filename"], data["cell_number"], data["label"]
+    else:
+        columns = ["image_filename", "cell_number", "label"]
+        df = pd.read_csv(table_path, usecols=columns) if header else \
+            pd.read_csv(table_path, header=None, usecols=[0, 1, 4], names=columns)
+        filenames = df["image_filename"].to_numpy()
+        cells = df["cell_number"].to_numpy()
+        codes = df["label"].to_numpy()
+
+    frame_index, unique_names = pd.factorize(filenames, sort=False)
+    labels = np.zeros((len(unique_names), num_cells), dtype=np.int8)
+    labels[frame_index, np.asarray(cells, dtype=np.int64) - 1] = codes
+    return [frame_id_from_filename(str(name)) for name in unique_names], labels
+
+
+def compute_stats(frame_ids, labels: np.ndarray, label_names: dict = None) -> dict:
+    """
+    Per-class, per-frame and per-cell-position label breakdowns.
+
+    Args:
+        frame_ids: Frame ids, one per row of ``labels``
+        labels: int (F, num_cells) label matrix
+        label_names: Code -> name mapping (default: LABEL_CODE_MAP)
+
+    Returns:
+        JSON-serialisable dict:
+            totals: frames, tiles, frames_without_objects
+            per_class: {code: {name, count, pct}}
+            per_frame: {frame_id: {total_tiles, counts: [per code], non_none_tiles}}
+            per_cell: {code: [count per cell position 1..num_cells]}
+    """
+    label_names = LABEL_CODE_MAP if label_names is None else label_names
+    num_frames, num_cells = labels.shape
+    codes = sorted(set(label_names) | set(np.unique(labels).tolist()))
+    # (F, cells, classes) one-hot would be large; reduce one class at a time
+    per_frame = np.stack([(labels == code).sum(axis=1) for code in codes], axis=1) \
+        if num_frames else np.zeros((0, len(codes)), dtype=np.int64)
+    per_cell = np.stack([(labels == code).sum(axis=0) for code in codes], axis=0)
+    class_counts = per_frame.sum(axis=0)
+    total_tiles = int(class_counts.sum())
+
+    none_col = codes.index(0) if 0 in codes else None
+    non_none = num_cells - (per_frame[:, none_col] if none_col is not None else 0)
+    non_none = np.broadcast_to(non_none, (num_frames,))
+
+    return {
+        "totals": {
+            "frames": int(num_frames),
+            "tiles": total_tiles,
+            "frames_without_objects": int((non_none == 0).sum()),
+        },
+        "codes": codes,
+        "per_class": {
+            str(code): {
+                "name": label_names.get(code, f"unknown({code})"),
+                "count": int(count),
+                "pct": (100.0 * int(count) / total_tiles) if total_tiles else 0.0,
+            }
+            for code, count in zip(codes, class_counts.tolist())
+        },
+        "per_frame": {
+            frame_id: {
+                "total_tiles": int(num_cells),
+                "counts": counts,
+                "non_none_tiles": int(nn),
+            }
+            for frame_id, counts, nn in zip(frame_ids, per_frame.tolist(), non_none.tolist())
+        },
+        "per_cell": {str(code): row for code, row in zip(codes, per_cell.tolist())},
+    }
+
+
+class LabelStatsCache:
+    """
+    On-disk cache of a split's label matrix.
+
+    The cache remembers the (size, mtime) of the table it was built from and
+    is rebuilt only when that table changes. Producers that already know
+    which frames changed apply them with ``upsert``/``remove`` instead (see
+    update_stats_cache).
+
+    Args:
+        cache_path: .npz file holding frame_ids, labels and the source signature
+        num_cells: Cells per frame (default: 64)
+    """
+
+    def __init__(self, cache_path: str, num_cells: int = 64):
+        self.cache_path = cache_path
+        self.num_cells = num_cells
+        self.source_signature = ""
+        self.frame_ids = []
+        self.labels = np.zeros((0, num_cells), dtype=np.int8)
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                self.source_signature = str(data["source_signature"])
+                self.frame_ids = data["frame_ids"].tolist()
+                self.labels = data["labels"]
+        self._rows = {frame_id: i for i, frame_id in enumerate(self.frame_ids)}
+
+    @staticmethod
+    def signature(table_path: str) -> str:
+        st = os.stat(table_path)
+        return f"{os.path.abspath(table_path)}:{st.st_size}:{st.st_mtime_ns}"
+
+    def refresh(self, table_path: str, read_path: str = None) -> bool:
+        """
+        Rebuild from ``table_path`` if it changed since the cache was built. Returns True if rebuilt.
+
+        ``read_path`` is an up-to-date copy of the table that is faster to
+        read (the .npz next to the CSV); the cache stays keyed on ``table_path``.
+        """
+        sig = self.signature(table_path)
+        if sig == self.source_signature:
+            return False
+        self.frame_ids, self.labels = read_label_matrix(read_path or table_path, self.num_cells)
+        self._rows = {frame_id: i for i, frame_id in enumerate(self.frame_ids)}
+        self.source_signature = sig
+        self.save()
+        return True
+
+    def upsert(self, frame_ids, labels: np.ndarray) -> None:
+        """Add or replace the label rows of some frames."""
+        labels = np.asarray(labels, dtype=np.int8).reshape(len(frame_ids), self.num_cells)
+        new_ids = [f for f in dict.fromkeys(frame_ids) if f not in self._rows]
+        if new_ids:
+            for frame_id in new_ids:
+                self._rows[frame_id] = len(self.frame_ids)
+                self.frame_ids.append(frame_id)
+            self.labels = np.concatenate([self.labels, np.zeros((len(new_ids), self.num_cells), dtype=np.int8)])
+        # Later rows win when a frame id is repeated
+        self.labels[[self._rows[f] for f in frame_ids]] = labels
+
+    def remove(self, frame_ids) -> None:
+        """Drop the label rows of some frames."""
+        drop = {self._rows[f] for f in frame_ids if f in self._rows}
+        if not drop:
+            return
+        keep = np.array([i not in drop for i in range(len(self.frame_ids))], dtype=bool)
+        self.frame_ids = [f for f, k in zip(self.frame_ids, keep) if k]
+        self.labels = self.labels[keep]
+        self._rows = {frame_id: i for i, frame_id in enumerate(self.frame_ids)}
+
+    def save(self, source_signature: str = None) -> None:
+        """Persist the cache (optionally marking it as built from a given table state)."""
+        if source_signature is not None:
+            self.source_signature = source_signature
+        tmp_path = self.cache_path + ".tmp.npz"
+        np.savez(tmp_path, frame_ids=np.array(self.frame_ids, dtype=str),
+                 labels=self.labels, source_signature=np.array(self.source_signature))
+        os.replace(tmp_path, self.cache_path)
+
+    def stats(self, label_names: dict = None) -> dict:
+        return compute_stats(self.frame_ids, self.labels, label_names)
+
+
+def stats_cache_path(split_dir: str, split_name: str) -> str:
+    """The label matrix cache of a split: {split_dir}/.label_stats_{split}.npz."""
+    return os.path.join(split_dir, f".label_stats_{split_name}.npz")
+
+
+def update_stats_cache(cache_path: str, table_path: str, previous_signature: str, frame_ids=(),
+                       labels: np.ndarray = None, removed=()) -> bool:
+    """
+    Apply a table rewrite to a split's label matrix cache, without reading the table.
+
+    The rewrite dropped the rows of ``removed`` and ``frame_ids`` and
+    appended those of ``frame_ids`` (in that order), as the tiling and
+    labels stages do. Only a cache built from the table as it was before
+    (``previous_signature``, LabelStatsCache.signature() taken before the
+    rewrite) is updated; any other is left for refresh() to rebuild.
+
+    Args:
+        cache_path: Cache file (stats_cache_path())
+        table_path: The rewritten table
+        previous_signature: Signature of the table before the rewrite (None if it did not exist)
+        frame_ids: Frames whose rows were (re)written, in table order
+        labels: Their (len(frame_ids), cells) label matrix
+        removed: Frames whose rows were dropped
+
+    Returns:
+        True if the cache was updated
+    """
+    if previous_signature is None or not os.path.exists(cache_path):
+        return False
+    cache = LabelStatsCache(cache_path)
+    if cache.source_signature != previous_signature:
+        return False
+    frame_ids = list(frame_ids)
+    cache.remove(set(removed) | set(frame_ids))  # Rewritten frames move to the end, as in the table
+    if frame_ids:
+        cache.upsert(frame_ids, labels)
+    cache.save(LabelStatsCache.signature(table_path))
+    return True
+
+
+def write_stats_json(stats: dict, json_path: str) -> None:
+    """Write a stats dict as JSON (atomically)."""
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stats, f, indent=1)
+    os.replace(tmp_path, json_path)
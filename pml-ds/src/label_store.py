@@ -0,0 +1,204 @@
+"""
+Indexed tile label store.
+
+Hand-made labels live in one SQLite table keyed by (frame, cell_number).
+Labeling tools can write to it directly with ``upsert``; the per-frame
+{frame}_labels.csv files are imported with ``sync_frame_csvs``, which only
+reads the files whose size/mtime changed since their last import. Readers
+get labels for many frames in one query (``label_matrix``), so building the
+consolidated tables costs time proportional to the frames asked for, not to
+per-row pandas access.
+"""
+
+import os
+import time
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from src.labels import LABEL_MAP, read_frame_labels_csv, build_label_table, write_label_table
+
+
+class LabelStore:
+    """
+    SQLite-backed labels, keyed by (frame, cell_number).
+
+    Cells without a row have the "none" label. Every write stamps the
+    touched frames with a new ``updated_ns``, which callers can fold into
+    their own change-detection signatures.
+
+    Args:
+        db_path: SQLite file (created if missing)
+    """
+
+    def __init__(self, db_path: str):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS labels (
+                frame TEXT, cell_number INTEGER, label INTEGER,
+                PRIMARY KEY (frame, cell_number)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS frames (
+                frame TEXT PRIMARY KEY, updated_ns INTEGER, source TEXT);
+        """)
+
+    def _touch(self, frame_ids) -> None:
+        now = time.time_ns()
+        self.db.executemany(
+            "INSERT INTO frames (frame, updated_ns) VALUES (?, ?) "
+            "ON CONFLICT (frame) DO UPDATE SET updated_ns = excluded.updated_ns",
+            [(frame_id, now) for frame_id in frame_ids])
+
+    def upsert(self, frame_ids, cell_numbers, labels) -> None:
+        """
+        Insert or overwrite labels in bulk.
+
+        Args:
+            frame_ids: Frame id per label (e.g. "frame_0084"), or one id for all
+            cell_numbers: 1-based cell numbers
+            labels: Label codes
+        """
+        cell_numbers = np.asarray(cell_numbers, dtype=np.int64).tolist()
+        labels = np.asarray(labels, dtype=np.int64).tolist()
+        if isinstance(frame_ids, str):
+            frame_ids = [frame_ids] * len(cell_numbers)
+        self.db.executemany(
+            "INSERT INTO labels (frame, cell_number, label) VALUES (?, ?, ?) "
+            "ON CONFLICT (frame, cell_number) DO UPDATE SET label = excluded.label",
+            zip(frame_ids, cell_numbers, labels))
+        self._touch(set(frame_ids))
+        self.db.commit()
+
+    def clear(self, frame_ids) -> None:
+        """Drop all labels of some frames (they become all "none")."""
+        frame_ids = list(frame_ids)
+        self.db.executemany("DELETE FROM labels WHERE frame = ?", [(f,) for f in frame_ids])
+        self._touch(frame_ids)
+        self.db.commit()
+
+    def sync_frame_csvs(self, tiles_split_dir: str, frame_ids) -> list:
+        """
+        Import per-frame {frame}_labels.csv files that changed since their last import.
+
+        A file that was imported before and has since been deleted clears
+        the frame's labels; frames that never had a file keep whatever was
+        written to the store directly.
+
+        Args:
+            tiles_split_dir: frames_dataset_tiles/{split}
+            frame_ids: Frames to check
+
+        Returns:
+            List of frame ids whose labels were (re)imported or cleared
+        """
+        imported = dict(self.db.execute("SELECT frame, source FROM frames WHERE source IS NOT NULL"))
+        changed = {}
+        rows = []
+        for frame_id in frame_ids:
+            per_frame_csv = os.path.join(tiles_split_dir, f"{frame_id}_tiles", f"{frame_id}_labels.csv")
+            try:
+                st = os.stat(per_frame_csv)
+            except FileNotFoundError:
+                if frame_id in imported:
+                    changed[frame_id] = None
+                continue
+            sig = f"{st.st_size}:{st.st_mtime_ns}"
+            if imported.get(frame_id) == sig:
+                continue
+            try:
+                cells, codes = read_frame_labels_csv(per_frame_csv)
+            except Exception as e:
+                print(f"Warning: Could not read existing labels for {frame_id}: {e}")
+                continue
+            changed[frame_id] = sig
+            rows.extend(zip([frame_id] * len(cells), cells.tolist(), codes.tolist()))
+
+        if changed:
+            self.db.executemany("DELETE FROM labels WHERE frame = ?", [(f,) for f in changed])
+            self.db.executemany(
+                "INSERT OR REPLACE INTO labels (frame, cell_number, label) VALUES (?, ?, ?)", rows)
+            now = time.time_ns()
+            self.db.executemany(
+                "INSERT INTO frames (frame, updated_ns, source) VALUES (?, ?, ?) "
+                "ON CONFLICT (frame) DO UPDATE SET updated_ns = excluded.updated_ns, "
+                "source = excluded.source",
+                [(frame_id, now, sig) for frame_id, sig in changed.items()])
+            self.db.commit()
+        return list(changed)
+
+    def versions(self, frame_ids=None) -> dict:
+        """Frame id -> updated_ns of its last write (frames never written are absent)."""
+        versions = dict(self.db.execute("SELECT frame, updated_ns FROM frames"))
+        if frame_ids is None:
+            return versions
+        return {f: versions[f] for f in frame_ids if f in versions}
+
+    def label_matrix(self, frame_ids, num_cells: int = 64) -> np.ndarray:
+        """
+        Labels of many frames in one query.
+
+        Args:
+            frame_ids: Frame ids (length F)
+            num_cells: Cells per frame (default: 64)
+
+        Returns:
+            int8 (F, num_cells) matrix indexed by cell_number - 1
+        """
+        frame_ids = list(frame_ids)
+        labels = np.full((len(frame_ids), num_cells), LABEL_MAP["none"], dtype=np.int8)
+        if not frame_ids:
+            return labels
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (pos INTEGER PRIMARY KEY, frame TEXT)")
+        self.db.execute("DELETE FROM temp.wanted")
+        self.db.executemany("INSERT INTO temp.wanted (pos, frame) VALUES (?, ?)", enumerate(frame_ids))
+        found = np.array(self.db.execute(
+            "SELECT w.pos, l.cell_number, l.label FROM temp.wanted w "
+            "JOIN labels l ON l.frame = w.frame").fetchall(), dtype=np.int64).reshape(-1, 3)
+        self.db.execute("DELETE FROM temp.wanted")
+        self.db.commit()
+        valid = (found[:, 1] >= 1) & (found[:, 1] <= num_cells)
+        labels[found[valid, 0], found[valid, 1] - 1] = found[valid, 2]
+        return labels
+
+    def export_table(self, frame_ids, csv_path: str, cols: int = 8, rows: int = 8,
+                     binary: str = None) -> list:
+        """
+        Write the consolidated labels table of some frames (see build_label_table()).
+
+        Returns:
+            List of written paths
+        """
+        frame_ids = list(frame_ids)
+        df = build_label_table(frame_ids, self.label_matrix(frame_ids, cols * rows), cols=cols, rows=rows)
+        return write_label_table(df, csv_path, binary=binary)
+
+    def join_tiles(self, tiles: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add a ``label`` column to a tiles_info table.
+
+        Args:
+            tiles: DataFrame with parent_image (e.g. "frame_0084") and tile_index columns
+
+        Returns:
+            Copy of ``tiles`` with the label of every tile ("none" when unlabeled)
+        """
+        labeled = pd.read_sql_query("SELECT frame, cell_number, label FROM labels", self.db)
+        keys = pd.DataFrame({
+            "frame": tiles["parent_image"].str.replace(r"\.[^.]+$", "", regex=True),
+            "cell_number": tiles["tile_index"].astype(np.int64),
+        })
+        label = keys.merge(labeled, how="left", on=["frame", "cell_number"])["label"]
+        out = tiles.copy()
+        out["label"] = label.fillna(LABEL_MAP["none"]).astype(np.int8).to_numpy()
+        return out
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
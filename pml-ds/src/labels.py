@@ -0,0 +1,242 @@
+"""
+Per-tile label tables for the consolidated objects_{split}_dataset.csv files.
+"""
+
+import os
+import csv
+import numpy as np
+import pandas as pd
+
+
+# Label map (as per modeling task)
+LABEL_MAP = {
+    "none": 0,
+    "ball": 1,
+    "bat": 2,
+    "stump": 3  # Note: requirement says "stump" not "stumps"
+}
+
+
+def label_columns(num_tiles: int = 64) -> list:
+    """
+    Column names of the consolidated labels CSV.
+
+    Args:
+        num_tiles: Number of tiles per frame, i.e. number of c{n} columns
+
+    Returns:
+        List: image_filename, cell_number, cell_row, cell_col, label, c1..c{num_tiles}
+    """
+    return ["image_filename", "cell_number", "cell_row", "cell_col", "label"] + \
+        [f"c{i}" for i in range(1, num_tiles + 1)]
+
+
+def labels_csv_path(tiles_split_dir: str, split_name: str) -> str:
+    """Path of the consolidated labels CSV for a split."""
+    return os.path.join(tiles_split_dir, f"objects_{split_name}_dataset.csv")
+
+
+def cell_template(cols: int = 8, rows: int = 8) -> tuple:
+    """
+    Per-frame cell layout, shared by every frame of a table.
+
+    Args:
+        cols: Number of columns in the grid (default: 8)
+        rows: Number of rows in the grid (default: 8)
+
+    Returns:
+        (cell_number, cell_row, cell_col) arrays of length cols*rows, 1-based
+    """
+    cell_number = np.arange(1, cols * rows + 1, dtype=np.int32)
+    cell_row = (cell_number - 1) // cols + 1
+    cell_col = (cell_number - 1) % cols + 1
+    return cell_number, cell_row, cell_col
+
+
+def read_frame_labels_csv(per_frame_csv: str) -> tuple:
+    """
+    Read a per-frame labels CSV (TileIndex,LabelCode).
+
+    Args:
+        per_frame_csv: Path of a {frame_id}_labels.csv file
+
+    Returns:
+        (cell_numbers, labels) int64 arrays, in file order
+    """
+    with open(per_frame_csv, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        tile_col, label_col = header.index("TileIndex"), header.index("LabelCode")
+        rows = [(int(row[tile_col]), int(row[label_col])) for row in reader if row]
+    data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+
+def load_existing_labels(frame_tile_dir: str, frame_id: str) -> dict:
+    """
+    Load hand-made labels from a frame's {frame_id}_labels.csv, if present.
+
+    Args:
+        frame_tile_dir: The frame's _tiles folder
+        frame_id: Frame name without extension (e.g. "frame_0084")
+
+    Returns:
+        Dict mapping TileIndex -> LabelCode (empty if there is no labels CSV)
+    """
+    per_frame_csv = os.path.join(frame_tile_dir, f"{frame_id}_labels.csv")
+    existing_labels = {}
+
+    if os.path.exists(per_frame_csv):
+        # Load existing labels if per-frame CSV exists
+        try:
+            cells, codes = read_frame_labels_csv(per_frame_csv)
+            existing_labels = dict(zip(cells.tolist(), codes.tolist()))
+        except Exception as e:
+            print(f"Warning: Could not read existing labels for {frame_id}: {e}")
+
+    return existing_labels
+
+
+def frame_labels(frame_id: str, frame_tile_dir: str, num_tiles: int = 64) -> np.ndarray:
+    """
+    Label vector of a single frame, indexed by cell_number - 1.
+
+    Labels come from the frame's existing per-frame labels CSV and default
+    to 0 (none).
+    """
+    labels = np.full(num_tiles, LABEL_MAP["none"], dtype=np.int8)
+    for tile_idx, label_code in load_existing_labels(frame_tile_dir, frame_id).items():
+        if 1 <= tile_idx <= num_tiles:
+            labels[tile_idx - 1] = label_code
+    return labels
+
+
+def build_label_table(frame_ids, labels: np.ndarray, features: np.ndarray = None,
+                      cols: int = 8, rows: int = 8) -> pd.DataFrame:
+    """
+    Build the consolidated label table straight from arrays.
+
+    Args:
+        frame_ids: Frame names without extension, one per frame (length F)
+        labels: Integer labels (F, cols*rows), indexed by cell_number - 1
+        features: Optional float32 c1..c{cols*rows} matrix (F*cols*rows, cols*rows);
+            all 0.0 when omitted
+        cols: Number of columns in the grid (default: 8)
+        rows: Number of rows in the grid (default: 8)
+
+    Returns:
+        DataFrame with label_columns() columns, one row per tile
+    """
+    num_tiles = cols * rows
+    num_frames = len(frame_ids)
+    cell_number, cell_row, cell_col = cell_template(cols, rows)
+    if features is None:
+        features = np.zeros((num_frames * num_tiles, num_tiles), dtype=np.float32)
+
+    # Image filename: use grid overlay name format (e.g., "frame_0084_grid_overlay.png")
+    image_filenames = np.array([f"{frame_id}_grid_overlay.png" for frame_id in frame_ids], dtype=object)
+
+    columns = label_columns(num_tiles)
+    data = {
+        "image_filename": np.repeat(image_filenames, num_tiles),
+        "cell_number": np.tile(cell_number, num_frames),
+        "cell_row": np.tile(cell_row, num_frames),
+        "cell_col": np.tile(cell_col, num_frames),
+        "label": np.asarray(labels).reshape(-1),
+    }
+    data.update(zip(columns[5:], np.asarray(features, dtype=np.float32).T))
+    return pd.DataFrame(data, columns=columns, copy=False)
+
+
+def frame_label_rows(frame_id: str, frame_tile_dir: str, cols: int = 8, rows: int = 8,
+                     labels=None, features=None) -> list:
+    """
+    Build the label rows (one per tile) of a single frame, for csv.writer.
+
+    Args:
+        frame_id: Frame name without extension (e.g. "frame_0084")
+        frame_tile_dir: The frame's _tiles folder
+        cols: Number of columns in the grid (default: 8)
+        rows: Number of rows in the grid (default: 8)
+        labels: Label vector indexed by cell_number - 1 (e.g. a LabelStore
+            label_matrix() row); read from the per-frame labels CSV if omitted
+        features: Optional c1..c{cols*rows} values per tile (cols*rows, cols*rows),
+            e.g. src.tile_features.grid_features() of an 8x8 frame; all 0.0 when omitted
+
+    Returns:
+        List of rows, each a list of values in label_columns() order
+    """
+    num_tiles = cols * rows
+    if labels is None:
+        labels = frame_labels(frame_id, frame_tile_dir, num_tiles)
+    labels = np.asarray(labels).tolist()
+    cell_number, cell_row, cell_col = cell_template(cols, rows)
+    image_filename = f"{frame_id}_grid_overlay.png"
+    if features is None:
+        features = [[0.0] * num_tiles] * num_tiles
+    else:
+        # float32 text, as pandas writes the same values
+        features = np.asarray(features, dtype=np.float32).reshape(num_tiles, num_tiles).astype(str).tolist()
+    return [[image_filename, n, r, c, label] + tile_features
+            for n, r, c, label, tile_features in zip(cell_number.tolist(), cell_row.tolist(),
+                                                     cell_col.tolist(), labels, features)]
+
+
+def write_label_table(df: pd.DataFrame, csv_path: str, binary: str = None) -> list:
+    """
+    Write a label table as CSV and, optionally, a binary columnar copy next to it.
+
+    Args:
+        df: Table from build_label_table()
+        csv_path: Output CSV path
+        binary: None, "npz" or "parquet" (parquet needs pyarrow or fastparquet)
+
+    Returns:
+        List of written paths
+    """
+    df.to_csv(csv_path, index=False)
+    written = [csv_path]
+    if binary is not None:
+        written.append(write_binary_table(df, csv_path, binary))
+    return written
+
+
+def write_binary_table(df: pd.DataFrame, csv_path: str, binary: str) -> str:
+    """
+    Write the binary columnar copy of a label table next to its CSV.
+
+    Args:
+        df: Label table (label_columns() columns)
+        csv_path: Path of the table's CSV; the extension is replaced
+        binary: "npz" or "parquet" (parquet needs pyarrow or fastparquet)
+
+    Returns:
+        Path of the written file
+    """
+    stem = os.path.splitext(csv_path)[0]
+    if binary == "npz":
+        npz_path = stem + ".npz"
+        features = df.iloc[:, 5:].to_numpy(dtype=np.float32)
+        np.savez(npz_path,
+                 image_filename=df["image_filename"].to_numpy(dtype=str),
+                 cell_number=df["cell_number"].to_numpy(dtype=np.int32),
+                 cell_row=df["cell_row"].to_numpy(dtype=np.int32),
+                 cell_col=df["cell_col"].to_numpy(dtype=np.int32),
+                 label=df["label"].to_numpy(dtype=np.int8),
+                 features=features)
+        return npz_path
+    if binary == "parquet":
+        parquet_path = stem + ".parquet"
+        df.to_parquet(parquet_path, index=False)
+        return parquet_path
+    raise ValueError(f"Unknown binary label format: {binary}")
+
+
+def read_label_table_npz(npz_path: str) -> pd.DataFrame:
+    """Load a table written by write_label_table(..., binary="npz")."""
+    with np.load(npz_path) as data:
+        features = data["features"]
+        columns = label_columns(features.shape[1])
+        table = {name: data[name] for name in columns[:5]}
+        table.update(zip(columns[5:], features.T))
+    return pd.DataFrame(table, columns=columns)
@@ -0,0 +1,173 @@
+"""
+Content-addressed manifest of input frames and the outputs each stage made from them.
+
+The manifest is a small SQLite database. ``scan`` keeps a (size, mtime,
+content hash) record per frame and only re-hashes files whose size or mtime
+changed. A directory whose own mtime is unchanged is not listed again (no
+file was added or removed), but its known frames are still stat'ed, so a
+frame rewritten in place is noticed. Stages then compare a per-frame
+signature against what they recorded last time to find the frames that
+need (re)processing.
+
+Paths are stored absolute, whatever form a stage passes them in, so
+stages that address the frame folders differently (relative to the
+working directory, or to the script) share one record per frame.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file (blake2b, 128 bit, hex)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Manifest:
+    """
+    Persistent frame/output manifest.
+
+    Args:
+        db_path: SQLite file (created if missing)
+    """
+
+    def __init__(self, db_path: str):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY, mtime_ns INTEGER);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, dir TEXT, size INTEGER, mtime_ns INTEGER, hash TEXT);
+            CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+            CREATE TABLE IF NOT EXISTS outputs (
+                stage TEXT, path TEXT, dir TEXT, signature TEXT, outputs TEXT,
+                PRIMARY KEY (stage, path));
+            CREATE INDEX IF NOT EXISTS outputs_dir ON outputs (stage, dir);
+        """)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._absolutize()
+
+    def _absolutize(self) -> None:
+        """Make paths stored relative by older versions absolute (they were relative to the working dir)."""
+        for table, column in (("dirs", "path"), ("files", "path"), ("files", "dir"),
+                              ("outputs", "path"), ("outputs", "dir")):
+            for (path,) in self.db.execute(f"SELECT DISTINCT {column} FROM {table}").fetchall():
+                if not os.path.isabs(path):
+                    self.db.execute(f"UPDATE OR REPLACE {table} SET {column} = ? WHERE {column} = ?",
+                                    (os.path.abspath(path), path))
+        self.db.execute("PRAGMA user_version = 1")
+        self.db.commit()
+
+    def scan(self, dir_path: str, exts=IMAGE_EXTS, rescan: bool = False) -> dict:
+        """
+        Current frames of a directory with their content hashes.
+
+        The directory is only listed if its mtime changed (a file was added,
+        removed or renamed); otherwise the frames it had last time are
+        stat'ed. Either way a frame is only re-hashed if its size or mtime
+        changed.
+
+        Args:
+            dir_path: Directory to scan (not recursive)
+            exts: File extensions to include (lower case)
+            rescan: List the directory even if its mtime is unchanged (for
+                file systems with coarse directory timestamps)
+
+        Returns:
+            Dict absolute path -> content hash, in file name order
+        """
+        dir_path = os.path.abspath(dir_path)
+        dir_mtime = os.stat(dir_path).st_mtime_ns
+        row = self.db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (dir_path,)).fetchone()
+        known = {path: (size, mtime_ns, h) for path, size, mtime_ns, h in self.db.execute(
+            "SELECT path, size, mtime_ns, hash FROM files WHERE dir = ?", (dir_path,))}
+
+        if not rescan and row is not None and row[0] == dir_mtime:
+            stats = {}
+            for path in known:
+                try:
+                    stats[path] = os.stat(path)
+                except FileNotFoundError:
+                    pass
+        else:
+            with os.scandir(dir_path) as entries:
+                stats = {entry.path: entry.stat() for entry in entries
+                         if entry.name.lower().endswith(exts) and entry.is_file()}
+
+        current = {}
+        updates = []
+        for path, st in stats.items():
+            prev = known.get(path)
+            if prev is not None and prev[0] == st.st_size and prev[1] == st.st_mtime_ns:
+                current[path] = prev[2]
+                continue
+            h = file_hash(path)
+            current[path] = h
+            updates.append((path, dir_path, st.st_size, st.st_mtime_ns, h))
+
+        gone = [(path,) for path in known if path not in current]
+        if updates or gone or row is None or row[0] != dir_mtime:
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", updates)
+            self.db.executemany("DELETE FROM files WHERE path = ?", gone)
+            self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (dir_path, dir_mtime))
+            self.db.commit()
+        return dict(sorted(current.items()))
+
+    def recorded(self, stage: str, dir_path: str) -> dict:
+        """Signatures a stage recorded for the frames of a directory (absolute path -> signature)."""
+        return dict(self.db.execute("SELECT path, signature FROM outputs WHERE stage = ? AND dir = ?",
+                                    (stage, os.path.abspath(dir_path))))
+
+    def outputs(self, stage: str, path: str) -> list:
+        """Outputs a stage recorded for a frame (empty if none)."""
+        row = self.db.execute("SELECT outputs FROM outputs WHERE stage = ? AND path = ?",
+                              (stage, os.path.abspath(path))).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def record(self, stage: str, path: str, signature: str, outputs=()) -> None:
+        """Record that ``stage`` processed frame ``path`` (at ``signature``) into ``outputs``."""
+        path = os.path.abspath(path)
+        self.db.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)",
+                        (stage, path, os.path.dirname(path), signature, json.dumps(list(outputs))))
+
+    def forget(self, stage: str, paths) -> None:
+        """Drop a stage's records for frames that no longer exist."""
+        self.db.executemany("DELETE FROM outputs WHERE stage = ? AND path = ?",
+                            [(stage, os.path.abspath(path)) for path in paths])
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def diff(current: dict, recorded: dict) -> tuple:
+    """
+    Compare current signatures with recorded ones.
+
+    Returns:
+        (pending, removed): paths that are new or changed (in ``current``
+        order), and recorded paths that no longer exist
+    """
+    pending = [path for path, sig in current.items() if recorded.get(path) != sig]
+    removed = [path for path in recorded if path not in current]
+    return pending, removed
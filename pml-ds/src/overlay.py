@@ -0,0 +1,142 @@
+"""
+Numbered grid overlay, rendered once per grid configuration and reused.
+
+The overlay (semi-transparent yellow grid lines + black cell numbers) is the
+same for every frame of a given size, so it is drawn with PIL once, reduced
+to the pixels it actually covers, and stored premultiplied. Applying it is a
+single vectorized blend over those pixels.
+"""
+
+import os
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Try common font paths for different operating systems
+FONT_PATHS = [
+    "Arial.ttf",  # Current directory
+    "/System/Library/Fonts/Helvetica.ttc",  # macOS
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",  # Linux
+    "C:/Windows/Fonts/arial.ttf",  # Windows
+    "C:/Windows/Fonts/Arial.ttf",  # Windows (alternative)
+]
+
+
+@lru_cache(maxsize=None)
+def load_font(size: int = 16):
+    """Load the numbering font (cross-platform), falling back to PIL's default."""
+    for font_path in FONT_PATHS:
+        try:
+            if os.path.exists(font_path):
+                return ImageFont.truetype(font_path, size)
+        except OSError:
+            continue
+
+    # Fallback to default font if no font found
+    try:
+        return ImageFont.truetype("arial.ttf", size)  # Try lowercase
+    except OSError:
+        return ImageFont.load_default()
+
+
+class GridOverlay:
+    """
+    Premultiplied overlay restricted to the pixels it covers.
+
+    Attributes:
+        size: Frame (width, height) the overlay was rendered for
+        index: Flat pixel indices (y * width + x) with non-zero alpha
+        alpha: Overlay alpha at those pixels, (n, 1) uint16
+        premult: Overlay colour * alpha at those pixels, (n, 3) uint16
+    """
+
+    def __init__(self, rgba: np.ndarray):
+        h, w = rgba.shape[:2]
+        self.size = (w, h)
+        flat = rgba.reshape(-1, 4)
+        self.index = np.flatnonzero(flat[:, 3])
+        self.alpha = flat[self.index, 3:4].astype(np.uint16)
+        self.premult = flat[self.index, :3].astype(np.uint16) * self.alpha
+
+    def apply(self, frames: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Alpha-composite the overlay onto one frame (H, W, 3) or a batch (N, H, W, 3).
+
+        Args:
+            frames: uint8 RGB frame(s) of the overlay's size
+            out: Optional output array (may be ``frames`` itself to blend in place)
+
+        Returns:
+            Blended uint8 RGB frame(s)
+        """
+        if frames.shape[-3:-1] != (self.size[1], self.size[0]):
+            raise ValueError(f"Overlay is {self.size[0]}x{self.size[1]}, "
+                             f"frame is {frames.shape[-2]}x{frames.shape[-3]}")
+        if out is None:
+            out = frames.copy()
+        elif out is not frames:
+            np.copyto(out, frames)
+        flat = out.reshape(out.shape[:-3] + (-1, 3))
+        dst = flat[..., self.index, :].astype(np.uint16)
+        # Integer "over" with rounding; dst is opaque, so out alpha stays 255
+        blended = (self.premult + dst * (255 - self.alpha) + 127) // 255
+        flat[..., self.index, :] = blended.astype(np.uint8)
+        return out
+
+
+def render_grid_overlay(size: tuple, cols: int = 8, rows: int = 8, font=None) -> np.ndarray:
+    """
+    Draw the numbered grid overlay with PIL.
+
+    Args:
+        size: Frame (width, height)
+        cols: Number of columns in the grid (default: 8)
+        rows: Number of rows in the grid (default: 8)
+        font: PIL font for the numbers (default: load_font())
+
+    Returns:
+        RGBA overlay as numpy array (height, width, 4), uint8
+    """
+    img_w, img_h = size
+    tile_w, tile_h = img_w // cols, img_h // rows
+    if font is None:
+        font = load_font()
+    overlay = Image.new("RGBA", size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    # Semi-transparent yellow grid lines
+    for r in range(1, rows):
+        y = r * tile_h
+        draw.line([(0, y), (img_w, y)], fill=(255, 255, 0, 160), width=2)
+    for c in range(1, cols):
+        x = c * tile_w
+        draw.line([(x, 0), (x, img_h)], fill=(255, 255, 0, 160), width=2)
+
+    # Black cell numbers (1..cols*rows)
+    tile_index = 1
+    for r in range(rows):
+        for c in range(cols):
+            text = str(tile_index)
+            text_x = c * tile_w + tile_w / 2 - 8
+            text_y = r * tile_h + tile_h / 2 - 8
+            draw.text((text_x, text_y), text, fill=(0, 0, 0, 255), font=font)
+            tile_index += 1
+
+    return np.asarray(overlay)
+
+
+@lru_cache(maxsize=16)
+def grid_overlay(size: tuple, cols: int = 8, rows: int = 8, font_size: int = 16) -> GridOverlay:
+    """
+    Cached overlay for a grid configuration, keyed by (size, cols, rows, font size).
+
+    Args:
+        size: Frame (width, height)
+        cols: Number of columns in the grid (default: 8)
+        rows: Number of rows in the grid (default: 8)
+        font_size: Size of the numbering font (default: 16)
+
+    Returns:
+        GridOverlay ready to apply to frames of that size
+    """
+    return GridOverlay(render_grid_overlay(tuple(size), cols, rows, load_font(font_size)))
@@ -0,0 +1,280 @@
+"""
+In-process pipeline of stages connected by bounded queues.
+
+Each stage runs in its own thread(s) and takes items from a bounded queue
+fed by the stage it depends on, so while one stage works on frame N the
+stage before it already produces frame N+1: end-to-end time approaches
+that of the slowest stage instead of the sum of all of them, and a slow
+stage blocks its producers instead of letting frames pile up in memory.
+
+Stages form a DAG: every stage consumes the items of the source or of one
+earlier stage, and each result goes to all stages that consume it. With a
+``Checkpoint``, the result of a stage is stored per item as soon as it
+completes. On the next run, stored results are passed on without running
+the stage again, and items whose stages are all done are dropped right
+after the source.
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+
+from src import instrument
+
+QUEUE_SIZE = 8  # Items waiting in front of each stage
+
+_END = object()
+
+
+class Checkpoint:
+    """
+    Persistent per-item stage results.
+
+    Only which stages are done for which items is held in memory; results
+    are read back per item, and ``complete`` drops the results an item no
+    longer needs (it stays done), so the file does not grow with every
+    item's payload.
+
+    Args:
+        db_path: SQLite file (created if missing)
+        run: Run id; results of different runs are kept apart
+    """
+
+    def __init__(self, db_path: str, run: str):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # Stage threads share the connection; every access holds the lock
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS results (
+                run TEXT, key TEXT, stage TEXT, result TEXT,
+                PRIMARY KEY (run, key, stage));
+        """)
+        self.run = run
+        self._lock = threading.Lock()
+        self._done = set(self.db.execute("SELECT key, stage FROM results WHERE run = ?", (run,)))
+
+    def has(self, key: str, stage: str) -> bool:
+        return (key, stage) in self._done
+
+    def get(self, key: str, stage: str, default=None):
+        """Stored result of ``stage`` for ``key`` (``default`` if not done or dropped)."""
+        with self._lock:
+            row = self.db.execute("SELECT result FROM results WHERE run = ? AND key = ? AND stage = ?",
+                                  (self.run, key, stage)).fetchone()
+        return default if row is None or row[0] is None else json.loads(row[0])
+
+    def done(self, key: str, stage: str, result=None) -> None:
+        """Store the result of ``stage`` for ``key`` (JSON serializable), committed at once."""
+        with self._lock:
+            self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                            (self.run, key, stage, json.dumps(result)))
+            self.db.commit()
+            self._done.add((key, stage))
+
+    def complete(self, keys, stage: str, drop=()) -> None:
+        """Mark ``stage`` done for ``keys`` and drop their stored ``drop`` stage results, in one commit."""
+        keys = list(keys)
+        with self._lock:
+            self.db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, NULL)",
+                                [(self.run, key, stage) for key in keys])
+            self.db.executemany("UPDATE results SET result = NULL WHERE run = ? AND key = ? AND stage = ?",
+                                [(self.run, key, s) for key in keys for s in drop])
+            self.db.commit()
+            self._done.update((key, stage) for key in keys)
+
+    def keys(self, stage: str) -> set:
+        """Keys of every item ``stage`` is done for."""
+        with self._lock:
+            return {key for key, s in self._done if s == stage}
+
+    def results(self, stage: str, keys) -> dict:
+        """key -> stored result of ``stage``, for those of ``keys`` it is done for."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):  # Stay under SQLite's bound parameter limit
+                batch = keys[start:start + 500]
+                found.update((key, json.loads(result)) for key, result in self.db.execute(
+                    f"SELECT key, result FROM results WHERE run = ? AND stage = ? AND result IS NOT NULL "
+                    f"AND key IN ({','.join('?' * len(batch))})", [self.run, stage] + batch))
+        return found
+
+    def clear(self) -> None:
+        """Forget every result of this run."""
+        with self._lock:
+            self.db.execute("DELETE FROM results WHERE run = ?", (self.run,))
+            self.db.commit()
+            self._done.clear()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Stage:
+    def __init__(self, name, fn, after, workers, checkpoint):
+        self.name = name
+        self.fn = fn
+        self.after = after
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.consumers = []
+        self.queue = None
+        self.running = 0
+        self.items = 0
+        self.busy = 0.0
+
+
+class Pipeline:
+    """
+    Stages run in threads, connected by bounded queues.
+
+    Args:
+        checkpoint: Optional Checkpoint storing each stage's result per item
+        queue_size: Items that may wait in front of each stage
+    """
+
+    def __init__(self, checkpoint: Checkpoint = None, queue_size: int = QUEUE_SIZE):
+        self.checkpoint = checkpoint
+        self.queue_size = queue_size
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._error = None
+
+    def add(self, name: str, fn, after: str = None, workers: int = 1, checkpoint: bool = True) -> None:
+        """
+        Add a stage.
+
+        Args:
+            name: Stage name (also its checkpoint and profiling span name)
+            fn: ``fn(key, item)``; its return value goes to the stages
+                consuming this one (None: the item stops here)
+            after: Stage whose results this stage consumes (None: the source)
+            workers: Threads running ``fn``; with more than one, items may
+                reach the next stage out of order
+            checkpoint: Store results in the pipeline's Checkpoint (they must
+                be JSON serializable)
+        """
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        if after is not None and after not in self.stages:
+            raise ValueError(f"Stage {name} depends on unknown stage {after}")
+        self.stages[name] = _Stage(name, fn, after, max(1, workers), checkpoint)
+
+    def pending(self, key: str) -> bool:
+        """True unless every checkpointed stage is done for ``key``."""
+        if self.checkpoint is None:
+            return True
+        return not all(self.checkpoint.has(key, stage.name)
+                       for stage in self.stages.values() if stage.checkpoint)
+
+    def run(self, source) -> dict:
+        """
+        Feed ``(key, item)`` pairs from ``source`` through the stages.
+
+        Returns when every stage has drained. If a stage raises, no new items
+        are started, the items already queued are dropped and the first
+        error is raised once all threads have stopped (results stored so far
+        are kept, so the next run resumes).
+
+        Returns:
+            Stage name -> (items run, busy seconds per worker thread);
+            "source" has the time spent waiting for the source
+        """
+        roots = []
+        for stage in self.stages.values():
+            stage.queue = queue.Queue(maxsize=self.queue_size)
+            stage.consumers = []
+            stage.running = stage.workers
+            stage.items, stage.busy = 0, 0.0
+        for stage in self.stages.values():
+            (self.stages[stage.after].consumers if stage.after else roots).append(stage)
+        self._error = None
+
+        threads = [threading.Thread(target=self._work, args=(stage,), name=f"stage-{stage.name}", daemon=True)
+                   for stage in self.stages.values() for _ in range(stage.workers)]
+        for thread in threads:
+            thread.start()
+
+        fed, waited = 0, 0.0
+        try:
+            it = iter(source)
+            while self._error is None:
+                start = time.perf_counter()
+                try:
+                    key, item = next(it)
+                except StopIteration:
+                    break
+                finally:
+                    waited += time.perf_counter() - start
+                if not self.pending(key):
+                    continue
+                for stage in roots:
+                    stage.queue.put((key, item))
+                fed += 1
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            for stage in roots:
+                for _ in range(stage.workers):
+                    stage.queue.put(_END)
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+        stats = {"source": (fed, waited)}
+        stats.update((stage.name, (stage.items, stage.busy / stage.workers)) for stage in self.stages.values())
+        return stats
+
+    def _fail(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+
+    def _work(self, stage):
+        checkpoint = self.checkpoint if stage.checkpoint else None
+        while True:
+            entry = stage.queue.get()
+            if entry is _END:
+                break
+            if self._error is not None:
+                continue  # Drain, so producers never block on a full queue
+            key, item = entry
+            try:
+                if checkpoint is not None and checkpoint.has(key, stage.name):
+                    result = checkpoint.get(key, stage.name)
+                else:
+                    start = time.perf_counter()
+                    with instrument.span(stage.name, items=1):
+                        result = stage.fn(key, item)
+                    if checkpoint is not None:
+                        checkpoint.done(key, stage.name, result)
+                    with self._lock:
+                        stage.items += 1
+                        stage.busy += time.perf_counter() - start
+                if result is not None:
+                    for consumer in stage.consumers:
+                        consumer.queue.put((key, result))
+            except BaseException as e:
+                self._fail(e)
+
+        # The last worker of a stage ends its consumers' input
+        with self._lock:
+            stage.running -= 1
+            last = stage.running == 0
+        if last:
+            for consumer in stage.consumers:
+                for _ in range(consumer.workers):
+                    consumer.queue.put(_END)
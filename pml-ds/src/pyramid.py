@@ -0,0 +1,128 @@
+"""
+Grid levels ("4x4", "8x8", "16x16", ...) and label conversion between them.
+
+Tiles of several grid levels are cut from the same decoded frame by the
+tiling stage; labels are only made on one (the base) level and derived for
+the others. Going to a coarser level aggregates the fine cells covered by
+each coarse cell, going to a finer level copies each coarse label to the
+fine cells inside it. Levels must nest: the finer grid's columns and rows
+must be multiples of the coarser grid's.
+"""
+
+import os
+import numpy as np
+
+
+def parse_levels(spec: str) -> list:
+    """
+    Parse a level list such as "4x4,16x16" into [(cols, rows), ...].
+
+    Args:
+        spec: Comma-separated "{cols}x{rows}" entries (a single number means square)
+
+    Returns:
+        List of (cols, rows) tuples, in the given order, without duplicates
+    """
+    levels = []
+    for item in spec.split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        cols, _, rows = item.partition("x")
+        level = (int(cols), int(rows or cols))
+        if level[0] <= 0 or level[1] <= 0:
+            raise ValueError(f"Invalid grid level: {item}")
+        if level not in levels:
+            levels.append(level)
+    return levels
+
+
+def level_name(level: tuple) -> str:
+    """(16, 16) -> "16x16"."""
+    return f"{level[0]}x{level[1]}"
+
+
+def level_dir(tiles_base_dir: str, level: tuple) -> str:
+    """Output directory of an extra grid level, e.g. frames_dataset_tiles/grid_16x16."""
+    return os.path.join(tiles_base_dir, f"grid_{level_name(level)}")
+
+
+def tile_number_width(level: tuple) -> int:
+    """Digits of the tile number in tile file names (at least 2, as for 8x8)."""
+    return max(2, len(str(level[0] * level[1])))
+
+
+def nests(a: tuple, b: tuple) -> bool:
+    """True if labels can be derived between levels ``a`` and ``b`` (one refines the other)."""
+    fine, coarse = (a, b) if a[0] >= b[0] else (b, a)
+    return fine[1] >= coarse[1] and fine[0] % coarse[0] == 0 and fine[1] % coarse[1] == 0
+
+
+def _factors(fine: tuple, coarse: tuple) -> tuple:
+    if not nests(fine, coarse) or fine[0] < coarse[0]:
+        raise ValueError(f"Grid levels {level_name(fine)} and {level_name(coarse)} do not nest")
+    return fine[0] // coarse[0], fine[1] // coarse[1]
+
+
+def aggregate_labels(labels: np.ndarray, fine: tuple, coarse: tuple, reduce: str = "any") -> np.ndarray:
+    """
+    Labels of a coarser level from the labels of a finer one.
+
+    Args:
+        labels: (F, fine_cols * fine_rows) labels, indexed by cell_number - 1
+        fine: (cols, rows) of ``labels``
+        coarse: Target (cols, rows)
+        reduce: How the fine cells of a coarse cell are combined:
+            "any" - most frequent non-zero label (smallest code on ties), 0 if none
+            "majority" - most frequent label, zeros included
+            "max" - largest code
+
+    Returns:
+        (F, coarse_cols * coarse_rows) labels, same dtype
+    """
+    fx, fy = _factors(fine, coarse)
+    labels = np.asarray(labels)
+    num_frames = labels.shape[0]
+    # (F, rows, cols) -> (F, coarse_rows, coarse_cols, fy * fx)
+    blocks = labels.reshape(num_frames, coarse[1], fy, coarse[0], fx) \
+        .transpose(0, 1, 3, 2, 4).reshape(num_frames, coarse[1], coarse[0], fy * fx)
+    if reduce == "max":
+        out = blocks.max(axis=-1)
+    elif reduce in ("any", "majority"):
+        num_codes = int(labels.max(initial=0)) + 1
+        counts = np.stack([(blocks == code).sum(axis=-1) for code in range(num_codes)], axis=-1)
+        if reduce == "any" and num_codes > 1:
+            nonzero = counts[..., 1:]
+            out = np.where(nonzero.max(axis=-1) > 0, nonzero.argmax(axis=-1) + 1, 0)
+        else:
+            out = counts.argmax(axis=-1)
+    else:
+        raise ValueError(f"Unknown label reduction: {reduce}")
+    return out.reshape(num_frames, coarse[0] * coarse[1]).astype(labels.dtype)
+
+
+def expand_labels(labels: np.ndarray, coarse: tuple, fine: tuple) -> np.ndarray:
+    """
+    Labels of a finer level: every fine cell takes the label of the coarse cell containing it.
+
+    Args:
+        labels: (F, coarse_cols * coarse_rows) labels, indexed by cell_number - 1
+        coarse: (cols, rows) of ``labels``
+        fine: Target (cols, rows)
+
+    Returns:
+        (F, fine_cols * fine_rows) labels, same dtype
+    """
+    fx, fy = _factors(fine, coarse)
+    labels = np.asarray(labels)
+    grid = labels.reshape(labels.shape[0], coarse[1], coarse[0])
+    return np.repeat(np.repeat(grid, fy, axis=1), fx, axis=2).reshape(labels.shape[0], fine[0] * fine[1])
+
+
+def derive_labels(labels: np.ndarray, src: tuple, dst: tuple, reduce: str = "any") -> np.ndarray:
+    """Labels of level ``dst`` from labels of level ``src`` (aggregated or expanded as needed)."""
+    if tuple(src) == tuple(dst):
+        return np.asarray(labels)
+    if dst[0] <= src[0] and dst[1] <= src[1]:
+        return aggregate_labels(labels, src, dst, reduce)
+    return expand_labels(labels, src, dst)
@@ -0,0 +1,118 @@
+"""
+Content-addressed tile storage: every distinct tile is stored once.
+
+Broadcast footage repeats many tiles pixel for pixel (scoreboards, letterbox
+bars, static crowd or sky). With blob storage a tile is hashed from its raw
+pixels before it is encoded; a tile seen before is not encoded or written
+again, and its tiles_info row simply points at the existing blob file:
+
+    frames_dataset_tiles/tile_blobs/{digest[:2]}/{digest}.png
+
+Only exact (pixel-identical) matches are shared. Blobs are written
+atomically, so a file that exists is always complete; the set of existing
+digests is the exact-match index (listed once per process, then O(1)
+lookups). A blob handed out for writing only joins the index once its
+writer reports success (``settle``); until then later identical tiles
+share the pending write, and go down with it if it fails.
+"""
+
+import os
+import hashlib
+import numpy as np
+
+BLOB_DIR = "tile_blobs"
+
+
+def tile_digest(tile: np.ndarray) -> str:
+    """Content hash of a tile's pixels and shape (blake2b, 128 bit, hex)."""
+    tile = np.ascontiguousarray(tile)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((tile.shape, tile.dtype.str)).encode())
+    h.update(tile.data)
+    return h.hexdigest()
+
+
+class BlobIndex:
+    """
+    Exact-match index of the blobs in a directory.
+
+    Tiles are added on behalf of an owner (the frame whose files are being
+    written). Blobs handed out for writing stay pending until ``settle()``
+    is told which owners failed to write their files.
+
+    Args:
+        blob_dir: Blob directory (e.g. frames_dataset_tiles/tile_blobs)
+        ext: Blob file extension, which fixes the encoding (".png" or ".npy")
+    """
+
+    def __init__(self, blob_dir: str, ext: str = ".png"):
+        self.blob_dir = blob_dir
+        self.ext = ext
+        self.added = 0
+        self.reused = 0
+        self._known = set()
+        self._pending = {}  # digest -> owner that writes the blob
+        self._uses = {}     # owner -> pending digests its tiles point at
+        if os.path.isdir(blob_dir):
+            for sub in os.scandir(blob_dir):
+                if sub.is_dir():
+                    self._known.update(name[:-len(ext)] for name in os.listdir(sub.path)
+                                       if name.endswith(ext))
+
+    def __len__(self):
+        return len(self._known)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest + self.ext)
+
+    def add(self, tile: np.ndarray, owner=None) -> tuple:
+        """
+        Look a tile up by content.
+
+        Returns:
+            (blob path, new): new is True if the blob does not exist yet and
+            the caller (``owner``) must write ``tile`` to the path
+        """
+        digest = tile_digest(tile)
+        path = self.path(digest)
+        if digest in self._known:
+            self.reused += 1
+            return path, False
+        self._uses.setdefault(owner, set()).add(digest)
+        if digest in self._pending:
+            self.reused += 1
+            return path, False
+        self._pending[digest] = owner
+        self.added += 1
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path, True
+
+    def settle(self, failed=()) -> set:
+        """
+        Close the pending writes once their writer is done.
+
+        Blobs of owners that wrote their files join the index; those of
+        ``failed`` owners are dropped.
+
+        Returns:
+            Owners whose tiles point at a blob that was not written
+            (the failed ones and any that reused their blobs)
+        """
+        failed = set(failed)
+        lost = set()
+        for digest, owner in self._pending.items():
+            if owner in failed:
+                lost.add(digest)
+            else:
+                self._known.add(digest)
+        self.added -= len(lost)
+        broken = {owner for owner, digests in self._uses.items() if digests & lost}
+        self._pending.clear()
+        self._uses.clear()
+        return broken
+
+    def rollback(self) -> None:
+        """Drop the pending writes (e.g. of a run that was interrupted before settle())."""
+        self.added -= len(self._pending)
+        self._pending.clear()
+        self._uses.clear()
@@ -0,0 +1,236 @@
+"""
+Compact per-tile descriptors for the c1..c64 columns of the label tables.
+
+Every tile of a frame gets NUM_FEATURES (64) float values in [0, 1]:
+
+    0-2    mean R, G, B
+    3-5    std R, G, B
+    6-29   8-bin histogram of R, G and B (share of the tile's pixels)
+    30-37  8-bin hue histogram of chromatic pixels (saturation >= SAT_MIN)
+    38     edge density (share of Canny edge pixels)
+    39     mean gradient magnitude (Sobel)
+    40-47  8-bin gradient orientation histogram, magnitude weighted
+    48-63  4x4 luminance thumbnail
+
+Pixel maps (gray, HSV, gradients, edges) are computed once per frame and
+every statistic is taken over the whole grid at once: the maps are cut
+into tiles with a reshape (see split_images_into_grid) and histograms are
+one bincount over (tile, bin) pairs. Values are rounded to
+FEATURE_DECIMALS so the CSV stays compact.
+
+``FeatureCache`` keeps the descriptors of every frame by content hash, so
+a frame whose pixels did not change is never decoded again for them.
+"""
+
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+from src.grid_split import split_images_into_grid
+from src.utils import read_image
+from src import instrument
+
+NUM_FEATURES = 64
+FEATURE_VERSION = 2        # Bump when the descriptor layout or math (or the frame resize) changes
+FEATURE_DECIMALS = 4
+COLOR_BINS = 8
+HUE_BINS = 8
+ORIENT_BINS = 8
+THUMB_SIZE = 4             # Luminance thumbnail side
+SAT_MIN = 32               # Minimum saturation (0-255) for a pixel to count in the hue histogram
+CANNY_THRESHOLDS = (100, 200)
+CHUNK_FRAMES = 8           # Frames per worker task
+
+FEATURE_NAMES = (
+    ["mean_r", "mean_g", "mean_b", "std_r", "std_g", "std_b"]
+    + [f"hist_{ch}{i}" for ch in "rgb" for i in range(COLOR_BINS)]
+    + [f"hue{i}" for i in range(HUE_BINS)]
+    + ["edge_density", "grad_mean"]
+    + [f"orient{i}" for i in range(ORIENT_BINS)]
+    + [f"luma{r}{c}" for r in range(THUMB_SIZE) for c in range(THUMB_SIZE)]
+)
+assert len(FEATURE_NAMES) == NUM_FEATURES
+
+_SOBEL_MAX = 4 * 255 * np.sqrt(2)  # Largest 3x3 Sobel gradient magnitude of 8-bit pixels
+
+
+def _grid(maps: np.ndarray, cols: int, rows: int) -> np.ndarray:
+    """(N, H, W[, C]) per-pixel maps -> (N * rows * cols, tile pixels, C), same dtype."""
+    if maps.ndim == 3:
+        maps = maps[..., np.newaxis]
+    tiles = split_images_into_grid(maps, cols, rows, copy=True)
+    n, _, _, tile_h, tile_w, ch = tiles.shape
+    return tiles.reshape(n * rows * cols, tile_h * tile_w, ch)
+
+
+def _histogram(bins: np.ndarray, num_bins: int, weights: np.ndarray = None) -> np.ndarray:
+    """Per-tile histograms of (tiles, pixels) bin indices in one bincount."""
+    num_tiles = bins.shape[0]
+    flat = (np.arange(num_tiles)[:, np.newaxis] * num_bins + bins).ravel()
+    counts = np.bincount(flat, weights=None if weights is None else weights.ravel(),
+                         minlength=num_tiles * num_bins)
+    return counts.reshape(num_tiles, num_bins)
+
+
+def grid_features(frames: np.ndarray, cols: int = 8, rows: int = 8) -> np.ndarray:
+    """
+    Descriptors of every tile of a stack of frames.
+
+    Args:
+        frames: RGB uint8 frames (N, H, W, 3), or a single frame (H, W, 3)
+        cols: Number of columns in the grid (default: 8)
+        rows: Number of rows in the grid (default: 8)
+
+    Returns:
+        float32 array (N, cols*rows, NUM_FEATURES), tiles in tile_index
+        order; (cols*rows, NUM_FEATURES) for a single frame
+    """
+    frames = np.asarray(frames)
+    single = frames.ndim == 3
+    if single:
+        frames = frames[np.newaxis]
+    n = len(frames)
+    num_tiles = n * cols * rows
+
+    # Whole-frame pixel maps (OpenCV works on one 2D image at a time)
+    gray = np.stack([cv2.cvtColor(f, cv2.COLOR_RGB2GRAY) for f in frames])
+    hsv = np.stack([cv2.cvtColor(f, cv2.COLOR_RGB2HSV) for f in frames])
+    edges = np.stack([cv2.Canny(g, *CANNY_THRESHOLDS) for g in gray])
+    gx = np.stack([cv2.Sobel(g, cv2.CV_32F, 1, 0, ksize=3) for g in gray])
+    gy = np.stack([cv2.Sobel(g, cv2.CV_32F, 0, 1, ksize=3) for g in gray])
+    magnitude = np.sqrt(gx * gx + gy * gy) / _SOBEL_MAX
+    orientation = np.arctan2(gy, gx) % np.pi  # Unsigned: 0..pi
+    thumbs = np.stack([cv2.resize(g[:g.shape[0] // rows * rows, :g.shape[1] // cols * cols],
+                                  (cols * THUMB_SIZE, rows * THUMB_SIZE), interpolation=cv2.INTER_AREA)
+                       for g in gray])
+
+    rgb = _grid(frames, cols, rows)                      # (tiles, pixels, 3) uint8
+    pixels = rgb.shape[1]
+    values = rgb.astype(np.float32) / 255
+    color_bins = (rgb >> (8 - int(np.log2(COLOR_BINS)))).astype(np.int64)
+    color_hist = np.concatenate([_histogram(color_bins[..., ch], COLOR_BINS) for ch in range(3)], axis=1)
+
+    hsv = _grid(hsv, cols, rows)
+    hue_bins = np.minimum(hsv[..., 0].astype(np.int64) * HUE_BINS // 180, HUE_BINS - 1)
+    hue_hist = _histogram(hue_bins, HUE_BINS, weights=(hsv[..., 1] >= SAT_MIN).astype(np.float64))
+
+    magnitude = _grid(magnitude, cols, rows)[..., 0]
+    orient_bins = np.minimum((_grid(orientation, cols, rows)[..., 0] * (ORIENT_BINS / np.pi)).astype(np.int64),
+                             ORIENT_BINS - 1)
+    orient_hist = _histogram(orient_bins, ORIENT_BINS, weights=magnitude.astype(np.float64))
+    orient_hist /= np.maximum(orient_hist.sum(axis=1, keepdims=True), 1e-12)
+
+    thumbs = _grid(thumbs, cols, rows)[..., 0]           # (tiles, THUMB_SIZE**2)
+
+    features = np.concatenate([
+        values.mean(axis=1),
+        values.std(axis=1),
+        color_hist / pixels,
+        hue_hist / pixels,
+        (_grid(edges, cols, rows)[..., 0] > 0).mean(axis=1, keepdims=True),
+        magnitude.mean(axis=1, keepdims=True),
+        orient_hist,
+        thumbs / 255,
+    ], axis=1).astype(np.float32)
+    features = np.round(features, FEATURE_DECIMALS).reshape(n, num_tiles // n, NUM_FEATURES)
+    return features[0] if single else features
+
+
+def frame_features(img_path: str, size: tuple, cols: int = 8, rows: int = 8) -> np.ndarray:
+    """Decode a frame (resized to ``size``, as for tiling) and return its grid_features()."""
+    return grid_features(read_image(img_path, "rgb", size), cols, rows)
+
+
+def _features_chunk(img_paths, size, cols, rows) -> list:
+    return [frame_features(path, size, cols, rows) for path in img_paths]
+
+
+class FeatureCache:
+    """
+    Tile descriptors of frames, by frame content hash.
+
+    Entries are keyed by hash, grid ("8x8") and FEATURE_VERSION, so a
+    layout change never returns stale values. Worker processes may write
+    to the same cache.
+
+    Args:
+        db_path: SQLite file (created if missing)
+    """
+
+    def __init__(self, db_path: str):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db = sqlite3.connect(db_path, timeout=60)
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS features (
+                hash TEXT, grid TEXT, version INTEGER, data BLOB,
+                PRIMARY KEY (hash, grid, version));
+        """)
+
+    def get(self, frame_hashes, cols: int = 8, rows: int = 8) -> dict:
+        """Cached descriptors (cols*rows, NUM_FEATURES) of the given hashes (missing ones are left out)."""
+        grid = f"{cols}x{rows}"
+        found = {}
+        for frame_hash in set(frame_hashes):
+            row = self.db.execute("SELECT data FROM features WHERE hash = ? AND grid = ? AND version = ?",
+                                  (frame_hash, grid, FEATURE_VERSION)).fetchone()
+            if row is not None:
+                found[frame_hash] = np.frombuffer(row[0], dtype=np.float32).reshape(cols * rows, NUM_FEATURES)
+        return found
+
+    def put(self, items, cols: int = 8, rows: int = 8) -> None:
+        """Store (hash, descriptors) pairs."""
+        grid = f"{cols}x{rows}"
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)",
+                                [(frame_hash, grid, FEATURE_VERSION, np.asarray(f, dtype=np.float32).tobytes())
+                                 for frame_hash, f in items])
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compute_features(frame_hashes: dict, cache: FeatureCache, size: tuple, cols: int = 8, rows: int = 8,
+                     workers: int = 1, chunk_frames: int = CHUNK_FRAMES) -> dict:
+    """
+    Descriptors of many frames, computing only those not in the cache.
+
+    Args:
+        frame_hashes: Frame path -> content hash (e.g. Manifest.scan())
+        cache: FeatureCache; new results are added to it
+        size: (width, height) frames are resized to before tiling
+        cols: Number of columns in the grid (default: 8)
+        rows: Number of rows in the grid (default: 8)
+        workers: Processes decoding and computing (1 = in-process)
+        chunk_frames: Frames per worker task
+
+    Returns:
+        Dict frame path -> float32 (cols*rows, NUM_FEATURES)
+    """
+    cached = cache.get(frame_hashes.values(), cols, rows)
+    missing = [path for path, frame_hash in frame_hashes.items() if frame_hash not in cached]
+    chunks = [missing[i:i + chunk_frames] for i in range(0, len(missing), chunk_frames)]
+    n = len(chunks)
+    args = (chunks, [size] * n, [cols] * n, [rows] * n)
+    with instrument.span("features", frames=len(missing), cached=len(frame_hashes) - len(missing)):
+        pool = ProcessPoolExecutor(max_workers=min(workers, n)) if workers > 1 and n > 1 else None
+        try:
+            results = pool.map(_features_chunk, *args) if pool is not None else map(_features_chunk, *args)
+            for chunk, features in zip(chunks, results):
+                done = [(frame_hashes[path], f) for path, f in zip(chunk, features)]
+                cache.put(done, cols, rows)  # Stored per chunk: an interrupted run keeps its progress
+                cached.update(done)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    return {path: cached[frame_hash] for path, frame_hash in frame_hashes.items()}
@@ -0,0 +1,207 @@
+"""
+Batched tile loading for model training.
+
+``TileDataset`` joins tiles_info.csv with a split's objects_{split}_dataset
+table once, into flat arrays (tile source, label, cell row/col).
+``TileLoader`` yields shuffled, fixed-size NumPy batches from it; batches
+are loaded by background threads (cv2.imread and np.load release the GIL)
+into a bounded prefetch queue, in a deterministic order for a given seed
+and epoch. ``ClassBalancedSampler`` draws tiles evenly across labels from
+a per-label index, since most tiles are label 0.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import pandas as pd
+
+from src.labels import labels_csv_path
+from src.tile_store import TileStore, STORE_DATA
+
+
+class TileDataset:
+    """
+    All tiles of one split with their labels and cell positions.
+
+    Args:
+        tiles_base_dir: frames_dataset_tiles directory
+        split: "train" or "test"
+        root: Directory the tile paths in tiles_info.csv are relative to
+            (default: the parent of ``tiles_base_dir``, i.e. pml-ds/)
+
+    Attributes:
+        paths: Tile file per tile (or the packed store's data file)
+        labels: int64 label per tile (0 when the frame has no label row)
+        cells: int64 (num_tiles, 2) 1-based (row, col) per tile
+        frames: Frame id per tile
+    """
+
+    def __init__(self, tiles_base_dir: str, split: str, root: str = None):
+        root = os.path.dirname(os.path.abspath(tiles_base_dir)) if root is None else root
+        tiles = pd.read_csv(os.path.join(tiles_base_dir, "tiles_info.csv"),
+                            dtype={"tile_path": str, "set_type": str, "parent_image": str})
+        tiles = tiles[tiles["set_type"] == split]
+        tiles = tiles.drop_duplicates(["parent_image", "tile_index"], keep="last")
+
+        table_path = labels_csv_path(os.path.join(tiles_base_dir, split), split)
+        if os.path.exists(table_path):
+            labeled = pd.read_csv(table_path, usecols=["image_filename", "cell_number", "label"])
+            labeled["parent_image"] = labeled["image_filename"].str.replace("_grid_overlay.png", "", regex=False)
+            tiles = tiles.merge(labeled[["parent_image", "cell_number", "label"]], how="left",
+                                left_on=["parent_image", "tile_index"],
+                                right_on=["parent_image", "cell_number"])
+            labels = tiles["label"].fillna(0).to_numpy(dtype=np.int64)
+        else:
+            labels = np.zeros(len(tiles), dtype=np.int64)
+
+        self.paths = np.array([p if os.path.isabs(p) else os.path.join(root, p)
+                               for p in tiles["tile_path"]], dtype=object)
+        self.frames = tiles["parent_image"].to_numpy(dtype=object)
+        self.tile_index = tiles["tile_index"].to_numpy(dtype=np.int64)
+        self.labels = labels
+        self.cells = tiles[["row", "col"]].to_numpy(dtype=np.int64)
+
+        # Packed stores: resolve every tile to an offset in its memory map once
+        self._stores = {}
+        self._offsets = np.full(len(tiles), -1, dtype=np.int64)
+        packed = np.flatnonzero([os.path.basename(p) == STORE_DATA for p in self.paths])
+        for i in packed:
+            store = self._store(os.path.dirname(self.paths[i]))
+            self._offsets[i] = store.offset(self.frames[i], int(self.tile_index[i]))
+
+    def _store(self, store_dir):
+        store = self._stores.get(store_dir)
+        if store is None:
+            store = self._stores[store_dir] = TileStore(store_dir)
+        return store
+
+    def __len__(self):
+        return len(self.labels)
+
+    def label_index(self) -> dict:
+        """Per-label index: label -> array of tile positions with that label."""
+        order = np.argsort(self.labels, kind="stable")
+        classes, starts = np.unique(self.labels[order], return_index=True)
+        return dict(zip(classes.tolist(), np.split(order, starts[1:])))
+
+    def load(self, indices) -> np.ndarray:
+        """Tiles at ``indices`` as one uint8 (len(indices), tile_h, tile_w, 3) RGB array."""
+        indices = np.asarray(indices)
+        out = None
+        for k, i in enumerate(indices):
+            if self._offsets[i] >= 0:
+                tile = self._store(os.path.dirname(self.paths[i])).tiles[self._offsets[i]]
+            elif self.paths[i].endswith(".npy"):
+                tile = np.load(self.paths[i])
+            else:
+                tile = cv2.imread(self.paths[i], cv2.IMREAD_COLOR)
+                if tile is None:
+                    raise ValueError(f"Failed to read tile {self.paths[i]}")
+                tile = cv2.cvtColor(tile, cv2.COLOR_BGR2RGB)
+            if out is None:
+                out = np.empty((len(indices),) + tile.shape, dtype=np.uint8)
+            out[k] = tile
+        return out
+
+
+class ClassBalancedSampler:
+    """
+    Draws tile positions so that every label is equally likely.
+
+    A label is drawn uniformly, then a tile uniformly among the tiles with
+    that label (with replacement), using a precomputed per-label index.
+
+    Args:
+        label_index: label -> array of tile positions (TileDataset.label_index())
+        weights: Optional label -> relative weight (default: all equal)
+    """
+
+    def __init__(self, label_index: dict, weights: dict = None):
+        self.classes = sorted(label_index)
+        self.index = [np.asarray(label_index[c]) for c in self.classes]
+        p = np.array([1.0 if weights is None else weights.get(c, 0.0) for c in self.classes])
+        self.p = p / p.sum()
+
+    def sample(self, num_samples: int, rng: np.random.Generator) -> np.ndarray:
+        """``num_samples`` tile positions."""
+        drawn = rng.choice(len(self.classes), size=num_samples, p=self.p)
+        out = np.empty(num_samples, dtype=np.int64)
+        for k, idx in enumerate(self.index):
+            where = np.flatnonzero(drawn == k)
+            out[where] = idx[rng.integers(0, len(idx), size=len(where))]
+        return out
+
+
+class TileLoader:
+    """
+    Iterates over fixed-size batches of (tiles, labels, cells).
+
+    Every ``iter()`` is one epoch. Sample order depends only on ``seed``
+    and the epoch number, never on thread timing.
+
+    Args:
+        dataset: TileDataset
+        batch_size: Tiles per batch
+        shuffle: Shuffle tiles each epoch (ignored when balanced)
+        seed: Base seed; epoch e uses seed + e
+        drop_last: Drop a final batch smaller than batch_size
+        balanced: Sample with ClassBalancedSampler (len(dataset) samples per epoch)
+        num_workers: Loader threads
+        prefetch: Batches loaded ahead of the consumer (bounded queue)
+
+    Yields:
+        tiles uint8 (B, tile_h, tile_w, 3), labels int64 (B,), cells int64 (B, 2) 1-based (row, col)
+    """
+
+    def __init__(self, dataset: TileDataset, batch_size: int = 256, shuffle: bool = True,
+                 seed: int = 0, drop_last: bool = False, balanced: bool = False,
+                 num_workers: int = 4, prefetch: int = 4):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.sampler = ClassBalancedSampler(dataset.label_index()) if balanced and len(dataset) else None
+        self.num_workers = max(1, num_workers)
+        self.prefetch = max(1, prefetch)
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def order(self, epoch: int = None) -> np.ndarray:
+        """Tile positions of an epoch, in batch order."""
+        epoch = self.epoch if epoch is None else epoch
+        rng = np.random.default_rng(self.seed + epoch)
+        if self.sampler is not None:
+            return self.sampler.sample(len(self.dataset), rng)
+        if self.shuffle:
+            return rng.permutation(len(self.dataset))
+        return np.arange(len(self.dataset))
+
+    def __len__(self):
+        n = len(self.dataset)
+        return n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+
+    def _load_batch(self, indices):
+        return self.dataset.load(indices), self.dataset.labels[indices], self.dataset.cells[indices]
+
+    def __iter__(self):
+        order = self.order()
+        self.epoch += 1
+        stop = len(self) * self.batch_size
+        batches = (order[i:i + self.batch_size] for i in range(0, min(stop, len(order)), self.batch_size))
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            pending = deque()
+            try:
+                for indices in batches:
+                    pending.append(pool.submit(self._load_batch, indices))
+                    if len(pending) >= self.prefetch:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
@@ -0,0 +1,205 @@
+"""
+Packed tile store: all tiles of a split in one memory-mappable uint8 file.
+
+Layout of a store directory:
+    tiles.u8          raw tiles, C order, shape (num_tiles, tile_h, tile_w, 3)
+    tiles.json        {"tile_shape": [tile_h, tile_w, 3], "dtype": "uint8"}
+    tiles_index.csv   parent_image,tile_index,offset  (offset in tiles, not bytes)
+
+The store is append-only. The tiles of one frame are always written as one
+contiguous run, in tile_index order.
+"""
+
+import os
+import csv
+import json
+import shutil
+import numpy as np
+
+STORE_DATA = "tiles.u8"
+STORE_META = "tiles.json"
+STORE_INDEX = "tiles_index.csv"
+INDEX_HEADER = ["parent_image", "tile_index", "offset"]
+
+
+def _read_meta(store_dir: str):
+    with open(os.path.join(store_dir, STORE_META)) as f:
+        meta = json.load(f)
+    return tuple(meta["tile_shape"]), np.dtype(meta["dtype"])
+
+
+class TileStoreWriter:
+    """
+    Append frames' tiles to a packed tile store (created if missing).
+
+    Args:
+        store_dir: Store directory
+        tile_shape: Shape of one tile (tile_h, tile_w, 3); must match an
+            existing store
+    """
+
+    def __init__(self, store_dir: str, tile_shape: tuple):
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.tile_shape = tuple(tile_shape)
+        meta_path = os.path.join(store_dir, STORE_META)
+        if os.path.exists(meta_path):
+            existing_shape, _ = _read_meta(store_dir)
+            if existing_shape != self.tile_shape:
+                raise ValueError(f"Tile store {store_dir} holds tiles of shape {existing_shape}, "
+                                 f"not {self.tile_shape}")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"tile_shape": list(self.tile_shape), "dtype": "uint8"}, f)
+
+        self._tile_bytes = int(np.prod(self.tile_shape))
+        data_path = os.path.join(store_dir, STORE_DATA)
+        index_path = os.path.join(store_dir, STORE_INDEX)
+        index_exists = os.path.exists(index_path)
+        self._data = open(data_path, "ab")
+        # Trust the data file, not the index, for where the next tile goes
+        self.num_tiles = self._data.tell() // self._tile_bytes
+        self._index_file = open(index_path, "a", newline="")
+        self._index = csv.writer(self._index_file)
+        if not index_exists:
+            self._index.writerow(INDEX_HEADER)
+
+    def add_frame(self, parent_image: str, tiles: np.ndarray) -> int:
+        """
+        Append the tiles of one frame.
+
+        Args:
+            parent_image: Frame name without extension (e.g. "frame_0084")
+            tiles: uint8 tiles (rows, cols, tile_h, tile_w, 3) or
+                (num_tiles, tile_h, tile_w, 3), in tile_index order
+
+        Returns:
+            Offset of the frame's first tile
+        """
+        tiles = np.ascontiguousarray(tiles, dtype=np.uint8).reshape((-1,) + self.tile_shape)
+        start = self.num_tiles
+        self._data.write(tiles.data)
+        self._index.writerows([parent_image, i + 1, start + i] for i in range(len(tiles)))
+        self.num_tiles += len(tiles)
+        return start
+
+    def close(self):
+        self._data.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def append_store(dst_dir: str, src_dir: str) -> None:
+    """
+    Append all tiles of store ``src_dir`` to store ``dst_dir``, then delete ``src_dir``.
+
+    Used to merge per-worker stores; the data file is copied as raw bytes and
+    the index offsets are shifted.
+    """
+    if not os.path.exists(os.path.join(src_dir, STORE_META)):
+        return
+    tile_shape, _ = _read_meta(src_dir)
+    with TileStoreWriter(dst_dir, tile_shape) as writer:
+        base = writer.num_tiles
+        with open(os.path.join(src_dir, STORE_DATA), "rb") as src:
+            shutil.copyfileobj(src, writer._data)
+        with open(os.path.join(src_dir, STORE_INDEX), newline="") as src:
+            reader = csv.reader(src)
+            next(reader)
+            rows = [[parent, tile_index, base + int(offset)] for parent, tile_index, offset in reader]
+        writer._index.writerows(rows)
+        writer.num_tiles = writer._data.tell() // writer._tile_bytes
+    shutil.rmtree(src_dir)
+
+
+def stored_frames(store_dir: str) -> set:
+    """Names of the frames already in a store (empty set if there is no store)."""
+    index_path = os.path.join(store_dir, STORE_INDEX)
+    if not os.path.exists(index_path):
+        return set()
+    with open(index_path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return {row[0] for row in reader}
+
+
+class TileStore:
+    """
+    Read-only, memory-mapped view of a packed tile store.
+
+    All accessors return views into the mapping (no copies, no decode)
+    except ``batch`` with a non-contiguous selection.
+
+    Args:
+        store_dir: Store directory
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.tile_shape, dtype = _read_meta(store_dir)
+        data_path = os.path.join(store_dir, STORE_DATA)
+        num_tiles = os.path.getsize(data_path) // int(np.prod(self.tile_shape))
+        if num_tiles:
+            self.tiles = np.memmap(data_path, dtype=dtype, mode="r",
+                                   shape=(num_tiles,) + self.tile_shape)
+        else:
+            self.tiles = np.empty((0,) + self.tile_shape, dtype=dtype)
+
+        self._offsets = {}
+        self._frames = {}
+        with open(os.path.join(store_dir, STORE_INDEX), newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for parent_image, tile_index, offset in reader:
+                offset = int(offset)
+                if offset >= num_tiles:
+                    continue  # Index row of a write that never reached the data file
+                tile_index = int(tile_index)
+                self._offsets[(parent_image, tile_index)] = offset
+                if tile_index == 1:
+                    # A re-tiled frame is appended again; its newest run wins
+                    self._frames[parent_image] = (offset, 1)
+                else:
+                    start, count = self._frames[parent_image]
+                    self._frames[parent_image] = (start, count + 1)
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __contains__(self, parent_image):
+        return parent_image in self._frames
+
+    @property
+    def frames(self) -> list:
+        """Frame names in store order."""
+        return sorted(self._frames, key=lambda name: self._frames[name][0])
+
+    def offset(self, parent_image: str, tile_index: int) -> int:
+        """Array offset of tile ``tile_index`` (1-based) of ``parent_image``."""
+        return self._offsets[(parent_image, tile_index)]
+
+    def tile(self, parent_image: str, tile_index: int) -> np.ndarray:
+        """One tile (tile_h, tile_w, 3) as a view."""
+        return self.tiles[self.offset(parent_image, tile_index)]
+
+    def frame_tiles(self, parent_image: str) -> np.ndarray:
+        """All tiles of a frame (num_tiles, tile_h, tile_w, 3) as a view."""
+        start, count = self._frames[parent_image]
+        return self.tiles[start:start + count]
+
+    def batch(self, offsets) -> np.ndarray:
+        """
+        Tiles at the given offsets, (len(offsets), tile_h, tile_w, 3).
+
+        A run of consecutive offsets is returned as a view; any other
+        selection is gathered into a new array.
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if len(offsets) and np.all(np.diff(offsets) == 1):
+            return self.tiles[offsets[0]:offsets[-1] + 1]
+        return self.tiles[offsets]
@@ -0,0 +1,159 @@
+"""
+Tile encoding and writing on a bounded thread pool.
+
+PIL's PNG encoder and file writes release the GIL, so a few threads let
+the decode of one frame overlap with the encode and (possibly slow,
+network-attached) writes of the previous ones. ``TileWriter.write_frame``
+blocks once ``max_pending`` files are in flight (back-pressure), and
+completion/errors are reported per frame.
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+from src import instrument
+
+TILE_FORMATS = ("png", "npy")
+DEFAULT_PNG_COMPRESSION = 6   # PIL's default zlib level
+FAST_PNG_COMPRESSION = 1      # "fast" preset: still lossless, much cheaper to encode
+WRITER_THREADS = 4
+MAX_PENDING = 256             # Files queued or in flight before write_frame() blocks
+
+
+def encode_tile(image, fmt: str = "png", compress_level: int = DEFAULT_PNG_COMPRESSION) -> memoryview:
+    """
+    Encode a tile (or overlay) in memory.
+
+    Args:
+        image: RGB numpy array (H, W, 3) or PIL image
+        fmt: "png" or "npy" (raw array, np.load-able)
+        compress_level: zlib level 0-9 for PNG
+
+    Returns:
+        Encoded bytes
+    """
+    buf = io.BytesIO()
+    if fmt == "png":
+        if not isinstance(image, Image.Image):
+            image = Image.fromarray(np.asarray(image))
+        image.save(buf, format="PNG", compress_level=compress_level)
+    elif fmt == "npy":
+        np.save(buf, np.asarray(image), allow_pickle=False)
+    else:
+        raise ValueError(f"Unknown tile format: {fmt}")
+    return buf.getbuffer()
+
+
+def write_tile(image, path: str, compress_level: int = DEFAULT_PNG_COMPRESSION, atomic: bool = False) -> int:
+    """
+    Encode ``image`` in the format given by the extension of ``path`` and write it.
+
+    With ``atomic`` the file is written under a temporary name and renamed,
+    so ``path`` never exists half-written (for files shared between frames
+    and processes). Returns bytes written.
+    """
+    fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    with instrument.span("encode", images=1):
+        data = encode_tile(image, fmt, compress_level)
+    with instrument.span("file_write", files=1, bytes=len(data)):
+        out_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp" if atomic else path
+        with open(out_path, "wb") as f:
+            f.write(data)
+        if atomic:
+            os.replace(out_path, path)
+    return len(data)
+
+
+class TileWriter:
+    """
+    Writes the files of many frames concurrently.
+
+    Args:
+        fmt: Tile format, "png" or "npy" (``ext`` is the matching extension);
+            each file is encoded according to its own extension, so e.g. a
+            PNG overlay can go with .npy tiles
+        compress_level: zlib level 0-9 for PNG files
+        threads: Encoder/writer threads (0 = write synchronously in write_frame)
+        max_pending: Files queued or in flight before write_frame() blocks
+        atomic: Write every file under a temporary name and rename it (see write_tile)
+    """
+
+    def __init__(self, fmt: str = "png", compress_level: int = DEFAULT_PNG_COMPRESSION,
+                 threads: int = WRITER_THREADS, max_pending: int = MAX_PENDING, atomic: bool = False):
+        if fmt not in TILE_FORMATS:
+            raise ValueError(f"Unknown tile format: {fmt}")
+        self.fmt = fmt
+        self.ext = "." + fmt
+        self.compress_level = compress_level
+        self.atomic = atomic
+        self._pool = ThreadPoolExecutor(max_workers=threads) if threads > 0 else None
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._frames = {}  # frame_id -> [files remaining, first error]
+        self._done = []    # (frame_id, error or None), in completion order
+
+    def write_frame(self, frame_id: str, items) -> None:
+        """
+        Queue the files of one frame.
+
+        Args:
+            frame_id: Key under which completion is reported
+            items: List of (path, image) pairs
+        """
+        items = list(items)
+        with self._lock:
+            if frame_id in self._frames:
+                raise ValueError(f"Frame {frame_id} is already being written")
+            self._frames[frame_id] = [len(items), None]
+        if not items:
+            self._finish(frame_id, None, count=0)
+        for path, image in items:
+            if self._pool is None:
+                self._write(frame_id, path, image, release=False)
+                continue
+            with instrument.span("write_wait"):
+                self._slots.acquire()  # Back-pressure: wait for a free slot
+            self._pool.submit(self._write, frame_id, path, image)
+
+    def _write(self, frame_id, path, image, release=True):
+        error = None
+        try:
+            write_tile(image, path, self.compress_level, self.atomic)
+        except Exception as e:
+            error = e
+        finally:
+            if release:
+                self._slots.release()
+            self._finish(frame_id, error)
+
+    def _finish(self, frame_id, error, count=1):
+        with self._lock:
+            entry = self._frames[frame_id]
+            entry[0] -= count
+            if error is not None and entry[1] is None:
+                entry[1] = error
+            if entry[0] <= 0:
+                del self._frames[frame_id]
+                self._done.append((frame_id, entry[1]))
+
+    def poll(self) -> list:
+        """Frames finished since the last poll: list of (frame_id, error or None)."""
+        with self._lock:
+            done, self._done = self._done, []
+        return done
+
+    def close(self) -> list:
+        """Wait for every queued file; returns the frames finished since the last poll."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        return self.poll()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -3,26 +3,177 @@ Utility functions for image processing and file operations.
 """
 
 import os
+import csv
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
+from PIL import Image
 
 
-def read_image(img_path: str) -> np.ndarray:
+CHANNEL_ORDERS = ("rgb", "bgr", "gray")
+DECODE_THREADS = 4
+
+_REDUCED_FLAGS = {
+    # factor: (color flag, grayscale flag); JPEGs are downscaled during decode
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+}
+
+
+def _reduction(img_path: str, target_size: tuple) -> int:
+    """Largest JPEG decode reduction (1, 2, 4 or 8) that keeps the image at least target_size."""
+    with Image.open(img_path) as img:  # Header only
+        width, height = img.size
+        if img.format != "JPEG":
+            return 1  # Other formats are fully decoded anyway
+    factor = 1
+    while factor < 8 and width // (factor * 2) >= target_size[0] and height // (factor * 2) >= target_size[1]:
+        factor *= 2
+    return factor
+
+
+def decode_image(img_path: str, channel_order: str = "rgb", target_size: tuple = None) -> np.ndarray:
     """
-    Read an image file and return it as a numpy array in RGB format.
-    
+    Decode an image file, without resizing it.
+
     Args:
         img_path: Path to the image file
-        
+        channel_order: "rgb" (default), "bgr" (OpenCV's native order, no
+            conversion) or "gray"
+        target_size: Optional (width, height) the image will be resized to;
+            JPEGs at least twice as large are decoded at reduced resolution
+
     Returns:
-        numpy array of the image in RGB format (H, W, 3)
+        numpy array of the image, (H, W, 3) or (H, W) for "gray"
     """
-    img = cv2.imread(img_path)
+    if channel_order not in CHANNEL_ORDERS:
+        raise ValueError(f"Unknown channel order: {channel_order}")
+    gray = channel_order == "gray"
+    flag = cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR
+    if target_size is not None:
+        factor = _reduction(img_path, target_size)
+        if factor > 1:
+            flag = _REDUCED_FLAGS[factor][gray]
+    img = cv2.imread(img_path, flag)
     if img is None:
         raise ValueError(f"Failed to read image from {img_path}")
-    # Convert BGR to RGB
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    return img_rgb
+    if channel_order == "rgb":
+        # Convert BGR to RGB
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return img
+
+
+def resize_image(img: np.ndarray, size: tuple) -> np.ndarray:
+    """
+    Resize a uint8 image array to (width, height).
+
+    Uses PIL's bicubic (antialiased) resampling, the interpolation frames
+    have always been tiled with, so tiles do not depend on the decoder.
+    """
+    if (img.shape[1], img.shape[0]) == tuple(size):
+        return img
+    return np.asarray(Image.fromarray(img).resize(tuple(size), Image.BICUBIC))
+
+
+def read_image(img_path: str, channel_order: str = "rgb", target_size: tuple = None,
+               cache=None) -> np.ndarray:
+    """
+    Read an image file and return it as a numpy array.
+    
+    Args:
+        img_path: Path to the image file
+        channel_order: "rgb" (default), "bgr" (OpenCV's native order, no
+            conversion) or "gray"
+        target_size: Optional (width, height) to resize to (resize_image);
+            JPEGs at least twice as large are decoded at reduced resolution first
+        cache: Optional FrameCache to read through
+        
+    Returns:
+        numpy array of the image, (H, W, 3) or (H, W) for "gray"
+    """
+    if cache is not None:
+        return cache.get(img_path, channel_order, target_size)
+    img = decode_image(img_path, channel_order, target_size)
+    if target_size is not None:
+        img = resize_image(img, target_size)
+    return img
+
+
+def read_images(img_paths, channel_order: str = "rgb", target_size: tuple = None,
+                threads: int = DECODE_THREADS, cache=None) -> list:
+    """
+    Decode several images on a thread pool (OpenCV releases the GIL while decoding).
+
+    Args:
+        img_paths: Image file paths
+        channel_order: "rgb", "bgr" or "gray" (see read_image)
+        target_size: Optional (width, height) to resize to (see read_image)
+        threads: Decoder threads (1 = decode in the calling thread)
+        cache: Optional FrameCache to read through
+
+    Returns:
+        List of numpy arrays, in the order of ``img_paths``
+    """
+    img_paths = list(img_paths)
+    if threads <= 1 or len(img_paths) <= 1:
+        return [read_image(p, channel_order, target_size, cache) for p in img_paths]
+    with ThreadPoolExecutor(max_workers=min(threads, len(img_paths))) as pool:
+        return list(pool.map(lambda p: read_image(p, channel_order, target_size, cache), img_paths))
+
+
+class FrameCache:
+    """
+    Bounded LRU cache of decoded frames, for stages that read a frame more than once.
+
+    Entries are keyed by path, file size and mtime (so an edited file is
+    decoded again), channel order and target size. Cached arrays are
+    read-only; copy them before modifying.
+
+    Args:
+        max_bytes: Total size of the cached arrays (default 256 MB)
+    """
+
+    def __init__(self, max_bytes: int = 256 << 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, img_path: str, channel_order: str = "rgb", target_size: tuple = None) -> np.ndarray:
+        """The decoded frame, from the cache or read_image()."""
+        st = os.stat(img_path)
+        key = (img_path, st.st_size, st.st_mtime_ns, channel_order,
+               tuple(target_size) if target_size is not None else None)
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+        img = read_image(img_path, channel_order, target_size)
+        img.flags.writeable = False
+        with self._lock:
+            if key not in self._entries and img.nbytes <= self.max_bytes:
+                self._entries[key] = img
+                self.nbytes += img.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, old = self._entries.popitem(last=False)
+                    self.nbytes -= old.nbytes
+        return img
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
 
 
 def ensure_dir(dir_path: str) -> None:
@@ -34,3 +185,46 @@ def ensure_dir(dir_path: str) -> None:
     """
     os.makedirs(dir_path, exist_ok=True)
 
+
+
+def rewrite_csv(csv_path: str, header: list, drop=None, key=None,
+                appended=(), lineterminator: str = "\r\n") -> None:
+    """
+    Atomically rewrite a CSV, replacing some of its rows.
+
+    Existing rows are kept unless ``drop(row)`` is true; if ``key`` is given,
+    only the first existing row per ``key(row)`` is kept. The rows of each
+    CSV file in ``appended`` (no header) are then added at the end. The new
+    file is written next to the old one and swapped in with os.replace, so
+    an interrupted run never leaves a half-written CSV.
+
+    Args:
+        csv_path: CSV to rewrite (created if missing)
+        header: Header row
+        drop: Optional predicate on a parsed row (list of str)
+        key: Optional function mapping a parsed row to a dedup key
+        appended: Paths of header-less CSV files to append, in order
+        lineterminator: Line ending to write (csv.writer default: "\\r\\n")
+    """
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, mode="w", newline="") as out:
+        writer = csv.writer(out, lineterminator=lineterminator)
+        writer.writerow(header)
+        if os.path.exists(csv_path):
+            seen = set()
+            with open(csv_path, newline="") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                for row in reader:
+                    if not row or (drop is not None and drop(row)):
+                        continue
+                    if key is not None:
+                        k = key(row)
+                        if k in seen:
+                            continue
+                        seen.add(k)
+                    writer.writerow(row)
+        for path in appended:
+            with open(path, newline="") as f:
+                writer.writerows(csv.reader(f))
+    os.replace(tmp_path, csv_path)
@@ -0,0 +1,48 @@
+import os
+
+import cv2
+import numpy as np
+
+from src.dataset_shards import (ShardCatalog, ShardReader, index_path, iter_shard, read_member,
+                                shard_name, write_shard)
+
+
+def members(tmp_path, parent_image, count=3):
+    out = []
+    for i in range(1, count + 1):
+        path = tmp_path / f"{parent_image}_{i:02d}.png"
+        cv2.imwrite(str(path), np.full((4, 4, 3), 10 * i, dtype=np.uint8))
+        out.append((f"train/{parent_image}_tiles/{path.name}", str(path), "train", parent_image, i))
+    return out
+
+
+def test_byte_range_reads(tmp_path):
+    for compress in ("gzip", "none"):
+        shard_path = str(tmp_path / shard_name(0, compress))
+        items = members(tmp_path, "frame_0001")
+        rows = write_shard(shard_path, items, compress)
+        assert os.path.exists(index_path(shard_path))
+        for (name, src, *_), row in zip(items, rows):
+            with open(src, "rb") as f:
+                assert read_member(shard_path, row[4], row[5]) == f.read()
+        assert [name for name, _ in iter_shard(shard_path)] == [item[0] for item in items]
+
+
+def test_reader_follows_catalog_to_newest_shard(tmp_path):
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+    with ShardCatalog(str(shard_dir)) as catalog:
+        for number, (value, count) in enumerate((("old", 3), ("new", 2))):
+            frame_dir = tmp_path / value
+            frame_dir.mkdir()
+            items = members(frame_dir, "frame_0001", count)
+            file = shard_name(number)
+            write_shard(str(shard_dir / file), items)
+            catalog.add_shard(number, file, [("train", "frame_0001", value)], len(items))
+        assert catalog.signatures() == {("train", "frame_0001"): "new"}
+
+    reader = ShardReader(str(shard_dir))
+    assert len(reader) == 1
+    name, data = reader.read("train", "frame_0001", 2)
+    assert name.endswith("frame_0001_02.png") and data == (tmp_path / "new" / "frame_0001_02.png").read_bytes()
+    np.testing.assert_array_equal(reader.tile("train", "frame_0001", 1), np.full((4, 4, 3), 10, np.uint8))
@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+
+from src.frame_hash import HashIndex, dhash_batch, hamming, hash_thumbnail
+
+
+def test_dhash_ignores_brightness_and_catches_changes():
+    thumb = np.random.default_rng(0).integers(0, 200, (8, 9), dtype=np.uint8)
+    brighter = thumb + 40
+    mirrored = thumb[:, ::-1]
+    hashes = dhash_batch(np.stack([thumb, brighter, mirrored]))
+    assert hashes.dtype == np.uint64
+    distances = hamming(hashes[:1], hashes)[0]
+    assert distances[0] == 0 and distances[1] == 0
+    assert distances[2] > 16
+
+
+def test_hash_thumbnail(tmp_path):
+    img = np.tile(np.arange(0, 256, 2, dtype=np.uint8), (96, 1))
+    path = str(tmp_path / "frame_0001.png")
+    cv2.imwrite(path, cv2.merge([img, img, img]))
+    thumb = hash_thumbnail(path)
+    assert thumb.shape == (8, 9)
+    assert hamming(dhash_batch(thumb[None]), np.array([np.uint64(2 ** 64 - 1)]))[0, 0] == 0
+
+
+def test_index_threshold_matching(tmp_path):
+    base = np.uint64(0x0123456789ABCDEF)
+    near = base ^ np.uint64(0b111)       # 3 bits away
+    far = base ^ np.uint64(0xFFFF)       # 16 bits away
+    db_path = str(tmp_path / "hashes.sqlite")
+    stats = [(1, 1)] * 3
+
+    with HashIndex(db_path) as index:
+        decisions = index.add(["a.png", "b.png", "c.png"], stats, [base, near, far], threshold=4)
+        assert decisions == [(None, None), ("a.png", 3), (None, None)]
+        assert len(index) == 2
+        assert index.add(["d.png"], stats[:1], [near], threshold=2) == [(None, None)]
+
+    with HashIndex(db_path) as index:
+        assert len(index) == 3  # Kept frames are reloaded, duplicates are not
+        assert index.records()["b.png"][3:] == ("a.png", 3)
+        distances, paths = index.nearest([far ^ np.uint64(1)])
+        assert distances.tolist() == [1] and paths == ["c.png"]
+        index.remove(["c.png"])
+        assert len(index) == 2 and "c.png" not in index.records()
@@ -0,0 +1,61 @@
+import csv
+
+from src.frame_registry import FrameRegistry, assign_split, frame_number
+from src.frame_scan import DATASET_INFO_FIELDS
+
+
+def row(name, set_type="train"):
+    return {"image_path": f"frames_dataset/{set_type}/{name}", "set_type": set_type, "size": 10,
+            "mtime_ns": 1, "width": 1280, "height": 720, "format": "PNG"}
+
+
+def test_allocate_numbers_are_consecutive_and_persist(tmp_path):
+    db_path = str(tmp_path / "registry.sqlite")
+    with FrameRegistry(db_path) as registry:
+        assert registry.last_frame == 0
+        assert registry.allocate(3) == 1
+        assert registry.allocate(2) == 4
+    with FrameRegistry(db_path) as registry:
+        assert registry.last_frame == 5
+        assert registry.allocate(1) == 6
+
+
+def test_sync_raises_counter_past_seen_frames(tmp_path):
+    with FrameRegistry(str(tmp_path / "registry.sqlite")) as registry:
+        registry.add([row("frame_0001.png"), row("frame_0002.png", "test")])
+        registry.sync([row("frame_0002.png", "test"), row("frame_0040.png")])
+        assert {r["image_path"] for r in registry.rows()} == \
+            {"frames_dataset/test/frame_0002.png", "frames_dataset/train/frame_0040.png"}
+        assert registry.counts() == {"test": 1, "train": 1}
+        assert registry.allocate(1) == 41
+
+
+def test_export_appends_then_rewrites(tmp_path):
+    csv_path = tmp_path / "dataset_info.csv"
+    with FrameRegistry(str(tmp_path / "registry.sqlite")) as registry:
+        registry.add([row("frame_0001.png")])
+        assert registry.export(str(csv_path)) == 1
+        registry.add([row("frame_0002.png")])
+        assert registry.export(str(csv_path)) == 1  # Appended
+        registry.remove(["frames_dataset/train/frame_0001.png"])
+        assert registry.export(str(csv_path)) == 1  # Rewritten
+
+    with open(csv_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == DATASET_INFO_FIELDS
+    assert [r["image_path"] for r in rows] == ["frames_dataset/train/frame_0002.png"]
+
+
+def test_assign_split_is_stable():
+    ids = [f"frame_{i:04d}" for i in range(2000)]
+    splits = [assign_split(frame_id) for frame_id in ids]
+    assert splits == [assign_split(frame_id) for frame_id in ids]
+    assert 0.15 < splits.count("test") / len(ids) < 0.25
+    assert assign_split("frame_0001", 0.0) == "train"
+    assert assign_split("frame_0001", 1.0) == "test"
+
+
+def test_frame_number():
+    assert frame_number("frame_0084.png") == 84
+    assert frame_number("frame_0084_tiles") == 84
+    assert frame_number("dataset_info.csv") == 0
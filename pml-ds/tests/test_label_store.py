@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from src.label_store import LabelStore
+
+
+def write_frame_csv(split_dir, frame_id, rows):
+    frame_dir = split_dir / f"{frame_id}_tiles"
+    frame_dir.mkdir(exist_ok=True)
+    lines = ["TileIndex,LabelCode"] + [f"{cell},{code}" for cell, code in rows]
+    (frame_dir / f"{frame_id}_labels.csv").write_text("\n".join(lines) + "\n")
+
+
+def test_upsert_overwrites_and_matrix(tmp_path):
+    with LabelStore(str(tmp_path / "labels.sqlite")) as store:
+        store.upsert("frame_0001", [1, 2], [1, 2])
+        store.upsert(["frame_0001", "frame_0002"], [2, 64], [3, 1])
+        labels = store.label_matrix(["frame_0002", "frame_0001", "frame_0009"])
+
+        assert labels.dtype == np.int8 and labels.shape == (3, 64)
+        assert labels[0, 63] == 1 and labels[0, :63].sum() == 0
+        assert labels[1, :3].tolist() == [1, 3, 0]
+        assert not labels[2].any()
+        assert set(store.versions()) == {"frame_0001", "frame_0002"}
+
+        store.clear(["frame_0001"])
+        assert not store.label_matrix(["frame_0001"]).any()
+
+
+def test_sync_frame_csvs_imports_only_changes(tmp_path):
+    split_dir = tmp_path / "train"
+    split_dir.mkdir()
+    write_frame_csv(split_dir, "frame_0001", [(5, 2)])
+    with LabelStore(str(tmp_path / "labels.sqlite")) as store:
+        store.upsert("frame_0002", [1], [1])  # Written directly, never had a file
+
+        frames = ["frame_0001", "frame_0002"]
+        assert store.sync_frame_csvs(str(split_dir), frames) == ["frame_0001"]
+        assert store.sync_frame_csvs(str(split_dir), frames) == []
+
+        write_frame_csv(split_dir, "frame_0001", [(5, 2), (6, 3)])
+        assert store.sync_frame_csvs(str(split_dir), frames) == ["frame_0001"]
+        assert store.label_matrix(["frame_0001"])[0, 4:6].tolist() == [2, 3]
+
+        (split_dir / "frame_0001_tiles" / "frame_0001_labels.csv").unlink()
+        assert store.sync_frame_csvs(str(split_dir), frames) == ["frame_0001"]
+        labels = store.label_matrix(frames)
+        assert not labels[0].any() and labels[1, 0] == 1
+
+
+def test_join_tiles(tmp_path):
+    with LabelStore(str(tmp_path / "labels.sqlite")) as store:
+        store.upsert("frame_0001", [2], [3])
+        tiles = pd.DataFrame({"parent_image": ["frame_0001", "frame_0001", "frame_0002"],
+                              "tile_index": [1, 2, 2]})
+        assert store.join_tiles(tiles)["label"].tolist() == [0, 3, 0]
@@ -0,0 +1,51 @@
+import os
+
+from src.manifest import Manifest, diff
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return os.path.abspath(path)
+
+
+def test_scan_detects_changes(tmp_path):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    a = write(frames / "frame_0001.png", b"a")
+    b = write(frames / "frame_0002.png", b"b")
+    (frames / "notes.txt").write_text("skipped")
+
+    with Manifest(str(tmp_path / "manifest.sqlite")) as manifest:
+        first = manifest.scan(str(frames))
+        assert list(first) == [a, b]
+        assert manifest.scan(str(frames)) == first
+
+        write(frames / "frame_0002.png", b"changed")
+        os.utime(b, ns=(1, 1))  # Same listing, new size and mtime
+        second = manifest.scan(str(frames))
+        assert second[a] == first[a] and second[b] != first[b]
+
+        os.remove(a)
+        c = write(frames / "frame_0003.jpg", b"c")
+        assert list(manifest.scan(str(frames))) == [b, c]
+
+
+def test_recorded_outputs_and_diff(tmp_path):
+    frames = tmp_path / "frames"
+    frames.mkdir()
+    a = write(frames / "frame_0001.png", b"a")
+    b = write(frames / "frame_0002.png", b"b")
+    db_path = str(tmp_path / "manifest.sqlite")
+
+    with Manifest(db_path) as manifest:
+        current = manifest.scan(str(frames))
+        manifest.record("tiles", a, current[a], ["frame_0001_tiles"])
+        manifest.record("tiles", str(tmp_path / "frames" / "frame_0009.png"), "gone")
+    with Manifest(db_path) as manifest:
+        recorded = manifest.recorded("tiles", str(frames))
+        assert manifest.outputs("tiles", a) == ["frame_0001_tiles"]
+        assert manifest.outputs("tiles", b) == []
+
+    pending, removed = diff(current, recorded)
+    assert pending == [b]
+    assert removed == [os.path.abspath(tmp_path / "frames" / "frame_0009.png")]
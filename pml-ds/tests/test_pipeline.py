@@ -0,0 +1,57 @@
+import pytest
+
+from src.pipeline import Checkpoint, Pipeline
+
+
+def build(checkpoint, calls, fail_on=None):
+    def decode(key, item):
+        calls.append(("decode", key))
+        return item * 2
+
+    def tile(key, item):
+        calls.append(("tile", key))
+        if key == fail_on:
+            raise RuntimeError(f"tiling {key} failed")
+        return item + 1
+
+    pipeline = Pipeline(checkpoint)
+    pipeline.add("decode", decode)
+    pipeline.add("tile", tile, after="decode")
+    return pipeline
+
+
+def test_resume_skips_completed_stages(tmp_path):
+    db_path = str(tmp_path / "checkpoint.sqlite")
+    items = [(f"frame_{i:04d}", i) for i in range(1, 4)]
+
+    calls = []
+    with Checkpoint(db_path, "run") as checkpoint:
+        with pytest.raises(RuntimeError):
+            build(checkpoint, calls, fail_on="frame_0002").run(items)
+        assert checkpoint.get("frame_0001", "tile") == 3
+
+    calls = []
+    with Checkpoint(db_path, "run") as checkpoint:
+        build(checkpoint, calls).run(items)
+        assert ("decode", "frame_0001") not in calls and ("tile", "frame_0001") not in calls
+        assert ("tile", "frame_0002") in calls
+        assert ("decode", "frame_0002") not in calls  # Stored before the tile stage failed
+        assert checkpoint.results("tile", [key for key, _ in items]) == \
+            {"frame_0001": 3, "frame_0002": 5, "frame_0003": 7}
+
+    calls = []
+    with Checkpoint(db_path, "run") as checkpoint:
+        stats = build(checkpoint, calls).run(items)
+        assert calls == [] and stats["source"][0] == 0
+
+
+def test_complete_drops_payloads_but_stays_done(tmp_path):
+    with Checkpoint(str(tmp_path / "checkpoint.sqlite"), "run") as checkpoint:
+        checkpoint.done("frame_0001", "tiles", {"rows": [1, 2]})
+        checkpoint.complete(["frame_0001"], "merged", drop=("tiles",))
+        assert checkpoint.has("frame_0001", "tiles") and checkpoint.keys("merged") == {"frame_0001"}
+        assert checkpoint.get("frame_0001", "tiles", "dropped") == "dropped"
+        assert checkpoint.results("tiles", ["frame_0001"]) == {}
+
+    with Checkpoint(str(tmp_path / "checkpoint.sqlite"), "other") as checkpoint:
+        assert checkpoint.keys("merged") == set()
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from src.pyramid import aggregate_labels, derive_labels, expand_labels, nests, parse_levels
+
+
+def test_parse_levels():
+    assert parse_levels("4x4, 16 ,8x4,4x4") == [(4, 4), (16, 16), (8, 4)]
+    with pytest.raises(ValueError):
+        parse_levels("0x4")
+
+
+def test_nests():
+    assert nests((16, 16), (8, 8)) and nests((4, 4), (8, 8))
+    assert not nests((8, 8), (6, 6))
+
+
+def test_aggregate_up():
+    fine = np.zeros((1, 16), dtype=np.int8)        # 4x4 grid -> 2x2
+    fine[0, [0, 1, 4]] = [2, 1, 1]                  # Top-left block: 2, 1, 1, 0
+    fine[0, [2, 3, 6, 7]] = [3, 3, 0, 0]            # Top-right block: 3, 3, 0, 0
+    fine[0, 15] = 2                                 # Bottom-right block: 0, 0, 0, 2
+    assert aggregate_labels(fine, (4, 4), (2, 2), "any").tolist() == [[1, 3, 0, 2]]
+    assert aggregate_labels(fine, (4, 4), (2, 2), "majority").tolist() == [[1, 0, 0, 0]]
+    assert aggregate_labels(fine, (4, 4), (2, 2), "max").tolist() == [[2, 3, 0, 2]]
+    assert aggregate_labels(fine, (4, 4), (2, 2)).dtype == np.int8
+
+
+def test_expand_down_and_round_trip():
+    coarse = np.array([[1, 2, 3, 0]], dtype=np.int8)   # 2x2
+    fine = expand_labels(coarse, (2, 2), (4, 4))
+    assert fine.reshape(4, 4).tolist() == [[1, 1, 2, 2], [1, 1, 2, 2], [3, 3, 0, 0], [3, 3, 0, 0]]
+    np.testing.assert_array_equal(derive_labels(fine, (4, 4), (2, 2)), coarse)
+    np.testing.assert_array_equal(derive_labels(coarse, (2, 2), (2, 2)), coarse)
+    with pytest.raises(ValueError):
+        expand_labels(coarse, (2, 2), (3, 3))
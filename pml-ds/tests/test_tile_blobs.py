@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+from src.tile_blobs import BlobIndex, tile_digest
+from src.tile_writer import write_tile
+
+
+def tile(value):
+    return np.full((4, 4, 3), value, dtype=np.uint8)
+
+
+def test_digest_depends_on_pixels_and_shape():
+    assert tile_digest(tile(1)) == tile_digest(tile(1).copy())
+    assert tile_digest(tile(1)) != tile_digest(tile(2))
+    assert tile_digest(tile(1)) != tile_digest(tile(1).reshape(8, 2, 3))
+
+
+def test_identical_tiles_share_one_blob(tmp_path):
+    blob_dir = str(tmp_path / "tile_blobs")
+    index = BlobIndex(blob_dir)
+    path, new = index.add(tile(1), owner="frame_0001")
+    assert new
+    assert index.add(tile(1), owner="frame_0002") == (path, False)  # Shares the pending write
+    write_tile(tile(1), path, atomic=True)
+    assert index.settle() == set()
+    assert index.add(tile(1), owner="frame_0003") == (path, False)
+    assert (index.added, index.reused) == (1, 2)
+
+    # No temporary files are left behind, and a new index finds the blob
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+    assert len(BlobIndex(blob_dir)) == 1
+    assert BlobIndex(blob_dir).add(tile(1)) == (path, False)
+
+
+def test_failed_write_drops_blob_and_its_users(tmp_path):
+    index = BlobIndex(str(tmp_path / "tile_blobs"))
+    path, _ = index.add(tile(1), owner="frame_0001")
+    index.add(tile(1), owner="frame_0002")
+    index.add(tile(2), owner="frame_0003")
+    assert index.settle(failed={"frame_0001"}) == {"frame_0001", "frame_0002"}
+    assert index.add(tile(1), owner="frame_0004") == (path, True)
+    index.rollback()
+    assert len(index) == 1 and index.added == 1
@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+
+from src.tile_features import FEATURE_NAMES, NUM_FEATURES, FeatureCache, frame_features, grid_features
+
+
+def test_descriptor_shape_and_range():
+    frames = np.random.default_rng(0).integers(0, 256, (2, 64, 96, 3), dtype=np.uint8)
+    features = grid_features(frames, cols=8, rows=4)
+    assert features.shape == (2, 32, NUM_FEATURES) and features.dtype == np.float32
+    assert features.min() >= 0 and features.max() <= 1
+    np.testing.assert_array_equal(grid_features(frames[0], cols=8, rows=4), features[0])
+
+
+def test_uniform_tile_values():
+    frame = np.zeros((32, 32, 3), dtype=np.uint8)
+    frame[:16, :16] = (255, 0, 0)
+    features = grid_features(frame, cols=2, rows=2)
+    red, black = features[0], features[1]
+    col = FEATURE_NAMES.index
+    assert red[col("mean_r")] == 1 and red[col("mean_g")] == 0 and red[col("std_r")] == 0
+    assert red[col("hist_r7")] == 1 and red[col("hue0")] == 1
+    assert black[col("hist_r0")] == 1 and black[col("hue0")] == 0
+    assert red[col("edge_density")] > 0  # Edge pixels along the red block's border
+
+    flat = grid_features(np.full((32, 32, 3), 128, dtype=np.uint8), cols=2, rows=2)
+    assert not flat[:, [col("edge_density"), col("grad_mean")]].any()
+
+
+def test_frame_features_and_cache(tmp_path):
+    path = str(tmp_path / "frame_0001.png")
+    cv2.imwrite(path, np.random.default_rng(1).integers(0, 256, (48, 80, 3), dtype=np.uint8))
+    features = frame_features(path, (64, 32))
+    assert features.shape == (64, NUM_FEATURES)
+
+    with FeatureCache(str(tmp_path / "features.sqlite")) as cache:
+        cache.put([("abc", features)])
+        found = cache.get(["abc", "missing"])
+        assert list(found) == ["abc"]
+        np.testing.assert_array_equal(found["abc"], features)
+        assert cache.get(["abc"], cols=4, rows=4) == {}
@@ -0,0 +1,63 @@
+import csv
+
+import numpy as np
+
+from src.tile_loader import ClassBalancedSampler, TileDataset, TileLoader
+
+CSV_HEADER = ["tile_path", "set_type", "parent_image", "row", "col", "tile_index"]
+
+
+def make_dataset(tmp_path, frames=3, cells=4):
+    tiles_dir = tmp_path / "frames_dataset_tiles"
+    rows = []
+    for f in range(frames):
+        frame_dir = tiles_dir / "train" / f"frame_{f:04d}_tiles"
+        frame_dir.mkdir(parents=True)
+        for i in range(1, cells + 1):
+            path = frame_dir / f"frame_{f:04d}_{i:02d}.npy"
+            np.save(path, np.full((2, 2, 3), f * cells + i, dtype=np.uint8))
+            rows.append([str(path.relative_to(tmp_path)), "train", f"frame_{f:04d}", (i - 1) // 2 + 1,
+                         (i - 1) % 2 + 1, i])
+    with open(tiles_dir / "tiles_info.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+    (tiles_dir / "train" / "objects_train_dataset.csv").write_text(
+        "image_filename,cell_number,label\nframe_0001_grid_overlay.png,2,3\n")
+    return TileDataset(str(tiles_dir), "train")
+
+
+def test_dataset_joins_labels(tmp_path):
+    dataset = make_dataset(tmp_path)
+    assert len(dataset) == 12
+    assert dataset.labels.tolist() == [0] * 5 + [3] + [0] * 6
+    assert dataset.cells[5].tolist() == [1, 2]
+    assert dataset.load([5, 0])[:, 0, 0, 0].tolist() == [6, 1]
+
+
+def test_batch_order_is_deterministic(tmp_path):
+    dataset = make_dataset(tmp_path)
+
+    def epoch_batches(loader):
+        return [(tiles[:, 0, 0, 0].tolist(), labels.tolist()) for tiles, labels, _ in loader]
+
+    a = TileLoader(dataset, batch_size=5, seed=7, num_workers=1)
+    b = TileLoader(dataset, batch_size=5, seed=7, num_workers=4, prefetch=1)
+    first = epoch_batches(a)
+    assert first == epoch_batches(b)
+    assert [len(tiles) for tiles, _ in first] == [5, 5, 2]
+    assert epoch_batches(a) == epoch_batches(b)  # Second epoch, same on both
+    assert a.order(0).tolist() != a.order(1).tolist()
+    assert sorted(a.order(1).tolist()) == list(range(12))
+
+    b.set_epoch(0)
+    assert epoch_batches(b) == first
+    assert len(TileLoader(dataset, batch_size=5, drop_last=True)) == 2
+    np.testing.assert_array_equal(TileLoader(dataset, shuffle=False).order(), np.arange(12))
+
+
+def test_balanced_sampler_draws_every_class(tmp_path):
+    dataset = make_dataset(tmp_path)
+    sampler = ClassBalancedSampler(dataset.label_index())
+    drawn = dataset.labels[sampler.sample(2000, np.random.default_rng(0))]
+    assert 0.4 < (drawn == 3).mean() < 0.6
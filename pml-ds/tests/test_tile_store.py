@@ -0,0 +1,65 @@
+import numpy as np
+
+from src.tile_store import TileStore, TileStoreWriter, append_store, stored_frames
+
+TILE_SHAPE = (4, 5, 3)
+
+
+def frame_tiles(seed, count=4):
+    return np.random.default_rng(seed).integers(0, 256, (count,) + TILE_SHAPE, dtype=np.uint8)
+
+
+def test_round_trip(tmp_path):
+    a, b = frame_tiles(0), frame_tiles(1)
+    with TileStoreWriter(str(tmp_path), TILE_SHAPE) as writer:
+        assert writer.add_frame("frame_0001", a) == 0
+        assert writer.add_frame("frame_0002", b) == len(a)
+
+    store = TileStore(str(tmp_path))
+    assert len(store) == len(a) + len(b)
+    assert store.frames == ["frame_0001", "frame_0002"]
+    assert "frame_0002" in store and "frame_0003" not in store
+    np.testing.assert_array_equal(store.frame_tiles("frame_0001"), a)
+    np.testing.assert_array_equal(store.tile("frame_0002", 3), b[2])
+    np.testing.assert_array_equal(store.batch([1, 5]), np.stack([a[1], b[1]]))
+    assert stored_frames(str(tmp_path)) == {"frame_0001", "frame_0002"}
+
+
+def test_retiled_frame_reads_newest_copy(tmp_path):
+    old, new = frame_tiles(0), frame_tiles(1)
+    with TileStoreWriter(str(tmp_path), TILE_SHAPE) as writer:
+        writer.add_frame("frame_0001", old)
+        writer.add_frame("frame_0002", frame_tiles(2))
+    with TileStoreWriter(str(tmp_path), TILE_SHAPE) as writer:
+        writer.add_frame("frame_0001", new)
+
+    store = TileStore(str(tmp_path))
+    np.testing.assert_array_equal(store.frame_tiles("frame_0001"), new)
+    np.testing.assert_array_equal(store.tile("frame_0001", 2), new[1])
+    assert store.frames == ["frame_0002", "frame_0001"]
+
+
+def test_append_store_shifts_offsets(tmp_path):
+    dst, src = tmp_path / "dst", tmp_path / "src"
+    a, b = frame_tiles(0), frame_tiles(1)
+    with TileStoreWriter(str(dst), TILE_SHAPE) as writer:
+        writer.add_frame("frame_0001", a)
+    with TileStoreWriter(str(src), TILE_SHAPE) as writer:
+        writer.add_frame("frame_0002", b)
+    append_store(str(dst), str(src))
+
+    assert not src.exists()
+    store = TileStore(str(dst))
+    assert store.offset("frame_0002", 1) == len(a)
+    np.testing.assert_array_equal(store.frame_tiles("frame_0002"), b)
+
+
+def test_index_rows_past_the_data_are_ignored(tmp_path):
+    with TileStoreWriter(str(tmp_path), TILE_SHAPE) as writer:
+        writer.add_frame("frame_0001", frame_tiles(0))
+        writer.add_frame("frame_0002", frame_tiles(1))
+    data = tmp_path / "tiles.u8"
+    data.write_bytes(data.read_bytes()[:4 * int(np.prod(TILE_SHAPE))])  # Second frame's data never landed
+
+    store = TileStore(str(tmp_path))
+    assert store.frames == ["frame_0001"]